@@ -58,6 +58,23 @@ def worker_abort(worker):
     """Called when a worker receives the SIGABRT signal."""
     worker.log.info("Worker received SIGABRT signal")
 
+def worker_exit(server, worker):
+    """Called in the worker process just after it has exited the main loop.
+
+    Finishes queued background jobs first (they may write logs), then flushes
+    the buffered audit log so no entries are lost on restart/scale-down.
+    """
+    try:
+        from src.background import drain
+        drain()
+    except Exception as e:
+        worker.log.warning(f"Background queue drain failed: {e}")
+    try:
+        from src.db_firestore import close_log_writer
+        close_log_writer()
+    except Exception as e:
+        worker.log.error(f"Audit log flush failed: {e}")
+
 # SSL/HTTPS (if you need direct HTTPS - usually not needed with reverse proxy)
 # keyfile = None
 # certfile = None
@@ -0,0 +1,66 @@
+r"""Move old audit logs from Firestore to gzip JSONL files in Cloud Storage.
+
+Logs older than `--days` (default: LOG_ARCHIVE_DAYS, 365) are written to
+`<LOG_ARCHIVE_PREFIX>/YYYY/MM/DD/logs-<run>.jsonl.gz` in the app bucket and then
+deleted from the `logs` collection. Rows use the same serializer as
+`export_firestore_json.py`. See `src/log_archive.py` for details.
+
+Usage (PowerShell, from the `app/` directory):
+  $env:GOOGLE_APPLICATION_CREDENTIALS="..\credentials\service-account.json"
+  python -m scripts.archive_logs --days 365 [--limit 20000] [--dry-run]
+
+Safe to re-run: each run moves the next `--limit` oldest logs.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Archive old logs to GCS (gzip JSONL, partitioned by day)")
+    p.add_argument(
+        "--days",
+        type=int,
+        default=None,
+        help="Archive logs older than this many days (default: LOG_ARCHIVE_DAYS or 365)",
+    )
+    p.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Maximum number of logs moved in one run (default: LOG_ARCHIVE_LIMIT or 20000)",
+    )
+    p.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only count logs that would be archived",
+    )
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    here = Path(__file__).resolve()
+    app_dir = here.parents[1]
+    load_dotenv(app_dir / ".env", override=False)
+    load_dotenv(app_dir.parent / ".env", override=False)
+
+    args = build_parser().parse_args(argv)
+
+    from src import _init_firebase_admin
+    from src.log_archive import archive_logs
+
+    _init_firebase_admin()
+    result = archive_logs(older_than_days=args.days, limit=args.limit, dry_run=args.dry_run)
+    verb = "Would archive" if args.dry_run else "Archived"
+    print(f"✅ {verb} {result['archived']} logs older than {result['cutoff']:%Y-%m-%d}")
+    for name in result["files"]:
+        print(f"   {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
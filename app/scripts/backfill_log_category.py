@@ -0,0 +1,94 @@
+r"""Backfill the denormalized `category` field on existing log entries.
+
+New logs get `category` (taken from `after`, falling back to `before`) when they
+are written; achievement counters filter on it with server-side count() queries.
+Logs written before that change only carry the category inside `before`/`after`,
+so this script copies it to the top level.
+
+Usage (PowerShell, from the `app/` directory):
+  $env:GOOGLE_APPLICATION_CREDENTIALS="..\credentials\service-account.json"
+  python -m scripts.backfill_log_category [--dry-run]
+
+Idempotent: logs that already have the field (or have no category) are skipped.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Backfill logs.category from before/after")
+    p.add_argument(
+        "--page-size",
+        type=int,
+        default=500,
+        help="Firestore pagination page size and write batch size (default: 500)",
+    )
+    p.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only count logs that would be updated",
+    )
+    return p
+
+
+def backfill(page_size: int = 500, dry_run: bool = False) -> tuple[int, int]:
+    """Returns (scanned, updated)."""
+    from src import get_firestore_client, _init_firebase_admin
+    from src.db_firestore import COLLECTION_LOGS, _log_category
+
+    _init_firebase_admin()
+    db = get_firestore_client()
+    coll = db.collection(COLLECTION_LOGS)
+
+    scanned = updated = 0
+    last_doc = None
+    while True:
+        q = coll.order_by("__name__").limit(page_size)
+        if last_doc is not None:
+            q = q.start_after(last_doc)
+        docs = list(q.stream())
+        if not docs:
+            break
+
+        batch = db.batch()
+        pending = 0
+        for doc in docs:
+            scanned += 1
+            data = doc.to_dict() or {}
+            if data.get("category"):
+                continue
+            category = _log_category(data.get("before"), data.get("after"))
+            if not category:
+                continue
+            updated += 1
+            if not dry_run:
+                batch.update(doc.reference, {"category": category})
+                pending += 1
+        if pending:
+            batch.commit()
+
+        last_doc = docs[-1]
+
+    return scanned, updated
+
+
+def main(argv: list[str] | None = None) -> int:
+    here = Path(__file__).resolve()
+    app_dir = here.parents[1]
+    load_dotenv(app_dir / ".env", override=False)
+    load_dotenv(app_dir.parent / ".env", override=False)
+
+    args = build_parser().parse_args(argv)
+    scanned, updated = backfill(page_size=args.page_size, dry_run=args.dry_run)
+    verb = "Would update" if args.dry_run else "Updated"
+    print(f"✅ {verb} {updated} of {scanned} logs")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
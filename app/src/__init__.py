@@ -172,11 +172,14 @@ def create_app():
                     raise
                 app.logger.warning(f"PIN rotation check failed (non-fatal): {pin_err}")
 
+            from .background import stats as background_stats
             return {
                 'status': 'healthy',
                 'service': 'SzalasApp',
                 'firebase_initialized': bool(_apps),
                 'strict': strict,
+                # Kolejka zadań w tle tego workera: głębokość i opóźnienie (lag)
+                'background_jobs': background_stats(),
             }, 200
         except Exception as e:
             # Nie ujawniamy szczegółów wyjątku w odpowiedzi HTTP (info leakage)
@@ -5,6 +5,12 @@ Serwis przyznawania osiągnięć.
 - Przyznane osiągnięcia zapisujemy w polu users.achievements (mapa id -> timestamp) w Firestore.
 - Automatyczne przyznawanie jest wyzwalane w hookach w widokach (po utworzeniu usterki,
   po dodaniu/zwrocie wypożyczenia, po oznaczeniu cudzej usterki jako naprawionej).
+- Liczniki (zgłoszenia, wypożyczenia, logi) czytamy z jednego dokumentu statystyk
+  users/{uid}/stats/counters, podbijanego przy zapisie (patrz db_firestore.get_user_stats).
+- Definicje są kompilowane do tablicy reguł: zdarzenie -> lista reguł progowych. Tablica żyje
+  w pamięci procesu i jest przebudowywana po zmianie definicji (set_achievement_def,
+  delete_achievement_def) albo po ACHIEVEMENT_RULES_TTL sekundach (zmiany z innych workerów).
+- Każdy hook czyta dokument użytkownika (flaga funkcji + mapa zdobytych odznak) raz.
 
 Uwagi:
 - Działa tylko jeśli u użytkownika ustawiono features.achievements_enabled = True.
@@ -18,27 +24,225 @@ Uwagi:
 
 from __future__ import annotations
 
-from typing import Optional, Iterable, Dict, Any
+import os
+import threading
+from time import time
+from typing import Optional, Callable, Dict, Any
 from datetime import datetime
 
 from .db_firestore import (
-    get_all_achievements, get_achievements_map, COLLECTION_WYPOZYCZENIA,
-    get_items_by_filter, get_items_by_filters, _warsaw_now, COLLECTION_LOGS
-)
-from .db_users import (
-    get_user_features, get_user_achievements_map,
-    add_user_achievement
+    get_achievements_map, get_achievement_defs_version, get_user_stats, get_user_log_count, _warsaw_now
 )
+from .db_users import get_user_by_uid, add_user_achievement
+
+
+# =========================
+#  TABLICA REGUŁ
+# =========================
+
+# Zdarzenia, na które reagują hooki (klucze tablicy reguł).
+EVENT_REPORT_CREATED = 'report_created'
+EVENT_LOAN_CREATED = 'loan_created'
+EVENT_ITEM_ADDED = 'item_added'
+EVENT_ITEM_EDITED = 'item_edited'
+EVENT_LOG = 'log'
+EVENT_SPEEDY_RETURN = 'speedy_return'
+EVENT_HELP_RESOLVE = 'help_resolve'
+
+# Zdarzenia ewaluowane retro-aktywnie (maybe_award_all_for_user) – mają liczniki w statystykach.
+RETRO_EVENTS = (EVENT_REPORT_CREATED, EVENT_LOAN_CREATED, EVENT_ITEM_ADDED, EVENT_ITEM_EDITED, EVENT_LOG)
+
+# Kompatybilność wstecz: odznaki przyznawane po ID niezależnie od ich `condition`.
+_LEGACY_RULES = {
+    EVENT_REPORT_CREATED: (('first_report', 1), ('five_reports', 5)),
+    EVENT_LOAN_CREATED: (('ten_borrows', 10),),
+    EVENT_SPEEDY_RETURN: (('speedy_return', None),),
+    EVENT_HELP_RESOLVE: (('helping_hand', None),),
+}
+
+ACHIEVEMENT_RULES_TTL = float(os.getenv('ACHIEVEMENT_RULES_TTL', '60'))
+
+
+class _Rule:
+    """Reguła progowa: osiągnięcie `id` przysługuje, gdy counter(stats) >= threshold.
+
+    Bez licznika (`counter=None`) reguła jest spełniona samym wystąpieniem zdarzenia.
+    `log_filter` to (action, target_type, category) dla reguł `log_count` (None = dowolne).
+    """
+
+    __slots__ = ('id', 'threshold', 'counter', 'log_filter')
+
+    def __init__(self, aid: str, threshold: Optional[int] = None,
+                 counter: Optional[Callable[[dict], int]] = None, log_filter: Optional[tuple] = None):
+        self.id = aid
+        self.threshold = threshold
+        self.counter = counter
+        self.log_filter = log_filter
+
+    def passes(self, stats: dict) -> bool:
+        if self.counter is None:
+            return True
+        return bool(self.threshold) and self.counter(stats or {}) >= self.threshold
+
+    def matches_log(self, action, target_type, category) -> bool:
+        c_action, c_target, c_cat = self.log_filter or (None, None, None)
+        return (
+            (not c_action or c_action == (action or None))
+            and (not c_target or c_target == (target_type or None))
+            and (not c_cat or c_cat == (category or None))
+        )
+
+
+def _reports_counter(stats: dict) -> int:
+    return _safe_int(stats.get('reports'))
+
+
+def _loans_counter(stats: dict) -> int:
+    return _safe_int(stats.get('loans'))
+
+
+def _log_counter(action=None, target_type=None, category=None) -> Callable[[dict], int]:
+    return lambda stats: get_user_log_count(stats, action, target_type, category)
+
+
+def _opt(cond: dict, key: str) -> Optional[str]:
+    return (cond.get(key) or '').strip() or None
+
+
+def _compile_rule(a: dict) -> tuple[Optional[str], Optional[_Rule]]:
+    """Zamienia definicję na (zdarzenie, reguła) albo (None, None) dla nieznanych warunków."""
+    aid = a.get('id')
+    cond = a.get('condition') or {}
+    ctype = cond.get('type')
+    threshold = _safe_int(cond.get('threshold'), 0)
+    if ctype == 'event_count':
+        event = cond.get('event')
+        if event == EVENT_REPORT_CREATED:
+            return event, _Rule(aid, threshold, _reports_counter)
+        if event == EVENT_LOAN_CREATED:
+            return event, _Rule(aid, threshold, _loans_counter)
+        return None, None
+    if ctype == 'item_add_count':
+        return EVENT_ITEM_ADDED, _Rule(aid, threshold, _log_counter('add', 'sprzet', _opt(cond, 'category')))
+    if ctype == 'item_edit_count':
+        return EVENT_ITEM_EDITED, _Rule(aid, threshold, _log_counter('edit', 'sprzet', _opt(cond, 'category')))
+    if ctype == 'log_count':
+        log_filter = (_opt(cond, 'action'), _opt(cond, 'target_type'), _opt(cond, 'category'))
+        return EVENT_LOG, _Rule(aid, threshold, _log_counter(*log_filter), log_filter)
+    if ctype == 'speedy_return':
+        return EVENT_SPEEDY_RETURN, _Rule(aid)
+    if ctype == 'help_resolve':
+        return EVENT_HELP_RESOLVE, _Rule(aid)
+    return None, None
+
+
+class _RuleTable:
+    """Skompilowane definicje: mapa id -> definicja oraz zdarzenie -> lista reguł."""
+
+    def __init__(self, defs_map: dict):
+        self.defs = dict(defs_map or {})
+        self.enabled = {aid: a for aid, a in self.defs.items() if a and a.get('enabled', True)}
+        self.by_event: Dict[str, list[_Rule]] = {}
+        for aid, a in self.enabled.items():
+            event, rule = _compile_rule(a)
+            if rule is not None:
+                self.by_event.setdefault(event, []).append(rule)
+        for event, legacy in _LEGACY_RULES.items():
+            for aid, threshold in legacy:
+                if aid not in self.enabled:
+                    continue
+                counter = {EVENT_REPORT_CREATED: _reports_counter, EVENT_LOAN_CREATED: _loans_counter}.get(event)
+                self.by_event.setdefault(event, []).append(_Rule(aid, threshold, counter))
+
+    def rules(self, event: str) -> list[_Rule]:
+        return self.by_event.get(event, [])
+
+
+_rules_state = {'table': None, 'version': None, 'loaded_at': 0.0}
+_rules_lock = threading.Lock()
+
+
+def _get_rule_table() -> _RuleTable:
+    version = get_achievement_defs_version()
+    table = _rules_state['table']
+    if (table is not None and _rules_state['version'] == version
+            and time() - _rules_state['loaded_at'] < ACHIEVEMENT_RULES_TTL):
+        return table
+    with _rules_lock:
+        table = _rules_state['table']
+        if (table is not None and _rules_state['version'] == version
+                and time() - _rules_state['loaded_at'] < ACHIEVEMENT_RULES_TTL):
+            return table
+        try:
+            table = _RuleTable(get_achievements_map())
+        except Exception:
+            # Jeśli nie udało się pobrać — brak reguł (nie zapamiętujemy, spróbujemy ponownie)
+            return _RuleTable({})
+        _rules_state.update(table=table, version=version, loaded_at=time())
+        return table
+
+
+# =========================
+#  STAN UŻYTKOWNIKA
+# =========================
+
+def _earned_if_enabled(user: Optional[dict]) -> Optional[dict]:
+    """Mapa zdobytych osiągnięć z dokumentu użytkownika albo None, gdy funkcja jest wyłączona."""
+    if not user or not (user.get('features') or {}).get('achievements_enabled'):
+        return None
+    return dict(user.get('achievements') or {})
+
+
+def _load_earned(uid: str) -> Optional[dict]:
+    """Jeden odczyt dokumentu użytkownika: flaga funkcji + mapa zdobytych osiągnięć."""
+    if not uid:
+        return None
+    try:
+        return _earned_if_enabled(get_user_by_uid(uid))
+    except Exception:
+        return None
+
+
+def _load_stats(uid: str) -> dict:
+    """Dokument liczników użytkownika (users/{uid}/stats/counters) – jeden odczyt."""
+    try:
+        return get_user_stats(uid) or {}
+    except Exception:
+        return {}
+
+
+def _grant(uid: str, earned: dict, achievement_id: str, table: _RuleTable) -> bool:
+    if achievement_id in earned:
+        return True
+    if achievement_id not in table.enabled:
+        return False
+    add_user_achievement(uid, achievement_id)
+    earned[achievement_id] = _warsaw_now()
+    return True
 
 
-def _is_feature_enabled(uid: str) -> bool:
-    feats = get_user_features(uid) or {}
-    return bool(feats.get('achievements_enabled'))
+def _evaluate(uid: str, earned: dict, rules: list, stats: Optional[dict] = None,
+              table: Optional[_RuleTable] = None) -> Optional[dict]:
+    """Przyznaje niezdobyte osiągnięcia z `rules`, których progi są spełnione.
+
+    Dokument statystyk jest czytany tylko, gdy któraś z niezdobytych reguł go potrzebuje.
+    Zwraca użyte statystyki (do ponownego wykorzystania przez wywołującego).
+    """
+    pending = [r for r in rules if r.id not in earned]
+    if not pending:
+        return stats
+    if stats is None and any(r.counter is not None for r in pending):
+        stats = _load_stats(uid)
+    table = table or _get_rule_table()
+    for r in pending:
+        if r.id not in earned and r.passes(stats):
+            _grant(uid, earned, r.id, table)
+    return stats
 
 
 def get_achievements_defs_map() -> dict:
     """Zwraca mapę definicji osiągnięć z bazy danych: id -> definicja."""
-    return get_achievements_map()
+    return dict(_get_rule_table().defs)
 
 
 def ensure_seeded():
@@ -52,29 +256,10 @@ def maybe_award(uid: str, achievement_id: str) -> bool:
 
     Zwraca True, jeśli przyznano (lub już miał) – traktujemy jako sukces idempotentny.
     """
-    if not uid:
-        return False
-    if not _is_feature_enabled(uid):
+    earned = _load_earned(uid)
+    if earned is None:
         return False
-    defs = get_achievements_defs_map()
-    adef = defs.get(achievement_id)
-    if not adef or not adef.get('enabled', True):
-        return False
-    # idempotencja
-    if achievement_id in (get_user_achievements_map(uid) or {}):
-        return True
-    add_user_achievement(uid, achievement_id)
-    return True
-
-
-def _iter_enabled_defs() -> Iterable[Dict[str, Any]]:
-    try:
-        for a in get_all_achievements():
-            if (a or {}).get('enabled', True):
-                yield a
-    except Exception:
-        # Jeśli nie udało się pobrać — zakończ iterację (brak osiągnięć)
-        return
+    return _grant(uid, earned, achievement_id, _get_rule_table())
 
 
 def _safe_int(val, default: int = 0) -> int:
@@ -91,16 +276,8 @@ def _clamp(val: int, lo: int, hi: int) -> int:
         return lo
 
 
-def _get_user_email(uid: str) -> Optional[str]:
-    try:
-        from .db_users import get_user_by_uid
-        u = get_user_by_uid(uid)
-        return (u or {}).get('email')
-    except Exception:
-        return None
-
-
-def get_user_achievements_progress(uid: str) -> list[Dict[str, Any]]:
+def get_user_achievements_progress(uid: str, stats: Optional[dict] = None,
+                                   earned_map: Optional[dict] = None) -> list[Dict[str, Any]]:
     """Zwraca listę osiągnięć z informacją o postępie dla danego użytkownika.
 
     Zwracane pola na element:
@@ -110,19 +287,25 @@ def get_user_achievements_progress(uid: str) -> list[Dict[str, Any]]:
     - target: int (próg; >=1)
     - percent: int (0..100)
     - masked: bool (sekret + niezdobyte)
+
+    Liczniki pochodzą z dokumentu statystyk użytkownika (`stats`), a zdobyte odznaki z `earned_map`;
+    jeśli nie podano, są odczytywane tutaj.
     """
-    defs_map = get_achievements_defs_map() or {}
-    earned_map = get_user_achievements_map(uid) or {}
-    email = _get_user_email(uid)
+    defs_map = _get_rule_table().enabled
+    if earned_map is None:
+        try:
+            earned_map = (get_user_by_uid(uid) or {}).get('achievements') or {}
+        except Exception:
+            earned_map = {}
+    if stats is None:
+        stats = _load_stats(uid)
 
     # Prelicz podstawowe liczniki używane w warunkach
-    reports_count = _get_user_reports_count(uid)
-    loans_count = _get_loans_count_for_contact(email or '') if email else 0
+    reports_count = _get_user_reports_count(uid, stats)
+    loans_count = _get_user_loans_count(uid, stats)
 
     items: list[Dict[str, Any]] = []
     for a in sorted(defs_map.values(), key=lambda x: _safe_int((x or {}).get('order'), 9999)):
-        if not a or not a.get('enabled', True):
-            continue
         aid = a.get('id')
         cond = (a.get('condition') or {})
         ctype = cond.get('type')
@@ -149,9 +332,9 @@ def get_user_achievements_progress(uid: str) -> list[Dict[str, Any]]:
             target = max(1, threshold)
             category = (cond.get('category') or '').strip() or None
             if ctype == 'item_add_count':
-                current = _count_user_item_adds(uid, category)
+                current = _count_user_item_adds(uid, category, stats)
             else:
-                current = _count_user_item_edits(uid, category)
+                current = _count_user_item_edits(uid, category, stats)
             # Dla prostych osiągnięć progowych (target == 1) pozostawiamy domyślną wartość binary 0/1.
             if target != 1:
                 progress = _clamp(int(current or 0), 0, target)
@@ -161,7 +344,7 @@ def get_user_achievements_progress(uid: str) -> list[Dict[str, Any]]:
             action = (cond.get('action') or '').strip() or None
             target_type = (cond.get('target_type') or '').strip() or None
             category = (cond.get('category') or '').strip() or None
-            current = _count_user_logs(uid, action=action, target_type=target_type, category=category)
+            current = _count_user_logs(uid, action=action, target_type=target_type, category=category, stats=stats)
             progress = _clamp(int(current or 0), 0, target)
         elif ctype in ('speedy_return', 'help_resolve'):
             # Progres binarny — 1 gdy już zdobyto
@@ -197,7 +380,7 @@ def get_user_achievements_progress(uid: str) -> list[Dict[str, Any]]:
     return items
 
 
-def maybe_award_all_for_user(uid: str):
+def maybe_award_all_for_user(uid: str, stats: Optional[dict] = None, user: Optional[dict] = None) -> Optional[dict]:
     """Retro‑aktywna ewaluacja wszystkich osiągnięć dla użytkownika.
 
     Używane przy włączeniu funkcji osiągnięć lub przy pierwszym wejściu na profil,
@@ -205,174 +388,68 @@ def maybe_award_all_for_user(uid: str):
 
     Zakres retro-awardu w tej wersji:
     - event_count: report_created, loan_created — na podstawie aktualnych zliczeń.
-    - item_add_count, item_edit_count — na podstawie dziennika aktywności (logs).
+    - item_add_count, item_edit_count, log_count — na podstawie liczników logów.
     - Warunki binarne zależne od pojedynczego zdarzenia w przeszłości (np. speedy_return,
       help_resolve) nie są obecnie liczony historycznie bez dodatkowych danych o czasie zwrotu/
       autorstwie — pozostają przyznawane podczas przyszłych zdarzeń zgodnie z hookami.
-    """
-    if not uid or not _is_feature_enabled(uid):
-        return
-
-    # Zliczenia bazowe
-    email = _get_user_email(uid)
-    try:
-        reports_count = _get_user_reports_count(uid)
-    except Exception:
-        reports_count = 0
-    try:
-        loans_count = _get_loans_count_for_contact(email or '') if email else 0
-    except Exception:
-        loans_count = 0
-
-    # Przyznaj spełnione progi dla liczników zgłoszeń i wypożyczeń
-    _award_event_count(uid, 'report_created', reports_count)
-    _award_event_count(uid, 'loan_created', loans_count)
-
-    # Przyznaj spełnione progi dla dodawań/edycji sprzętu (dla wszystkich kategorii)
-    _award_item_adds(uid, None)
-    _award_item_edits(uid, None)
 
-    # Przyznaj spełnione progi dla `log_count` (dla wszystkich kombinacji filtrów z definicji)
-    _award_log_counts(uid)
-
-
-def _award_event_count(uid: str, event_name: str, count_value: int):
-    """Przyznaje wszystkie osiągnięcia typu event_count spełnione dla danego eventu i licznika."""
-    if count_value is None:
+    `user` – już pobrany dokument użytkownika (oszczędza odczyt). Zwraca aktualną mapę
+    zdobytych osiągnięć (albo None, gdy funkcja jest wyłączona).
+    """
+    earned = _earned_if_enabled(user) if user is not None else _load_earned(uid)
+    if not uid or earned is None:
+        return None
+    table = _get_rule_table()
+    rules = [r for event in RETRO_EVENTS for r in table.rules(event)]
+    _evaluate(uid, earned, rules, stats, table)
+    return earned
+
+
+def _award_event(uid: str, event: str, earned: Optional[dict] = None,
+                 stats: Optional[dict] = None, rules: Optional[list] = None) -> None:
+    """Ewaluuje reguły zdarzenia dla użytkownika (jeden odczyt dokumentu użytkownika)."""
+    table = _get_rule_table()
+    rules = table.rules(event) if rules is None else rules
+    if not rules:
         return
-    for a in _iter_enabled_defs():
-        cond = (a or {}).get('condition') or {}
-        if cond.get('type') != 'event_count':
-            continue
-        if cond.get('event') != event_name:
-            continue
-        try:
-            threshold = int(cond.get('threshold') or 0)
-        except Exception:
-            threshold = 0
-        if threshold and count_value >= threshold:
-            maybe_award(uid, a.get('id'))
-
-
-def _award_simple_event(uid: str, condition_type: str):
-    """Przyznaje wszystkie osiągnięcia, których condition.type == condition_type."""
-    for a in _iter_enabled_defs():
-        cond = (a or {}).get('condition') or {}
-        if cond.get('type') == condition_type:
-            maybe_award(uid, a.get('id'))
+    if earned is None:
+        earned = _load_earned(uid)
+        if earned is None:
+            return
+    _evaluate(uid, earned, rules, stats, table)
 
 
 # =========================
 #  SPRZĘT – DODANIA I EDYCJE
 # =========================
 
-def _count_user_item_adds(uid: str, category: Optional[str] = None) -> int:
+def _count_user_item_adds(uid: str, category: Optional[str] = None, stats: Optional[dict] = None) -> int:
     """Zlicza dodania elementów 'sprzet' przez użytkownika (opcjonalnie w danej kategorii)."""
-    if not uid:
-        return 0
-    filters = [
-        ('user_id', '==', uid),
-        ('action', '==', 'add'),
-        ('target_type', '==', 'sprzet'),
-    ]
-    if category:
-        # filtr po kategorii w danych 'after'
-        filters.append(('after.category', '==', category))
-    try:
-        items = get_items_by_filters(COLLECTION_LOGS, filters)
-        return len(items or [])
-    except Exception:
-        return 0
+    return _count_user_logs(uid, action='add', target_type='sprzet', category=category, stats=stats)
 
 
-def _count_user_item_edits(uid: str, category: Optional[str] = None) -> int:
+def _count_user_item_edits(uid: str, category: Optional[str] = None, stats: Optional[dict] = None) -> int:
     """Zlicza edycje elementów 'sprzet' przez użytkownika (opcjonalnie w danej kategorii).
 
-    Uwaga: jeżeli podano kategorię, akceptujemy zgodność kategorii przed lub po edycji.
+    Uwaga: kategoria jest dopasowywana po zdenormalizowanym polu loga `category`
+    (kategoria po edycji, a gdy jej brak – przed edycją).
     """
-    if not uid:
-        return 0
-    base_filters = [
-        ('user_id', '==', uid),
-        ('action', '==', 'edit'),
-        ('target_type', '==', 'sprzet'),
-    ]
-    try:
-        logs = get_items_by_filters(COLLECTION_LOGS, base_filters)
-        if not category:
-            return len(logs or [])
-        cat = (category or '').strip()
-        cnt = 0
-        for lg in logs or []:
-            after = (lg or {}).get('after') or {}
-            before = (lg or {}).get('before') or {}
-            if (after.get('category') == cat) or (before.get('category') == cat):
-                cnt += 1
-        return cnt
-    except Exception:
-        return 0
+    return _count_user_logs(uid, action='edit', target_type='sprzet', category=category, stats=stats)
 
 
-def _count_user_logs(uid: str, action: Optional[str] = None, target_type: Optional[str] = None, category: Optional[str] = None) -> int:
-    """Zlicza logi użytkownika z opcjonalnymi filtrami.
+def _count_user_logs(uid: str, action: Optional[str] = None, target_type: Optional[str] = None,
+                     category: Optional[str] = None, stats: Optional[dict] = None) -> int:
+    """Zlicza logi użytkownika z opcjonalnymi filtrami (licznik z dokumentu statystyk).
 
     - action: typ akcji (np. add/edit/import/delete/loan/bulk_edit/restore itp.)
     - target_type: typ obiektu (np. sprzet/usterka/wypozyczenie)
-    - category: dla target_type == 'sprzet' próbuje dopasować po before/after.category
+    - category: dopasowanie po zdenormalizowanym polu loga `category`
     """
     if not uid:
         return 0
-    # Zbuduj podstawowe filtry wspierane zapytaniem Firestore
-    filters = [('user_id', '==', uid)]
-    if action:
-        filters.append(('action', '==', action))
-    if target_type:
-        filters.append(('target_type', '==', target_type))
-    try:
-        logs = get_items_by_filters(COLLECTION_LOGS, filters)
-    except Exception:
-        logs = []
-    if not category:
-        return len(logs or [])
-    # Gdy wskazano kategorię – policz tylko te, gdzie pasuje kategoria po edycji lub przed
-    cat = (category or '').strip()
-    cnt = 0
-    for lg in logs or []:
-        after = (lg or {}).get('after') or {}
-        before = (lg or {}).get('before') or {}
-        if (after.get('category') == cat) or (before.get('category') == cat):
-            cnt += 1
-    return cnt
-
-
-def _award_log_counts(uid: str):
-    """Przyznaje osiągnięcia typu `log_count` spełnione dla użytkownika.
-
-    Optymalizacja: grupuje definicje wg (action, target_type, category) i liczy raz na grupę.
-    """
-    defs = []
-    combos = set()
-    for a in _iter_enabled_defs():
-        cond = (a or {}).get('condition') or {}
-        if cond.get('type') == 'log_count':
-            action = (cond.get('action') or '').strip() or None
-            target_type = (cond.get('target_type') or '').strip() or None
-            category = (cond.get('category') or '').strip() or None
-            defs.append((a, action, target_type, category, cond))
-            combos.add((action, target_type, category))
-    if not defs:
-        return
-    # policz dla wszystkich kombinacji wymaganych przez definicje
-    counts: Dict[tuple, int] = {}
-    for combo in combos:
-        a, t, c = combo
-        counts[combo] = _count_user_logs(uid, action=a, target_type=t, category=c)
-    # oceń progi
-    for a, action, target_type, category, cond in defs:
-        thr = _safe_int(cond.get('threshold'), 0)
-        val = counts.get((action, target_type, category), 0)
-        if thr and val >= thr:
-            maybe_award(uid, a.get('id'))
+    if stats is None:
+        stats = _load_stats(uid)
+    return get_user_log_count(stats, action, target_type, (category or '').strip() or None)
 
 
 def maybe_award_on_log(actor_uid: str, action: Optional[str], target_type: Optional[str], category: Optional[str] = None):
@@ -381,125 +458,45 @@ def maybe_award_on_log(actor_uid: str, action: Optional[str], target_type: Optio
     Uwaga: puste (None) w definicji oznacza brak filtra; tutaj przekazane None oznacza „niezdefiniowano w zdarzeniu”
     i może pasować do definicji, które również nie filtrują po tym polu.
     """
-    if not actor_uid or not _is_feature_enabled(actor_uid):
-        return
-    # Zbierz tylko definicje, które potencjalnie pasują do bieżących parametrów
-    matched = []
-    for a in _iter_enabled_defs():
-        cond = (a or {}).get('condition') or {}
-        if cond.get('type') != 'log_count':
-            continue
-        c_action = (cond.get('action') or '').strip() or None
-        c_target = (cond.get('target_type') or '').strip() or None
-        c_cat = (cond.get('category') or '').strip() or None
-        # sprawdź dopasowanie: jeśli w definicji jest filtr, musi zgadzać się z parametrem
-        if c_action and c_action != (action or None):
-            continue
-        if c_target and c_target != (target_type or None):
-            continue
-        if c_cat and c_cat != (category or None):
-            continue
-        matched.append((a, c_action, c_target, c_cat, cond))
-    if not matched:
+    if not actor_uid:
         return
-    # Policz jednorazowo dla każdej kombinacji spośród dopasowanych
-    combos = {(m[1], m[2], m[3]) for m in matched}
-    counts: Dict[tuple, int] = {}
-    for combo in combos:
-        a_act, a_tgt, a_cat = combo
-        counts[combo] = _count_user_logs(actor_uid, action=a_act, target_type=a_tgt, category=a_cat)
-    for a, c_action, c_target, c_cat, cond in matched:
-        thr = _safe_int(cond.get('threshold'), 0)
-        val = counts.get((c_action, c_target, c_cat), 0)
-        if thr and val >= thr:
-            maybe_award(actor_uid, a.get('id'))
-
-
-def _award_item_adds(uid: str, category: Optional[str]):
-    """Przyznaje osiągnięcia typu item_add_count spełnione dla użytkownika (opcjonalnie w danej kategorii)."""
-    # Zbierz wymagane kategorie z definicji, aby policzyć raz na kategorię
-    needed_cats = set()
-    defs = []
-    for a in _iter_enabled_defs():
-        cond = (a or {}).get('condition') or {}
-        if cond.get('type') == 'item_add_count':
-            defs.append((a, cond))
-            needed_cats.add((cond.get('category') or '').strip() or None)
-    if not defs:
-        return
-    # Zbuduj mapa countów
-    counts: Dict[Optional[str], int] = {}
-    for cat in needed_cats:
-        # jeśli przekazano konkretną kategorię zdarzenia, a definicja oczekuje innej, to i tak policzymy,
-        # bo użytkownik mógł mieć wcześniejsze dodania w innej kategorii
-        counts[cat] = _count_user_item_adds(uid, cat)
-    # Oceń progi
-    for a, cond in defs:
-        thr = _safe_int(cond.get('threshold'), 0)
-        cat = (cond.get('category') or '').strip() or None
-        val = counts.get(cat, 0)
-        if thr and val >= thr:
-            maybe_award(uid, a.get('id'))
-
-
-def _award_item_edits(uid: str, category: Optional[str]):
-    """Przyznaje osiągnięcia typu item_edit_count spełnione dla użytkownika (opcjonalnie w danej kategorii)."""
-    needed_cats = set()
-    defs = []
-    for a in _iter_enabled_defs():
-        cond = (a or {}).get('condition') or {}
-        if cond.get('type') == 'item_edit_count':
-            defs.append((a, cond))
-            needed_cats.add((cond.get('category') or '').strip() or None)
-    if not defs:
-        return
-    counts: Dict[Optional[str], int] = {}
-    for cat in needed_cats:
-        counts[cat] = _count_user_item_edits(uid, cat)
-    for a, cond in defs:
-        thr = _safe_int(cond.get('threshold'), 0)
-        cat = (cond.get('category') or '').strip() or None
-        val = counts.get(cat, 0)
-        if thr and val >= thr:
-            maybe_award(uid, a.get('id'))
+    rules = [r for r in _get_rule_table().rules(EVENT_LOG) if r.matches_log(action, target_type, category)]
+    _award_event(actor_uid, EVENT_LOG, rules=rules)
 
 
 def maybe_award_on_item_created(actor_uid: str, category: Optional[str]):
-    """Wywoływane po utworzeniu nowego elementu SPRZĘTU przez użytkownika."""
-    if not actor_uid or not _is_feature_enabled(actor_uid):
+    """Wywoływane po utworzeniu nowego elementu SPRZĘTU przez użytkownika.
+
+    Ewaluowane są wszystkie reguły item_add_count (także innych kategorii), bo użytkownik
+    mógł mieć wcześniejsze dodania w innej kategorii.
+    """
+    if not actor_uid:
         return
-    _award_item_adds(actor_uid, category)
+    _award_event(actor_uid, EVENT_ITEM_ADDED)
 
 
 def maybe_award_on_item_edited(actor_uid: str, category: Optional[str]):
     """Wywoływane po edycji elementu SPRZĘTU przez użytkownika."""
-    if not actor_uid or not _is_feature_enabled(actor_uid):
+    if not actor_uid:
         return
-    _award_item_edits(actor_uid, category)
+    _award_event(actor_uid, EVENT_ITEM_EDITED)
 
 
 # =========================
 #  RAPORTY USTEREK
 # =========================
 
-def _get_user_reports_count(uid: str) -> int:
-    from .db_firestore import COLLECTION_USTERKI
-    items = get_items_by_filter(COLLECTION_USTERKI, 'user_id', '==', uid)
-    return len(items)
+def _get_user_reports_count(uid: str, stats: Optional[dict] = None) -> int:
+    if stats is None:
+        stats = _load_stats(uid)
+    return _reports_counter(stats)
 
 
 def maybe_award_on_report_created(uid: str):
     """Wywoływane po utworzeniu nowej usterki przez użytkownika."""
-    if not uid or not _is_feature_enabled(uid):
+    if not uid:
         return
-    cnt = _get_user_reports_count(uid)
-    # Nowy generczny evaluator
-    _award_event_count(uid, 'report_created', cnt)
-    # Kompatybilność z istniejącymi bez-condition (jeśli nadal istnieją takie rekordy)
-    if cnt >= 1:
-        maybe_award(uid, 'first_report')
-    if cnt >= 5:
-        maybe_award(uid, 'five_reports')
+    _award_event(uid, EVENT_REPORT_CREATED)
 
 
 # =========================
@@ -516,27 +513,20 @@ def _find_user_by_email(email: Optional[str]):
         return None
 
 
-def _get_loans_count_for_contact(email: str) -> int:
-    if not email:
-        return 0
-    items = get_items_by_filter(COLLECTION_WYPOZYCZENIA, 'kontakt', '==', email)
-    return len(items)
+def _get_user_loans_count(uid: str, stats: Optional[dict] = None) -> int:
+    """Liczba wypożyczeń na e‑mail użytkownika (pole 'kontakt'), z dokumentu statystyk."""
+    if stats is None:
+        stats = _load_stats(uid)
+    return _loans_counter(stats)
 
 
 def maybe_award_on_loan_created(borrower_email: Optional[str]):
     """Wywoływane po dodaniu wypożyczenia. Próbuje dopasować użytkownika po e‑mailu w polu 'kontakt'."""
     user = _find_user_by_email(borrower_email)
-    if not user:
-        return
-    uid = user.get('id')
-    if not _is_feature_enabled(uid):
+    earned = _earned_if_enabled(user)
+    if earned is None:
         return
-    cnt = _get_loans_count_for_contact(borrower_email or '')
-    # Genericzny evaluator: liczba wypożyczeń
-    _award_event_count(uid, 'loan_created', cnt)
-    # Kompatybilność wstecz
-    if cnt >= 10:
-        maybe_award(uid, 'ten_borrows')
+    _award_event(user.get('id'), EVENT_LOAN_CREATED, earned=earned)
 
 
 def maybe_award_on_loan_return(loan: dict):
@@ -557,13 +547,10 @@ def maybe_award_on_loan_return(loan: dict):
     if not same_day:
         return
     user = _find_user_by_email(borrower_email)
-    if not user:
+    earned = _earned_if_enabled(user)
+    if earned is None:
         return
-    uid = user.get('id')
-    # Genericzny evaluator: szybki zwrot
-    _award_simple_event(uid, 'speedy_return')
-    # Kompatybilność wstecz
-    maybe_award(uid, 'speedy_return')
+    _award_event(user.get('id'), EVENT_SPEEDY_RETURN, earned=earned)
 
 
 # =========================
@@ -572,11 +559,7 @@ def maybe_award_on_loan_return(loan: dict):
 
 def maybe_award_on_help_resolve(actor_uid: str, usterka: dict):
     """Przyznaje 'helping_hand' jeśli aktor oznaczył jako naprawioną cudzą usterkę."""
-    if not actor_uid or not _is_feature_enabled(actor_uid):
-        return
     owner_uid = (usterka or {}).get('user_id')
-    if not owner_uid or owner_uid == actor_uid:
+    if not actor_uid or not owner_uid or owner_uid == actor_uid:
         return
-    _award_simple_event(actor_uid, 'help_resolve')
-    # Kompatybilność wstecz
-    maybe_award(actor_uid, 'helping_hand')
+    _award_event(actor_uid, EVENT_HELP_RESOLVE)
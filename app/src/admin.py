@@ -21,7 +21,7 @@ from .db_users import (
 )
 from .db_firestore import (
     get_all_achievements, get_achievements_map,
-    set_achievement_def, delete_item, COLLECTION_ACHIEVEMENTS
+    set_achievement_def, delete_achievement_def
 )
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -529,7 +529,7 @@ def achievements_delete(achievement_id):
     if not validate_csrf_token():
         return redirect(url_for('admin.achievements_defs_list'))
     try:
-        delete_item(COLLECTION_ACHIEVEMENTS, achievement_id)
+        delete_achievement_def(achievement_id)
         flash('Osiągnięcie zostało usunięte.', 'warning')
     except Exception as e:
         flash(f'Nie udało się usunąć osiągnięcia: {e}', 'danger')
@@ -812,6 +812,33 @@ def log_restore(log_id):
     return safe_redirect_back('views.logs_list')
 
 
+@admin_bp.route('/logs/archive', methods=['POST'])
+@admin_required
+def logs_archive_run():
+    """Uruchamia w tle archiwizację starych logów do GCS (patrz log_archive.py)."""
+    if not validate_csrf_token():
+        return redirect(url_for('admin.settings'))
+
+    from .background import submit as submit_background
+    from .log_archive import archive_logs
+
+    days = request.form.get('archive_days', type=int)
+    if days is None or days < 30:
+        flash('Archiwizować można logi starsze niż co najmniej 30 dni.', 'danger')
+        return redirect(url_for('admin.settings'))
+
+    logger = current_app.logger  # wątek w tle nie ma kontekstu aplikacji
+
+    def _run():
+        result = archive_logs(older_than_days=days)
+        logger.info("Log archive: moved %s logs to %s files", result['archived'], len(result['files']))
+
+    submit_background(_run, job='archive_logs')
+    add_log(session.get('user_id'), 'archive_logs', 'logs', None, details={'older_than_days': days})
+    flash(f'Uruchomiono archiwizację logów starszych niż {days} dni.', 'success')
+    return redirect(url_for('admin.settings'))
+
+
 def safe_redirect_back(fallback_endpoint: str):
     """Bezpieczny redirect po akcji POST.
 
@@ -839,6 +866,7 @@ def safe_redirect_back(fallback_endpoint: str):
 @admin_required
 def settings():
     """Zarządzanie ustawieniami aplikacji (np. PIN)."""
+    from .views import DEFAULT_PHOTO_FORMAT, DEFAULT_PHOTO_QUALITY, PHOTO_FORMATS
     if request.method == 'POST':
         # === listy wyboru ===
         owners_raw = (request.form.get('owners') or '').strip()
@@ -847,6 +875,8 @@ def settings():
         # === ustawienia zdjęć ===
         max_photo_size_mb = request.form.get('max_photo_size_mb', '').strip()
         max_photo_width = request.form.get('max_photo_width', '').strip()
+        photo_format = (request.form.get('photo_format') or '').strip().lower()
+        photo_quality = request.form.get('photo_quality', '').strip()
 
         pin = request.form.get('view_pin')
         auto_rotate = request.form.get('pin_auto_rotate') == 'on'
@@ -878,10 +908,24 @@ def settings():
                 update_data['max_photo_width'] = width
             else:
                 update_data['max_photo_width'] = 1920
+
+            if photo_quality:
+                quality = int(photo_quality)
+                if quality < 1 or quality > 100:
+                    flash('Jakość zdjęć musi być między 1 a 100.', 'danger')
+                    return redirect(url_for('admin.settings'))
+                update_data['photo_quality'] = quality
+            else:
+                update_data['photo_quality'] = DEFAULT_PHOTO_QUALITY
         except ValueError:
             flash('Ustawienia zdjęć muszą być liczbami całkowitymi.', 'danger')
             return redirect(url_for('admin.settings'))
 
+        if photo_format and photo_format not in PHOTO_FORMATS:
+            flash('Nieobsługiwany format zapisu zdjęć.', 'danger')
+            return redirect(url_for('admin.settings'))
+        update_data['photo_format'] = photo_format or DEFAULT_PHOTO_FORMAT
+
         # Validate and set rotation hours - always set it even if empty (use default)
         if not rotate_hours:
             update_data['pin_rotate_hours'] = 24  # Default value
@@ -944,5 +988,9 @@ def settings():
     config = get_config()
     owners = get_list_setting('owners')
     magazyny_names = get_list_setting('magazyny_names')
-    return render_template('admin/settings.html', config=config, owners=owners, magazyny_names=magazyny_names)
+    from .log_archive import LOG_ARCHIVE_DAYS, LOG_ARCHIVE_LIMIT
+    return render_template('admin/settings.html', config=config, owners=owners, magazyny_names=magazyny_names,
+                           log_archive_days=LOG_ARCHIVE_DAYS, log_archive_limit=LOG_ARCHIVE_LIMIT,
+                           photo_formats=list(PHOTO_FORMATS), default_photo_format=DEFAULT_PHOTO_FORMAT,
+                           default_photo_quality=DEFAULT_PHOTO_QUALITY)
 
@@ -265,6 +265,10 @@ def rotate_pin_if_due():
             should_rotate = True
 
     if should_rotate:
+        # Config może pochodzić z cache sprzed rotacji wykonanej przez inny worker –
+        # potwierdzamy świeżym odczytem, żeby nie obrócić PIN-u dwa razy.
+        if get_config(fresh=True).get('view_pin') != config.get('view_pin'):
+            return
         pin = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
         update_config(
             view_pin=pin,
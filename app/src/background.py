@@ -0,0 +1,177 @@
+"""In-process background job queue.
+
+Work that does not have to finish before the response is sent (achievement
+evaluation after a report, loan or equipment edit) is handed to a small pool of
+daemon threads instead of running inside the request:
+
+    from .background import submit
+    submit(maybe_award_on_report_created, uid, job='report_created')
+
+The queue is bounded (BACKGROUND_QUEUE_SIZE); when it is full the job runs
+synchronously in the caller, so work is never dropped. BACKGROUND_WORKERS=0
+disables the pool and runs every job inline (useful in tests and scripts).
+Pending jobs are drained when the worker process exits. `stats()` reports queue
+depth and lag for the /health endpoint.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import threading
+from time import monotonic
+
+log = logging.getLogger(__name__)
+
+# How long process shutdown waits for queued jobs, in seconds.
+DRAIN_TIMEOUT = 10.0
+
+_STOP = object()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class JobQueue:
+    """Bounded FIFO queue served by a fixed pool of daemon threads."""
+
+    def __init__(self, workers: int = 2, maxsize: int = 1000, name: str = 'jobs'):
+        self.workers = max(0, workers)
+        self.name = name
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._pid = None
+        self._closed = False
+        self._counters = {'submitted': 0, 'processed': 0, 'failed': 0, 'inline': 0}
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+
+    def _bump(self, counter: str) -> None:
+        with self._stats_lock:
+            self._counters[counter] += 1
+
+    # ----------------------------------------------------------------- workers
+
+    def _ensure_started(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid and self._threads:
+            return
+        with self._lock:
+            if self._pid == pid and self._threads:
+                return
+            # After fork the parent's threads do not exist in the child; start fresh ones.
+            if self._pid != pid:
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = pid
+            self._threads = [
+                threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for t in self._threads:
+                t.start()
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            try:
+                if entry is _STOP:
+                    return
+                enqueued_at, label, fn, args, kwargs = entry
+                lag = monotonic() - enqueued_at
+                self._last_lag = lag
+                self._max_lag = max(self._max_lag, lag)
+                self._execute(label, fn, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, label, fn, args, kwargs) -> None:
+        try:
+            fn(*args, **kwargs)
+            self._bump('processed')
+        except Exception:
+            self._bump('failed')
+            log.exception("Background job %s failed", label)
+
+    # ------------------------------------------------------------------ public
+
+    def submit(self, fn, *args, job: str | None = None, **kwargs) -> bool:
+        """Queues `fn(*args, **kwargs)`. Returns False when it ran inline instead."""
+        label = job or getattr(fn, '__name__', 'job')
+        self._bump('submitted')
+        if self.workers and not self._closed:
+            self._ensure_started()
+            try:
+                self._queue.put_nowait((monotonic(), label, fn, args, kwargs))
+                return True
+            except queue.Full:
+                log.warning("Background queue %s full, running %s inline", self.name, label)
+        self._bump('inline')
+        self._execute(label, fn, args, kwargs)
+        return False
+
+    def drain(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        """Stops accepting work, finishes queued jobs and stops the threads.
+
+        Returns True when everything finished within `timeout`.
+        """
+        self._closed = True
+        if self._pid != os.getpid() or not self._threads:
+            return True
+        deadline = monotonic() + timeout
+        for _ in self._threads:
+            try:
+                self._queue.put(_STOP, timeout=max(0.0, deadline - monotonic()))
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(max(0.0, deadline - monotonic()))
+        alive = [t for t in self._threads if t.is_alive()]
+        if alive:
+            log.warning("Background queue %s: %d jobs left after %.0fs drain",
+                        self.name, self._queue.qsize(), timeout)
+        self._threads = alive
+        return not alive
+
+    def stats(self) -> dict:
+        """Queue depth, age of the oldest pending job and counters."""
+        with self._queue.mutex:
+            pending = [e for e in self._queue.queue if e is not _STOP]
+            oldest = pending[0][0] if pending else None
+        return {
+            'workers': self.workers,
+            'depth': len(pending),
+            'capacity': self._queue.maxsize,
+            'oldest_pending_seconds': round(monotonic() - oldest, 3) if oldest is not None else 0.0,
+            'last_lag_seconds': round(self._last_lag, 3),
+            'max_lag_seconds': round(self._max_lag, 3),
+            **self._counters,
+        }
+
+
+_default_queue = JobQueue(
+    workers=_env_int('BACKGROUND_WORKERS', 2),
+    maxsize=_env_int('BACKGROUND_QUEUE_SIZE', 1000),
+    name='background',
+)
+atexit.register(_default_queue.drain)
+
+
+def submit(fn, *args, job: str | None = None, **kwargs) -> bool:
+    """Runs `fn` on the shared background queue (see module docstring)."""
+    return _default_queue.submit(fn, *args, job=job, **kwargs)
+
+
+def drain(timeout: float = DRAIN_TIMEOUT) -> bool:
+    return _default_queue.drain(timeout)
+
+
+def stats() -> dict:
+    return _default_queue.stats()
@@ -1,5 +1,13 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic, time
+
 from . import get_firestore_client
+from google.api_core.exceptions import AlreadyExists, NotFound
 from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 
 COLLECTION_SPRZET = 'sprzet'
 COLLECTION_USTERKI = 'usterki'
@@ -55,13 +63,70 @@ def _warsaw_now():
         return datetime.now().astimezone()
     return datetime.now(tz)
 
-def add_log(user_id, action, target_type, target_id, details=None, before=None, after=None):
+# =======================================================================
+#                       PAGINACJA KURSOROWA
+# =======================================================================
+
+# Zamiast offset() (Firestore nalicza i skanuje każdy pominięty dokument) stronicujemy przez
+# start_after(ostatni dokument poprzedniej strony). Token strony jest nieprzezroczysty dla
+# klienta: zakodowane ID ostatniego dokumentu.
+
+def make_page_token(items):
+    """Zwraca token następnej strony dla listy wyników (ID ostatniego elementu) lub None."""
+    if not items:
+        return None
+    last_id = (items[-1] or {}).get('id')
+    if not last_id:
+        return None
+    import base64
+    return base64.urlsafe_b64encode(str(last_id).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_page_token(page_token):
+    if not page_token:
+        return None
+    import base64
+    try:
+        padded = page_token + '=' * (-len(page_token) % 4)
+        return base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8') or None
+    except Exception:
+        return None
+
+
+def _apply_page_token(query, collection: str, page_token):
+    """Przesuwa zapytanie za dokument wskazany tokenem. Nieprawidłowy/nieaktualny token = pierwsza strona."""
+    doc_id = _decode_page_token(page_token)
+    if not doc_id:
+        return query
+    db = get_firestore_client()
+    snap = db.collection(collection).document(doc_id).get()
+    if not snap.exists:
+        return query
+    return query.start_after(snap)
+
+
+def add_log(user_id, action, target_type, target_id, details=None, before=None, after=None, category=None):
     """Zapisuje log akcji użytkownika.
 
     Uwaga: zapisujemy czas lokalny (Warszawa) zamiast timestampu serwera Firestore,
     żeby użytkownicy widzieli spójne godziny niezależnie od strefy serwera.
+
+    Wpis trafia do bufora _log_writer i jest zapisywany w tle paczką WriteBatch
+    (patrz flush_logs); w trybie synchronicznym (LOG_WRITER_SYNC) – od razu.
     """
-    db = get_firestore_client()
+    log_data = _build_log_data(user_id, action, target_type, target_id, details=details, before=before, after=after, category=category)
+    _log_writer.write(log_data)
+
+def _log_category(before=None, after=None):
+    """Kategoria obiektu z loga: najpierw stan po zmianie, potem przed."""
+    for state in (after, before):
+        if isinstance(state, dict) and state.get('category'):
+            return state.get('category')
+    return None
+
+def _build_log_data(user_id, action, target_type, target_id, details=None, before=None, after=None, category=None):
+    # `category` jest zdenormalizowane z before/after, żeby liczniki osiągnięć
+    # mogły filtrować po nim w zapytaniach count() po stronie serwera.
     log_data = {
         'user_id': user_id,
         'action': action,
@@ -70,34 +135,354 @@ def add_log(user_id, action, target_type, target_id, details=None, before=None,
         'details': details,
         'before': before,
         'after': after,
+        'category': category or _log_category(before, after),
         'timestamp': _warsaw_now(),
     }
-    db.collection(COLLECTION_LOGS).add(log_data)
+    return _compact_log_data(log_data)
+
+
+# Logi różnicowe: dla zmian stanu sprzętu/usterek zapisujemy tylko zmienione pola
+# (`diff: True`, before/after = stare/nowe wartości zmienionych kluczy), a co
+# LOG_CHECKPOINT_EVERY wpisów danego obiektu – pełny stan (checkpoint). Pełne
+# before/after odtwarza expand_logs z łańcucha logów od ostatniego checkpointu.
+LOG_CHECKPOINT_EVERY = max(1, int(os.getenv('LOG_CHECKPOINT_EVERY', '10')))
+# Rozmiar strony przy przeglądaniu historii obiektu (get_item_state_at).
+LOG_HISTORY_PAGE = 50
+_LOG_STATE_TARGETS = {'sprzet', 'usterka'}
+_LOG_STATE_ACTIONS = {'add', 'edit', 'bulk_edit', 'import', 'restore', 'rename_id', 'delete'}
+# Akcje, w których `after` bywa tylko zbiorem zmienionych pól (update) – scalamy je z `before`.
+_LOG_MERGE_ACTIONS = {'edit', 'bulk_edit'}
+# Akcje zaczynające nowy łańcuch (obiekt powstaje pod tym ID) – zawsze pełny stan.
+_LOG_CHAIN_START_ACTIONS = {'add', 'rename_id'}
+
+# Liczba wpisów różnicowych od ostatniego checkpointu per (target_type, target_id).
+# Brak klucza (np. po restarcie workera) = następny wpis będzie checkpointem.
+_log_chain_counts: dict = {}
+_log_chain_lock = threading.Lock()
+
+
+def _is_state_log(log: dict) -> bool:
+    return log.get('action') in _LOG_STATE_ACTIONS and log.get('target_type') in _LOG_STATE_TARGETS
+
+
+def _compact_log_data(log_data: dict) -> dict:
+    """Zamienia pełne before/after na różnicę, jeśli nie przypada checkpoint."""
+    if not _is_state_log(log_data):
+        return log_data
+    before, after = log_data['before'], log_data['after']
+    key = (log_data['target_type'], log_data['target_id'])
+    if not isinstance(after, dict):
+        # Usunięcie albo zmiana bez zapisanego stanu – łańcuch się urywa.
+        with _log_chain_lock:
+            _log_chain_counts.pop(key, None)
+        return log_data
+    if isinstance(before, dict) and log_data['action'] in _LOG_MERGE_ACTIONS:
+        after = {**before, **after}
+        log_data['after'] = after
+
+    with _log_chain_lock:
+        count = _log_chain_counts.get(key)
+        if (count is None or count + 1 >= LOG_CHECKPOINT_EVERY or not isinstance(before, dict)
+                or log_data['action'] in _LOG_CHAIN_START_ACTIONS):
+            _log_chain_counts[key] = 0
+            return log_data
+        _log_chain_counts[key] = count + 1
+
+    log_data['before'] = {k: v for k, v in before.items() if k not in after or after[k] != v}
+    log_data['after'] = {k: v for k, v in after.items() if k not in before or before[k] != v}
+    log_data['diff'] = True
+    return log_data
+
+
+def _apply_log_diff(state: dict, log: dict) -> tuple[dict, dict]:
+    """Pełne (before, after) wpisu różnicowego na podstawie stanu sprzed niego."""
+    diff_before, diff_after = log.get('before') or {}, log.get('after') or {}
+    before = {**state, **diff_before}
+    after = {k: v for k, v in before.items() if k in diff_after or k not in diff_before}
+    after.update(diff_after)
+    return before, after
+
+
+# Odtworzone pełne stany wpisów (log_id -> (before, after)). Wpisy logów są niezmienne,
+# więc cache nie wymaga unieważniania – ogranicza go tylko LOG_STATE_CACHE_SIZE (LRU).
+# Odtwarzanie kończy się na najbliższym checkpoincie albo wpisie z cache.
+LOG_STATE_CACHE_SIZE = int(os.getenv('LOG_STATE_CACHE_SIZE', '2000'))
+_log_state_cache: OrderedDict = OrderedDict()
+_log_state_cache_lock = threading.Lock()
+
+
+def _log_state_cache_get(log_id: str):
+    with _log_state_cache_lock:
+        entry = _log_state_cache.get(log_id)
+        if entry is not None:
+            _log_state_cache.move_to_end(log_id)
+        return entry
+
+
+def _log_state_cache_put(log_id: str, before, after) -> None:
+    if LOG_STATE_CACHE_SIZE <= 0:
+        return
+    with _log_state_cache_lock:
+        _log_state_cache[log_id] = (before, after)
+        _log_state_cache.move_to_end(log_id)
+        while len(_log_state_cache) > LOG_STATE_CACHE_SIZE:
+            _log_state_cache.popitem(last=False)
 
-def get_logs_by_user(user_id, limit=None, offset=None):
-    """Pobiera logi dla konkretnego użytkownika."""
+
+def invalidate_log_state_cache() -> None:
+    with _log_state_cache_lock:
+        _log_state_cache.clear()
+
+
+def _load_log_chain(target_id: str, newest_log_id: str, needed: set) -> list:
+    """Logi obiektu od `newest_log_id` wstecz aż do checkpointu (lub wpisu z cache) starszego niż wszystkie `needed`."""
+    db = get_firestore_client()
+    query = db.collection(COLLECTION_LOGS).where(filter=firestore.FieldFilter('target_id', '==', target_id)).order_by('timestamp', direction=firestore.Query.DESCENDING)
+    snap = db.collection(COLLECTION_LOGS).document(newest_log_id).get()
+    if snap.exists:
+        query = query.start_at(snap)
+    chain = []
+    missing = set(needed)
+    for doc in query.stream():
+        log = _get_doc_data(doc)
+        chain.append(log)
+        missing.discard(log['id'])
+        if not missing and _is_state_log(log) and (not log.get('diff') or _log_state_cache_get(log['id'])):
+            break
+    chain.reverse()
+    return chain
+
+
+def expand_logs(logs: list) -> list:
+    """Uzupełnia wpisy różnicowe pełnymi stanami before/after (w miejscu).
+
+    Logi bez `diff` (checkpointy i starsze wpisy) zostają bez zmian. Dla każdego
+    obiektu łańcuch jest czytany jednym zapytaniem od najnowszego wpisu z listy.
+    Odtworzone wpisy tracą flagę `diff`; wpis, którego nie dało się odtworzyć
+    (brak checkpointu), zostaje z samą różnicą.
+    """
+    pending: dict = {}
+    for log in logs:
+        if log and log.get('diff'):
+            cached = _log_state_cache_get(log['id'])
+            if cached is not None:
+                log['before'], log['after'] = cached
+                log.pop('diff')
+                continue
+            key = (log.get('target_type'), log.get('target_id'))
+            # Listy logów są posortowane malejąco – pierwszy wpis obiektu jest najnowszy.
+            group = pending.setdefault(key, {'newest': log, 'logs': {}})
+            group['logs'][log['id']] = log
+
+    for (target_type, target_id), group in pending.items():
+        state = None
+        for entry in _load_log_chain(target_id, group['newest']['id'], set(group['logs'])):
+            if entry.get('target_type') != target_type or not _is_state_log(entry):
+                continue
+            if not entry.get('diff'):
+                state = entry.get('after') if isinstance(entry.get('after'), dict) else None
+                continue
+            cached = _log_state_cache_get(entry['id'])
+            if cached is not None:
+                before, after = cached
+            elif state is None:
+                # Łańcuch bez checkpointu (np. usunięty fragment) – zostawiamy samą różnicę.
+                continue
+            else:
+                before, after = _apply_log_diff(state, entry)
+                _log_state_cache_put(entry['id'], before, after)
+            target = group['logs'].get(entry['id'])
+            if target is not None:
+                target['before'], target['after'] = before, after
+                target.pop('diff')
+            state = after
+    return logs
+
+
+def get_item_state_at(target_type: str, target_id: str, at) -> tuple[dict | None, dict | None]:
+    """Stan sprzętu/usterki w chwili `at` odtworzony z łańcucha logów.
+
+    Zwraca (stan, log): `log` to ostatni wpis zmieniający stan nie później niż `at`.
+    Stan None oznacza, że obiekt wtedy nie istniał (usunięty albo jeszcze nie dodany)
+    lub jego historia jest już tylko w archiwum. Zapytanie jest stronicowane kursorem
+    i ograniczone do `timestamp <= at`, więc koszt nie zależy od liczby nowszych wpisów.
+    """
+    page_token = None
+    while True:
+        logs = get_logs_by_target(target_id, limit=LOG_HISTORY_PAGE, page_token=page_token, until=at)
+        for log in logs:
+            if log.get('target_type') != target_type or not _is_state_log(log):
+                continue
+            expand_logs([log])
+            if log.get('diff') or not isinstance(log.get('after'), dict):
+                return None, log
+            return log['after'], log
+        if len(logs) < LOG_HISTORY_PAGE:
+            return None, None
+        page_token = make_page_token(logs)
+
+
+def diff_states(old: dict | None, new: dict | None) -> list[tuple[str, object, object]]:
+    """Lista (pole, wartość w old, wartość w new) dla pól, które się różnią."""
+    old, new = old or {}, new or {}
+    return [(k, old.get(k), new.get(k)) for k in sorted(set(old) | set(new)) if old.get(k) != new.get(k)]
+
+
+# Bufor logów: add_log nie czeka na Firestore. Wpisy są zapisywane paczkami WriteBatch przez
+# wątek w tle – gdy uzbiera się LOG_BUFFER_SIZE wpisów albo co LOG_FLUSH_INTERVAL_MS.
+# Bufor jest opróżniany przy odczycie logów w tym procesie, przy wyjściu workera
+# (worker_exit w gunicorn.conf.py, atexit) i przed liczeniem osiągnięć z liczników logów.
+class _LogWriter:
+    def __init__(self):
+        self._buffer: list = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.sync = _env_flag('LOG_WRITER_SYNC', False)
+        self.max_size = min(int(os.getenv('LOG_BUFFER_SIZE', '200')), BULK_WRITE_CHUNK)
+        self.interval = int(os.getenv('LOG_FLUSH_INTERVAL_MS', '500')) / 1000.0
+        # Limit wpisów trzymanych po nieudanym zapisie (potem najstarsze są porzucane).
+        self.max_pending = self.max_size * 20
+
+    def _ensure_thread(self) -> None:
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != pid:
+                # Po fork() bufor rodzica należy do rodzica.
+                self._buffer = []
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._buffer:
+                    return
+                deadline = monotonic() + self.interval
+                while len(self._buffer) < self.max_size and not self._closed:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            self.flush()
+
+    def write(self, log_data: dict) -> None:
+        if self.sync or self._closed:
+            self._commit([log_data])
+            return
+        self._ensure_thread()
+        with self._cond:
+            self._buffer.append(log_data)
+            if len(self._buffer) == 1 or len(self._buffer) >= self.max_size:
+                self._cond.notify()
+
+    def _commit(self, entries: list) -> None:
+        db = get_firestore_client()
+        if len(entries) == 1:
+            db.collection(COLLECTION_LOGS).add(entries[0])
+        else:
+            batch = db.batch()
+            for entry in entries:
+                batch.set(db.collection(COLLECTION_LOGS).document(), entry)
+            batch.commit()
+        _record_log_stats(entries)
+
+    def flush(self) -> int:
+        """Zapisuje zbuforowane wpisy; zwraca liczbę zapisanych."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    entries = self._buffer[:self.max_size]
+                    del self._buffer[:len(entries)]
+                if not entries:
+                    return written
+                try:
+                    self._commit(entries)
+                    written += len(entries)
+                except Exception as e:
+                    with self._cond:
+                        self._buffer[:0] = entries
+                        dropped = len(self._buffer) - self.max_pending
+                        if dropped > 0:
+                            del self._buffer[:dropped]
+                    print(f"Log flush failed ({len(entries)} entries, "
+                          f"{max(dropped, 0)} dropped): {e}")
+                    return written
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Zamyka bufor: kolejne wpisy są zapisywane synchronicznie, zaległe – od razu."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._buffer)
+
+
+def flush_logs() -> int:
+    """Wymusza zapis zbuforowanych logów (np. przed odczytem logów lub przy wyjściu workera)."""
+    if not _log_writer.pending():
+        return 0
+    return _log_writer.flush()
+
+
+def close_log_writer(timeout: float = 10.0) -> None:
+    _log_writer.close(timeout)
+
+
+def set_log_writer_sync(enabled: bool = True) -> None:
+    """Tryb synchroniczny (testy, skrypty): add_log zapisuje od razu."""
+    if enabled:
+        flush_logs()
+    _log_writer.sync = enabled
+
+def get_logs_by_user(user_id, limit=None, offset=None, page_token=None):
+    """Pobiera logi dla konkretnego użytkownika (page_token – patrz make_page_token)."""
+    flush_logs()
     db = get_firestore_client()
     query = db.collection(COLLECTION_LOGS).where(filter=firestore.FieldFilter('user_id', '==', user_id)).order_by('timestamp', direction=firestore.Query.DESCENDING)
+    query = _apply_page_token(query, COLLECTION_LOGS, page_token)
     if limit:
         query = query.limit(limit)
     if offset:
         query = query.offset(offset)
     return [_get_doc_data(doc) for doc in query.stream()]
 
-def get_logs_by_target(target_id, limit=None, offset=None):
-    """Pobiera logi dla konkretnego obiektu (sprzętu lub usterki)."""
+def get_logs_by_target(target_id, limit=None, offset=None, page_token=None, until=None):
+    """Pobiera logi dla konkretnego obiektu (sprzętu lub usterki); `until` – tylko wpisy nie nowsze niż ta chwila."""
+    flush_logs()
     db = get_firestore_client()
-    query = db.collection(COLLECTION_LOGS).where(filter=firestore.FieldFilter('target_id', '==', target_id)).order_by('timestamp', direction=firestore.Query.DESCENDING)
+    query = db.collection(COLLECTION_LOGS).where(filter=firestore.FieldFilter('target_id', '==', target_id))
+    if until is not None:
+        query = query.where(filter=firestore.FieldFilter('timestamp', '<=', until))
+    query = query.order_by('timestamp', direction=firestore.Query.DESCENDING)
+    query = _apply_page_token(query, COLLECTION_LOGS, page_token)
     if limit:
         query = query.limit(limit)
     if offset:
         query = query.offset(offset)
     return [_get_doc_data(doc) for doc in query.stream()]
 
-def get_all_logs(limit=None, offset=None):
+def get_all_logs(limit=None, offset=None, page_token=None):
     """Pobiera wszystkie logi (dla admina/zalogowanych)."""
+    flush_logs()
     db = get_firestore_client()
     query = db.collection(COLLECTION_LOGS).order_by('timestamp', direction=firestore.Query.DESCENDING)
+    query = _apply_page_token(query, COLLECTION_LOGS, page_token)
     if limit:
         query = query.limit(limit)
     if offset:
@@ -106,6 +491,7 @@ def get_all_logs(limit=None, offset=None):
 
 def get_logs_count(user_id=None, target_id=None):
     """Zwraca liczbę logów, opcjonalnie filtrowaną."""
+    flush_logs()
     db = get_firestore_client()
     query = db.collection(COLLECTION_LOGS)
     if user_id:
@@ -118,15 +504,17 @@ def get_logs_count(user_id=None, target_id=None):
 
 def get_log(log_id):
     """Pobiera pojedynczy log."""
+    flush_logs()
     db = get_firestore_client()
     doc = db.collection(COLLECTION_LOGS).document(log_id).get()
     return _get_doc_data(doc)
 
 def restore_item(log_id, user_id):
-    """Przywraca stan obiektu z loga."""
+    """Przywraca stan obiektu z loga (wpisy różnicowe są najpierw odtwarzane do pełnego stanu)."""
     log = get_log(log_id)
     if not log:
         return False, "Nie znaleziono loga."
+    expand_logs([log])
 
     target_type = log.get('target_type')
     target_id = log.get('target_id')
@@ -184,41 +572,336 @@ def _get_doc_data(doc):
     """Pomocnicza funkcja do konwersji dokumentu Firestore na słownik z ID i formatowaniem daty."""
     if not doc.exists:
         return None
-    data = doc.to_dict()
-    data['id'] = doc.id
+    return _normalize_doc_data(doc.to_dict(), doc.id)
+
+def _normalize_doc_data(data, doc_id):
+    """Dokleja ID i formatuje pola dat tak samo jak przy odczycie z Firestore."""
+    data = dict(data or {})
+    data['id'] = doc_id
     if 'data_zgloszenia' in data and hasattr(data['data_zgloszenia'], 'strftime'):
         data['data_zgloszenia'] = data['data_zgloszenia'].strftime('%Y-%m-%d %H:%M')
     if 'timestamp' in data and hasattr(data['timestamp'], 'strftime'):
         data['timestamp'] = data['timestamp'].strftime('%Y-%m-%d %H:%M')
     return data
 
+# =======================================================================
+#                       CACHE KOLEKCJI SPRZĘTU
+# =======================================================================
+
+# Współdzielony w obrębie procesu (workera gunicorna) snapshot kolekcji `sprzet`.
+# Pełny odczyt wykonujemy raz, a potem utrzymujemy stan na bieżąco:
+# - listenerem Firestore `on_snapshot` (delty z innych workerów/instancji),
+# - write-through z set_item/update_item/delete_item/add_item (własne zapisy widoczne od razu).
+# Gdy listener nie działa (np. brak uprawnień, emulator), cache wygasa po `ttl_seconds`.
+_sprzet_cache = {
+    'items': None,       # id -> znormalizowany dokument
+    'sorted_ids': None,  # ID w kolejności order_by('__name__'); None = do przeliczenia
+    'version': 0,        # rośnie przy każdej zmianie danych
+    'loaded_at': 0,
+    'pid': None,         # PID procesu, który zbudował cache (ochrona po fork())
+    'watch': None,       # uchwyt listenera on_snapshot
+    'ready': None,       # threading.Event – pierwszy snapshot z listenera
+    'ttl_seconds': int(os.getenv('SPRZET_CACHE_TTL', '300')),
+    'listener_wait_seconds': 10,
+}
+_sprzet_cache_lock = threading.RLock()
+# Obserwatorzy zmian pojedynczych dokumentów (indeksy pochodne aktualizowane przyrostowo).
+_sprzet_cache_observers = []
+
+
+def _env_flag(name: str, default: bool = True) -> bool:
+    val = os.getenv(name)
+    if val is None:
+        return default
+    return str(val).strip().lower() in {'1', 'true', 'yes', 'y', 'on'}
+
+
+def _sprzet_cache_enabled() -> bool:
+    return _env_flag('SPRZET_CACHE', True)
+
+
+def _copy_doc(data: dict) -> dict:
+    """Płytka kopia dokumentu z kopią list/map – widoki modyfikują słowniki w miejscu."""
+    out = {}
+    for k, v in data.items():
+        if isinstance(v, list):
+            v = list(v)
+        elif isinstance(v, dict):
+            v = dict(v)
+        out[k] = v
+    return out
+
+
+def _sprzet_cache_is_fresh() -> bool:
+    c = _sprzet_cache
+    if c['items'] is None or c['pid'] != os.getpid():
+        return False
+    watch = c['watch']
+    if watch is not None and getattr(watch, 'is_active', False):
+        return True
+    return (time() - c['loaded_at']) < c['ttl_seconds']
+
+
+def _sprzet_cache_replace(docs) -> None:
+    """Podmienia całą zawartość cache (pełny odczyt lub pierwszy snapshot listenera)."""
+    items = {}
+    for doc in docs:
+        data = _get_doc_data(doc)
+        if data is not None:
+            items[doc.id] = data
+    with _sprzet_cache_lock:
+        _sprzet_cache['items'] = items
+        _sprzet_cache['sorted_ids'] = None
+        _sprzet_cache['version'] += 1
+        _sprzet_cache['loaded_at'] = time()
+        _sprzet_cache['pid'] = os.getpid()
+
+
+def _notify_sprzet_observers(item_id: str, data) -> None:
+    version = _sprzet_cache['version']
+    for fn in list(_sprzet_cache_observers):
+        try:
+            fn(item_id, data, version)
+        except Exception as e:
+            print(f"Sprzet cache observer error: {e}")
+
+
+def _sprzet_cache_put(item_id: str, data: dict) -> None:
+    with _sprzet_cache_lock:
+        items = _sprzet_cache['items']
+        if items is None:
+            return
+        if item_id not in items:
+            _sprzet_cache['sorted_ids'] = None
+        items[item_id] = _normalize_doc_data(data, item_id)
+        _sprzet_cache['version'] += 1
+        _notify_sprzet_observers(item_id, items[item_id])
+
+
+def _sprzet_cache_drop(item_id: str) -> None:
+    with _sprzet_cache_lock:
+        items = _sprzet_cache['items']
+        if items is None or item_id not in items:
+            return
+        del items[item_id]
+        _sprzet_cache['sorted_ids'] = None
+        _sprzet_cache['version'] += 1
+        _notify_sprzet_observers(item_id, None)
+
+
+def register_sprzet_cache_observer(fn) -> None:
+    """Rejestruje `fn(item_id, data_or_None, version)` wołaną po każdej zmianie pojedynczego elementu.
+
+    Wywołanie odbywa się pod lockiem cache, więc obserwator musi być szybki i nie może czytać
+    z Firestore. Pełne przeładowanie cache nie jest zgłaszane – zmienia tylko wersję.
+    """
+    if fn not in _sprzet_cache_observers:
+        _sprzet_cache_observers.append(fn)
+
+
+def _on_sprzet_snapshot(docs, changes, read_time):
+    """Callback listenera: pierwszy snapshot zasila cache, kolejne nakładają delty."""
+    ready = _sprzet_cache['ready']
+    if ready is not None and not ready.is_set():
+        _sprzet_cache_replace(docs)
+        ready.set()
+        return
+    for change in changes:
+        doc = change.document
+        if change.type.name == 'REMOVED':
+            _sprzet_cache_drop(doc.id)
+        else:
+            _sprzet_cache_put(doc.id, doc.to_dict() or {})
+
+
+def _start_sprzet_listener():
+    """Uruchamia listener on_snapshot (raz na proces). Zwraca Event pierwszego snapshotu lub None."""
+    if not _env_flag('SPRZET_CACHE_LISTENER', True):
+        return None
+    watch = _sprzet_cache['watch']
+    if watch is not None and getattr(watch, 'is_active', False):
+        return _sprzet_cache['ready']
+    ready = threading.Event()
+    _sprzet_cache['ready'] = ready
+    try:
+        db = get_firestore_client()
+        _sprzet_cache['watch'] = db.collection(COLLECTION_SPRZET).on_snapshot(_on_sprzet_snapshot)
+    except Exception as e:
+        print(f"Sprzet cache listener unavailable, falling back to TTL: {e}")
+        _sprzet_cache['watch'] = None
+        _sprzet_cache['ready'] = None
+        return None
+    return ready
+
+
+def _get_sprzet_snapshot() -> dict:
+    """Zwraca mapę id -> dokument z cache, ładując ją przy pierwszym użyciu lub po wygaśnięciu."""
+    with _sprzet_cache_lock:
+        if _sprzet_cache_is_fresh():
+            return _sprzet_cache['items']
+        if _sprzet_cache['pid'] != os.getpid():
+            # Po fork() wątek listenera nie istnieje w procesie potomnym – zaczynamy od zera.
+            _sprzet_cache['items'] = None
+            _sprzet_cache['watch'] = None
+            _sprzet_cache['ready'] = None
+        ready = _start_sprzet_listener()
+
+    # Czekamy poza lockiem – callback listenera sam go bierze.
+    if ready is not None and ready.wait(_sprzet_cache['listener_wait_seconds']):
+        with _sprzet_cache_lock:
+            if _sprzet_cache['items'] is not None:
+                return _sprzet_cache['items']
+
+    db = get_firestore_client()
+    _sprzet_cache_replace(db.collection(COLLECTION_SPRZET).stream())
+    return _sprzet_cache['items']
+
+
+def _get_sprzet_sorted_ids() -> list:
+    items = _get_sprzet_snapshot()
+    with _sprzet_cache_lock:
+        ids = _sprzet_cache['sorted_ids']
+        if ids is None:
+            ids = sorted(items.keys())
+            _sprzet_cache['sorted_ids'] = ids
+        return ids
+
+
+def invalidate_sprzet_cache() -> None:
+    """Wymusza ponowny pełny odczyt przy następnym dostępie (np. po imporcie skryptem)."""
+    with _sprzet_cache_lock:
+        watch = _sprzet_cache['watch']
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                pass
+        _sprzet_cache['items'] = None
+        _sprzet_cache['sorted_ids'] = None
+        _sprzet_cache['watch'] = None
+        _sprzet_cache['ready'] = None
+        _sprzet_cache['version'] += 1
+
+
+def get_sprzet_cache_version() -> int:
+    """Wersja danych w cache – pozwala budować indeksy pochodne raz na zmianę.
+
+    Zwraca None, gdy cache jest wyłączony (wtedy indeksy trzeba budować przy każdym użyciu).
+    """
+    if not _sprzet_cache_enabled():
+        return None
+    _get_sprzet_snapshot()
+    return _sprzet_cache['version']
+
+
+def _get_cached_sprzet_item(sprzet_id: str):
+    items = _get_sprzet_snapshot()
+    with _sprzet_cache_lock:
+        data = items.get(sprzet_id)
+        if data is not None:
+            return _copy_doc(data)
+    # Brak w cache: element mógł właśnie powstać w innym workerze (listener jeszcze nie dostarczył
+    # delty albo działa tryb TTL). Pojedynczy odczyt jest tani, a wynik uzupełnia cache.
+    db = get_firestore_client()
+    doc = db.collection(COLLECTION_SPRZET).document(sprzet_id).get()
+    data = _get_doc_data(doc)
+    if data is None:
+        return None
+    _sprzet_cache_put(sprzet_id, {k: v for k, v in data.items() if k != 'id'})
+    return data
+
 def get_item(collection: str, item_id: str):
     """Pobiera pojedynczy element z dowolnej kolekcji."""
+    if collection == COLLECTION_SPRZET and item_id and _sprzet_cache_enabled():
+        return _get_cached_sprzet_item(item_id)
     db = get_firestore_client()
     doc = db.collection(collection).document(item_id).get()
     return _get_doc_data(doc)
 
-def get_all_items(collection: str, order_by=None, direction=firestore.Query.DESCENDING):
-    """Pobiera wszystkie elementy z kolekcji z opcjonalnym sortowaniem."""
+# Liczba referencji w jednym wywołaniu client.get_all (BatchGetDocuments).
+GET_MANY_CHUNK = 100
+
+def get_items_many(collection: str, ids) -> list:
+    """Pobiera wiele dokumentów jednym zapytaniem batch-get (client.get_all), w paczkach.
+
+    Wynik zachowuje kolejność `ids`; duplikaty są pobierane raz, brakujące dokumenty pomijane.
+    Dla kolekcji sprzętu korzysta z cache, a doczytuje tylko to, czego w nim brak.
+    """
+    wanted = [str(i) for i in (ids or []) if i]
+    unique = list(dict.fromkeys(wanted))
+    if not unique:
+        return []
+
+    found: dict = {}
+    missing = unique
+    if collection == COLLECTION_SPRZET and _sprzet_cache_enabled():
+        items = _get_sprzet_snapshot()
+        with _sprzet_cache_lock:
+            for i in unique:
+                if i in items:
+                    found[i] = _copy_doc(items[i])
+        missing = [i for i in unique if i not in found]
+
+    if missing:
+        db = get_firestore_client()
+        col = db.collection(collection)
+        for start in range(0, len(missing), GET_MANY_CHUNK):
+            refs = [col.document(i) for i in missing[start:start + GET_MANY_CHUNK]]
+            for doc in db.get_all(refs):
+                data = _get_doc_data(doc)
+                if data is None:
+                    continue
+                found[doc.id] = data
+                if collection == COLLECTION_SPRZET:
+                    _sprzet_cache_put(doc.id, {k: v for k, v in data.items() if k != 'id'})
+
+    return [found[i] for i in unique if i in found]
+
+def _project(data: dict, fields) -> dict:
+    """Zostawia tylko wskazane pola (+ id) – odpowiednik select() dla danych z cache."""
+    out = {'id': data.get('id')}
+    for f in fields:
+        if f in data:
+            v = data[f]
+            out[f] = list(v) if isinstance(v, list) else (dict(v) if isinstance(v, dict) else v)
+    return out
+
+def get_all_items(collection: str, order_by=None, direction=firestore.Query.DESCENDING, fields=None):
+    """Pobiera wszystkie elementy z kolekcji z opcjonalnym sortowaniem.
+
+    `fields` – lista pól do pobrania (projekcja select()); ID dokumentu jest zawsze dołączane.
+    """
     db = get_firestore_client()
     query = db.collection(collection)
+    if fields:
+        query = query.select(list(fields))
     if order_by:
         query = query.order_by(order_by, direction=direction)
     return [_get_doc_data(doc) for doc in query.stream()]
 
-def get_items_by_filters(collection: str, filters: list, order_by=None, direction=firestore.Query.DESCENDING):
-    """Pobiera elementy z kolekcji na podstawie wielu filtrów."""
+def get_items_by_filters(collection: str, filters: list, order_by=None, direction=firestore.Query.DESCENDING, fields=None):
+    """Pobiera elementy z kolekcji na podstawie wielu filtrów (opcjonalnie tylko wybrane `fields`)."""
     db = get_firestore_client()
     query = db.collection(collection)
+    if fields:
+        query = query.select(list(fields))
     for field, op, val in filters:
         query = query.where(filter=firestore.FieldFilter(field, op, val))
     if order_by:
         query = query.order_by(order_by, direction=direction)
     return [_get_doc_data(doc) for doc in query.stream()]
 
-def get_items_by_filter(collection: str, field: str, operator: str, value: str, order_by=None, direction=firestore.Query.DESCENDING):
+def count_items_by_filters(collection: str, filters: list) -> int:
+    """Zwraca liczbę dokumentów spełniających filtry (agregacja count() po stronie serwera)."""
+    db = get_firestore_client()
+    query = db.collection(collection)
+    for field, op, val in filters:
+        query = query.where(filter=firestore.FieldFilter(field, op, val))
+    return query.count().get()[0][0].value
+
+def get_items_by_filter(collection: str, field: str, operator: str, value: str, order_by=None, direction=firestore.Query.DESCENDING, fields=None):
     """Pobiera elementy z kolekcji na podstawie filtra z opcjonalnym sortowaniem."""
-    return get_items_by_filters(collection, [(field, operator, value)], order_by, direction)
+    return get_items_by_filters(collection, [(field, operator, value)], order_by, direction, fields=fields)
 
 def get_sprzet_item(sprzet_id: str):
     return get_item(COLLECTION_SPRZET, sprzet_id)
@@ -226,18 +909,32 @@ def get_sprzet_item(sprzet_id: str):
 def get_usterka_item(usterka_id: str):
     return get_item(COLLECTION_USTERKI, usterka_id)
 
-def get_all_sprzet(category=None):
+def get_all_sprzet(category=None, fields=None):
+    """Cały sprzęt (opcjonalnie z kategorii). `fields` ogranicza zwracane pola (projekcja)."""
+    if _sprzet_cache_enabled():
+        items = _get_sprzet_snapshot()
+        ids = _get_sprzet_sorted_ids()
+        copy = (lambda d: _project(d, fields)) if fields else _copy_doc
+        with _sprzet_cache_lock:
+            return [copy(items[i]) for i in ids
+                    if i in items and (not category or items[i].get('category') == category)]
     if category:
-        return get_items_by_filter(COLLECTION_SPRZET, 'category', '==', category, order_by='__name__', direction=firestore.Query.ASCENDING)
-    return get_all_items(COLLECTION_SPRZET, order_by='__name__', direction=firestore.Query.ASCENDING)
+        return get_items_by_filter(COLLECTION_SPRZET, 'category', '==', category, order_by='__name__', direction=firestore.Query.ASCENDING, fields=fields)
+    return get_all_items(COLLECTION_SPRZET, order_by='__name__', direction=firestore.Query.ASCENDING, fields=fields)
 
 def get_items_by_parent(parent_id):
+    if _sprzet_cache_enabled():
+        items = _get_sprzet_snapshot()
+        ids = _get_sprzet_sorted_ids()
+        with _sprzet_cache_lock:
+            return [_copy_doc(items[i]) for i in ids if i in items and items[i].get('parent_id') == parent_id]
     return get_items_by_filter(COLLECTION_SPRZET, 'parent_id', '==', parent_id, order_by='__name__', direction=firestore.Query.ASCENDING)
 
-def get_all_usterki(limit=None, offset=None):
-    """Pobiera usterki z opcjonalną paginacją."""
+def get_all_usterki(limit=None, offset=None, page_token=None):
+    """Pobiera usterki z opcjonalną paginacją (preferowany page_token zamiast offset)."""
     db = get_firestore_client()
     query = db.collection(COLLECTION_USTERKI).order_by('data_zgloszenia', direction=firestore.Query.DESCENDING)
+    query = _apply_page_token(query, COLLECTION_USTERKI, page_token)
 
     if offset is not None:
         if not isinstance(offset, int) or offset < 0:
@@ -257,6 +954,29 @@ def update_item(collection: str, item_id: str, **kwargs):
     """Aktualizuje dokument w dowolnej kolekcji."""
     db = get_firestore_client()
     db.collection(collection).document(item_id).update(kwargs)
+    if collection == COLLECTION_SPRZET:
+        _sprzet_cache_merge(item_id, kwargs)
+
+def _sprzet_cache_merge(item_id: str, changes: dict) -> None:
+    """Write-through dla update(): proste pola nakładamy lokalnie, resztę doczytujemy."""
+    if _sprzet_cache['items'] is None:
+        return
+    plain = all('.' not in k and (v is None or isinstance(v, (str, int, float, bool, list, dict)))
+                for k, v in changes.items())
+    with _sprzet_cache_lock:
+        current = (_sprzet_cache['items'] or {}).get(item_id)
+        if plain and current is not None:
+            merged = {k: v for k, v in current.items() if k != 'id'}
+            merged.update(changes)
+            _sprzet_cache_put(item_id, merged)
+            return
+    # Ścieżki zagnieżdżone / sentinele (DELETE_FIELD, Increment) – stan znamy dopiero z bazy.
+    db = get_firestore_client()
+    data = _get_doc_data(db.collection(COLLECTION_SPRZET).document(item_id).get())
+    if data is None:
+        _sprzet_cache_drop(item_id)
+    else:
+        _sprzet_cache_put(item_id, {k: v for k, v in data.items() if k != 'id'})
 
 def update_usterka(usterka_id: str, **kwargs):
     update_item(COLLECTION_USTERKI, usterka_id, **kwargs)
@@ -268,6 +988,8 @@ def set_item(collection: str, item_id: str, data: dict):
     """Tworzy lub nadpisuje dokument o konkretnym ID."""
     db = get_firestore_client()
     db.collection(collection).document(item_id).set(data)
+    if collection == COLLECTION_SPRZET:
+        _sprzet_cache_put(item_id, data)
     return item_id
 
 def add_item(collection: str, data: dict):
@@ -279,16 +1001,256 @@ def add_item(collection: str, data: dict):
     db = get_firestore_client()
     doc_id = (data or {}).get('id')
     if doc_id:
-        db.collection(collection).document(str(doc_id)).set({k: v for k, v in data.items() if k != 'id'})
+        payload = {k: v for k, v in data.items() if k != 'id'}
+        db.collection(collection).document(str(doc_id)).set(payload)
+        if collection == COLLECTION_SPRZET:
+            _sprzet_cache_put(str(doc_id), payload)
         return str(doc_id)
 
     doc_ref = db.collection(collection).add(data)
+    if collection == COLLECTION_SPRZET:
+        _sprzet_cache_put(doc_ref[1].id, data)
     return doc_ref[1].id
 
 def delete_item(collection: str, item_id: str):
     """Usuwa dokument z kolekcji."""
     db = get_firestore_client()
     db.collection(collection).document(item_id).delete()
+    if collection == COLLECTION_SPRZET:
+        _sprzet_cache_drop(item_id)
+
+# =======================================================================
+#                       ZAPISY ZBIORCZE
+# =======================================================================
+
+# Limit operacji w jednym WriteBatch (Firestore).
+BULK_WRITE_CHUNK = 500
+
+
+def bulk_op(action: str, collection: str, item_id: str, data: dict | None = None, log: dict | None = None) -> dict:
+    """Opis pojedynczej operacji dla bulk_write.
+
+    action: 'set' | 'update' | 'delete'. `log` to argumenty add_log (bez timestampu), np.
+    {'user_id': ..., 'action': 'bulk_edit', 'target_type': 'sprzet', 'before': ..., 'after': ...};
+    target_id domyślnie = item_id. Wpis logu trafia do tego samego batcha co zmiana danych.
+    """
+    if action not in ('set', 'update', 'delete'):
+        raise ValueError(f"Unsupported bulk action: {action}")
+    return {'action': action, 'collection': collection, 'id': str(item_id), 'data': data or {}, 'log': log}
+
+
+def _bulk_op_size(op: dict) -> int:
+    return 2 if op.get('log') else 1
+
+
+def _bulk_add_to_batch(db, batch, op: dict) -> dict | None:
+    ref = db.collection(op['collection']).document(op['id'])
+    if op['action'] == 'set':
+        batch.set(ref, op['data'])
+    elif op['action'] == 'update':
+        batch.update(ref, op['data'])
+    else:
+        batch.delete(ref)
+    log = op.get('log')
+    if log:
+        log_args = dict(log)
+        log_args.setdefault('target_id', op['id'])
+        log_data = _build_log_data(**log_args)
+        batch.set(db.collection(COLLECTION_LOGS).document(), log_data)
+        return log_data
+    return None
+
+
+def _bulk_apply_to_cache(op: dict) -> None:
+    if op['collection'] != COLLECTION_SPRZET:
+        return
+    if op['action'] == 'set':
+        _sprzet_cache_put(op['id'], op['data'])
+    elif op['action'] == 'update':
+        _sprzet_cache_merge(op['id'], op['data'])
+    else:
+        _sprzet_cache_drop(op['id'])
+
+
+def _bulk_commit(db, ops: list) -> None:
+    batch = db.batch()
+    logs = [_bulk_add_to_batch(db, batch, op) for op in ops]
+    batch.commit()
+    for op in ops:
+        _bulk_apply_to_cache(op)
+    _record_log_stats([log for log in logs if log])
+
+
+def bulk_write(ops: list) -> tuple[list[str], list[tuple[str, str]]]:
+    """Wykonuje operacje (z bulk_op) w paczkach WriteBatch po maks. BULK_WRITE_CHUNK zapisów.
+
+    Zmiana i jej wpis w logu zawsze trafiają do tej samej paczki (atomowo). Gdy commit paczki
+    się nie uda (np. update nieistniejącego dokumentu), paczka jest powtarzana element po
+    elemencie, żeby wskazać konkretne błędne pozycje.
+
+    Zwraca (lista ID zapisanych, lista (ID, komunikat błędu)).
+    """
+    db = get_firestore_client()
+    done: list[str] = []
+    errors: list[tuple[str, str]] = []
+
+    chunks: list[list] = []
+    current: list = []
+    size = 0
+    for op in ops:
+        op_size = _bulk_op_size(op)
+        if current and size + op_size > BULK_WRITE_CHUNK:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(op)
+        size += op_size
+    if current:
+        chunks.append(current)
+
+    for chunk in chunks:
+        try:
+            _bulk_commit(db, chunk)
+            done.extend(op['id'] for op in chunk)
+            continue
+        except Exception as e:
+            print(f"Bulk write chunk failed ({len(chunk)} ops), retrying per item: {e}")
+        for op in chunk:
+            try:
+                _bulk_commit(db, [op])
+                done.append(op['id'])
+            except Exception as e:
+                errors.append((op['id'], str(e)))
+    return done, errors
+
+
+# Bufor logów (add_log) – tworzony tu, bo korzysta z BULK_WRITE_CHUNK i _env_flag.
+_log_writer = _LogWriter()
+atexit.register(close_log_writer)
+
+# =======================================================================
+#                       STATYSTYKI UŻYTKOWNIKÓW
+# =======================================================================
+# Liczniki dla osiągnięć w jednym dokumencie users/{uid}/stats/counters:
+#   reports – zgłoszone usterki, loans – wypożyczenia na e-mail użytkownika (pole 'kontakt'),
+#   logs    – liczba logów per klucz 'action|target_type|category' ('*' = dowolna wartość);
+#             dodania/edycje sprzętu per kategoria to klucze 'add|sprzet|<kat>' i 'edit|sprzet|<kat>'.
+# Zapisy (add_log, bulk_write, add_loan, zgłoszenie usterki) podbijają liczniki przez
+# firestore.Increment. Dokument zakładamy przy pierwszym odczycie (get_user_stats), licząc
+# istniejące dane; do tego czasu inkrementy są pomijane, bo i tak zostaną policzone.
+
+USER_STATS_COLLECTION = 'stats'
+USER_STATS_DOC = 'counters'
+STATS_ANY = '*'
+
+
+def _user_stats_ref(db, uid: str):
+    return db.collection('users').document(uid).collection(USER_STATS_COLLECTION).document(USER_STATS_DOC)
+
+
+def log_stats_key(action=None, target_type=None, category=None) -> str:
+    """Klucz licznika logów; None oznacza brak filtra po danym polu."""
+    return '|'.join(v or STATS_ANY for v in (action, target_type, category))
+
+
+def _log_stats_keys(action, target_type, category) -> set[str]:
+    # Log podbija wszystkie kombinacje z '*', żeby każdą definicję osiągnięcia
+    # (filtrującą dowolny podzbiór pól) dało się odczytać z jednego licznika.
+    return {
+        log_stats_key(a, t, c)
+        for a in {action, None} for t in {target_type, None} for c in {category, None}
+    }
+
+
+def _increment_user_stats(uid: str, counters: dict) -> None:
+    """Podbija liczniki użytkownika; `counters`: ścieżka pola (krotka) -> przyrost."""
+    if not uid or not counters:
+        return
+    db = get_firestore_client()
+    updates = {FieldPath(*path).to_api_repr(): firestore.Increment(n) for path, n in counters.items()}
+    try:
+        _user_stats_ref(db, uid).update(updates)
+    except NotFound:
+        # Dokument jeszcze nie istnieje – zostanie policzony w całości przy pierwszym odczycie.
+        pass
+    except Exception as e:
+        print(f"User stats increment failed for {uid}: {e}")
+
+
+def _record_log_stats(logs: list) -> None:
+    per_user: dict = {}
+    for log in logs:
+        uid = log.get('user_id')
+        if not uid:
+            continue
+        counters = per_user.setdefault(uid, {})
+        for key in _log_stats_keys(log.get('action'), log.get('target_type'), log.get('category')):
+            counters[('logs', key)] = counters.get(('logs', key), 0) + 1
+    for uid, counters in per_user.items():
+        _increment_user_stats(uid, counters)
+
+
+def record_report_created(uid: str) -> None:
+    """Podbija licznik zgłoszonych usterek użytkownika."""
+    _increment_user_stats(uid, {('reports',): 1})
+
+
+def _record_loan_stats(email) -> None:
+    if not email:
+        return
+    from .db_users import get_user_by_email
+    try:
+        user = get_user_by_email(email)
+    except Exception:
+        user = None
+    if user:
+        _increment_user_stats(user.get('id'), {('loans',): 1})
+
+
+def _seed_user_stats(db, uid: str) -> dict:
+    """Liczy statystyki użytkownika od zera na podstawie istniejących danych."""
+    user_doc = db.collection('users').document(uid).get()
+    email = ((user_doc.to_dict() or {}) if user_doc.exists else {}).get('email')
+
+    logs: dict[str, int] = {}
+    query = db.collection(COLLECTION_LOGS).where(filter=firestore.FieldFilter('user_id', '==', uid))
+    query = query.select(['action', 'target_type', 'category', 'before.category', 'after.category'])
+    for doc in query.stream():
+        d = doc.to_dict() or {}
+        category = d.get('category') or _log_category(d.get('before'), d.get('after'))
+        for key in _log_stats_keys(d.get('action'), d.get('target_type'), category):
+            logs[key] = logs.get(key, 0) + 1
+
+    return {
+        'reports': count_items_by_filters(COLLECTION_USTERKI, [('user_id', '==', uid)]),
+        'loans': count_items_by_filters(COLLECTION_WYPOZYCZENIA, [('kontakt', '==', email)]) if email else 0,
+        'logs': logs,
+        'seeded_at': _warsaw_now(),
+    }
+
+
+def get_user_stats(uid: str) -> dict:
+    """Zwraca dokument statystyk użytkownika (jeden odczyt; przy pierwszym użyciu – zakłada go)."""
+    if not uid:
+        return {}
+    # Liczniki logów są podbijane przy zapisie bufora – zapisz zaległe wpisy tego procesu.
+    flush_logs()
+    db = get_firestore_client()
+    ref = _user_stats_ref(db, uid)
+    doc = ref.get()
+    if doc.exists:
+        return doc.to_dict() or {}
+    stats = _seed_user_stats(db, uid)
+    try:
+        ref.create(stats)
+    except AlreadyExists:
+        return ref.get().to_dict() or {}
+    return stats
+
+
+def get_user_log_count(stats: dict, action=None, target_type=None, category=None) -> int:
+    """Liczba logów z dokumentu statystyk dla podanych filtrów (None = bez filtra)."""
+    logs = (stats or {}).get('logs') or {}
+    return int(logs.get(log_stats_key(action, target_type, category)) or 0)
 
 # =======================================================================
 #                       OSIĄGNIĘCIA (DEFINICJE)
@@ -315,12 +1277,33 @@ def get_achievements_map() -> dict:
     return mp
 
 
+# Wersja definicji osiągnięć w tym procesie – rośnie przy każdym zapisie/usunięciu definicji.
+# achievements_service kompiluje z definicji tablicę reguł i przebudowuje ją, gdy wersja się
+# zmieni (inne workery odświeżają się po ACHIEVEMENT_RULES_TTL).
+_achievement_defs_state = {'version': 0}
+
+
+def invalidate_achievement_rules() -> None:
+    _achievement_defs_state['version'] += 1
+
+
+def get_achievement_defs_version() -> int:
+    return _achievement_defs_state['version']
+
+
 def set_achievement_def(achievement_id: str, data: dict):
     """Tworzy/aktualizuje definicję osiągnięcia."""
     base = dict(data or {})
     if 'id' not in base:
         base['id'] = achievement_id
     set_item(COLLECTION_ACHIEVEMENTS, achievement_id, base)
+    invalidate_achievement_rules()
+
+
+def delete_achievement_def(achievement_id: str):
+    """Usuwa definicję osiągnięcia."""
+    delete_item(COLLECTION_ACHIEVEMENTS, achievement_id)
+    invalidate_achievement_rules()
 
 
 def ensure_default_achievements_seeded():
@@ -443,6 +1426,7 @@ def ensure_default_achievements_seeded():
             # Wstaw tylko jeśli nie istnieje
             if a['id'] not in existing_ids:
                 set_item(COLLECTION_ACHIEVEMENTS, a['id'], payload)
+        invalidate_achievement_rules()
     except Exception:
         # Nie wywalaj aplikacji jeśli seed się nie uda – to tylko ułatwienie startu.
         pass
@@ -455,12 +1439,23 @@ def add_loan(data):
     """Dodaje nowe wypożyczenie."""
     data['status'] = 'active'
     data['timestamp'] = _warsaw_now()
-    return add_item(COLLECTION_WYPOZYCZENIA, data)
+    loan_id = add_item(COLLECTION_WYPOZYCZENIA, data)
+    _record_loan_stats(data.get('kontakt'))
+    return loan_id
 
 def get_active_loans():
     """Pobiera wszystkie aktywne wypożyczenia."""
     return get_items_by_filter(COLLECTION_WYPOZYCZENIA, 'status', '==', 'active', order_by='timestamp')
 
+def get_loans_history(limit=None, page_token=None):
+    """Historia wszystkich wypożyczeń (najnowsze pierwsze), stronicowana kursorem."""
+    db = get_firestore_client()
+    query = db.collection(COLLECTION_WYPOZYCZENIA).order_by('timestamp', direction=firestore.Query.DESCENDING)
+    query = _apply_page_token(query, COLLECTION_WYPOZYCZENIA, page_token)
+    if limit:
+        query = query.limit(limit)
+    return [_get_doc_data(doc) for doc in query.stream()]
+
 def get_loans_for_item(item_id):
     """Pobiera historię wypożyczeń dla danego przedmiotu."""
     return get_items_by_filter(COLLECTION_WYPOZYCZENIA, 'item_id', '==', item_id, order_by='timestamp')
@@ -469,18 +1464,85 @@ def mark_loan_returned(loan_id):
     """Oznacza wypożyczenie jako zwrócone."""
     update_item(COLLECTION_WYPOZYCZENIA, loan_id, status='returned', return_timestamp=_warsaw_now())
 
-def get_config():
+# Cache dokumentu config/app_settings. Czytany w gorących ścieżkach (upload zdjęć, listy
+# ustawień w pętlach, PIN, /health), zmieniany rzadko. Zapis z tego procesu unieważnia cache
+# od razu; zmiany z innych workerów widać po `ttl_seconds` albo natychmiast z listenerem
+# (CONFIG_CACHE_LISTENER=True).
+_config_cache = {
+    'data': None,
+    'cached_at': 0,
+    'pid': None,
+    'watch': None,
+    'ttl_seconds': int(os.getenv('CONFIG_CACHE_TTL', '10')),
+}
+_config_cache_lock = threading.RLock()
+
+
+def _on_config_snapshot(docs, changes, read_time):
+    data = {}
+    for doc in docs:
+        if doc.exists:
+            data = doc.to_dict() or {}
+    with _config_cache_lock:
+        _config_cache['data'] = data
+        _config_cache['cached_at'] = time()
+        _config_cache['pid'] = os.getpid()
+
+
+def _start_config_listener(db) -> None:
+    if not _env_flag('CONFIG_CACHE_LISTENER', False):
+        return
+    watch = _config_cache['watch']
+    if watch is not None and getattr(watch, 'is_active', False):
+        return
+    try:
+        _config_cache['watch'] = db.collection('config').document('app_settings').on_snapshot(_on_config_snapshot)
+    except Exception as e:
+        print(f"Config cache listener unavailable, using TTL only: {e}")
+        _config_cache['watch'] = None
+
+
+def _config_cache_is_fresh() -> bool:
+    c = _config_cache
+    if c['data'] is None or c['pid'] != os.getpid():
+        return False
+    watch = c['watch']
+    if watch is not None and getattr(watch, 'is_active', False):
+        return True
+    return (time() - c['cached_at']) < c['ttl_seconds']
+
+
+def invalidate_config_cache() -> None:
+    with _config_cache_lock:
+        _config_cache['data'] = None
+        _config_cache['cached_at'] = 0
+
+
+def get_config(fresh: bool = False):
+    """Zwraca config/app_settings (kopię z cache). `fresh=True` wymusza odczyt z Firestore."""
+    with _config_cache_lock:
+        if not fresh and _config_cache_is_fresh():
+            return _copy_doc(_config_cache['data'])
+        if _config_cache['pid'] != os.getpid():
+            _config_cache['watch'] = None
+
     from . import get_firestore_client
     db = get_firestore_client()
     doc = db.collection('config').document('app_settings').get()
-    if doc.exists:
-        return doc.to_dict()
-    return {}
+    data = (doc.to_dict() or {}) if doc.exists else {}
+    with _config_cache_lock:
+        _config_cache['data'] = data
+        _config_cache['cached_at'] = time()
+        _config_cache['pid'] = os.getpid()
+        _start_config_listener(db)
+    return _copy_doc(data)
 
 def update_config(**kwargs):
     from . import get_firestore_client
     db = get_firestore_client()
     db.collection('config').document('app_settings').set(kwargs, merge=True)
+    # Nie scalamy lokalnie (sentinele, typy dat) – następny odczyt pobierze stan z bazy.
+    invalidate_config_cache()
 
 def get_list_setting(key: str) -> list[str]:
     """Zwraca listę z ustawień aplikacji w Firestore (config/app_settings).
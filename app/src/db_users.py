@@ -1,7 +1,11 @@
+import os
+import threading
+from time import time
+
 from . import get_firestore_client
 from google.cloud import firestore
 
-from .db_firestore import _warsaw_now
+from .db_firestore import _env_flag, _warsaw_now
 
 COLLECTION_USERS = 'users'
 
@@ -19,41 +23,247 @@ def get_user_by_uid(uid: str):
     doc = db.collection(COLLECTION_USERS).document(uid).get()
     return _get_doc_data(doc)
 
-def get_user_by_email(email: str):
-    """Pobiera użytkownika po adresie email."""
+# Katalog użytkowników: lekkie rekordy wszystkich użytkowników i mapy wyszukiwania
+# (id -> nazwa wyświetlana, email -> id, identyfikatory dostawców OAuth -> id).
+# Karty, logi i podpowiedzi czytają go zamiast strumieniować kolekcję `users` przy każdym
+# żądaniu. Zapisy z tego procesu (create/update/delete_user) unieważniają katalog od razu;
+# zmiany z innych workerów odświeża listener `on_snapshot`, a bez niego – `ttl_seconds`.
+USER_DIRECTORY_FIELDS = ('email', 'first_name', 'last_name', 'role', 'active', 'is_admin',
+                         'google_id', 'microsoft_id', 'authentik_id')
+USER_PROVIDER_FIELDS = ('google_id', 'microsoft_id', 'authentik_id')
+
+_user_directory = {
+    'dir': None,
+    'cached_at': 0,
+    'pid': None,
+    'watch': None,
+    'ttl_seconds': int(os.getenv('USER_DIRECTORY_TTL', '60')),
+}
+_user_directory_lock = threading.RLock()
+
+
+def user_display_name(user: dict) -> str:
+    """Nazwa wyświetlana: imię i nazwisko, samo imię/nazwisko albo email (ostatecznie ID)."""
+    first_name = user.get('first_name', '')
+    last_name = user.get('last_name', '')
+    if first_name and last_name:
+        return f"{first_name} {last_name}"
+    if first_name:
+        return first_name
+    if last_name:
+        return last_name
+    return user.get('email', user['id'])
+
+
+def user_full_name(user: dict) -> str:
+    return f"{(user.get('first_name') or '').strip()} {(user.get('last_name') or '').strip()}".strip()
+
+
+# Długość n-gramów indeksu podpowiedzi (bigramy obsługują już 2-znakowe zapytania).
+_SUGGEST_GRAMS = (2, 3)
+# Najdłuższy indeksowany prefiks; dłuższe zapytania są zawężane po nim i weryfikowane.
+_SUGGEST_PREFIX_MAX = 8
+
+
+class UserDirectory:
+    """Niezmienny zrzut katalogu użytkowników z mapami wyszukiwania.
+
+    Zawiera też indeks podpowiedzi (prefiksy i n-gramy casefold emaila, imienia,
+    nazwiska i pełnej nazwy), więc suggest() nie przegląda wszystkich użytkowników.
+    """
+
+    def __init__(self, users):
+        self.users = {}
+        self.names = {}
+        self.by_email = {}
+        self.by_provider = {field: {} for field in USER_PROVIDER_FIELDS}
+        # casefold emaila / pełnej nazwy -> ID (do dokładnego dopasowania przy udostępnianiu list)
+        self._exact: dict[str, list] = {}
+        # uid -> (email, pełna nazwa, imię, nazwisko) po casefold
+        self._terms: dict[str, tuple] = {}
+        self._prefixes: dict[str, set] = {}
+        self._grams: dict[str, set] = {}
+        for user in users:
+            uid = user.get('id')
+            if not uid:
+                continue
+            record = {k: user.get(k) for k in USER_DIRECTORY_FIELDS if k in user}
+            record['id'] = uid
+            self.users[uid] = record
+            self.names[uid] = user_display_name(record)
+            if record.get('email'):
+                self.by_email.setdefault(record['email'], uid)
+            for field in USER_PROVIDER_FIELDS:
+                if record.get(field):
+                    self.by_provider[field].setdefault(record[field], uid)
+            self._index(uid, record)
+
+    def _index(self, uid: str, record: dict) -> None:
+        email = (record.get('email') or '').casefold()
+        full_name = user_full_name(record).casefold()
+        first = (record.get('first_name') or '').strip().casefold()
+        last = (record.get('last_name') or '').strip().casefold()
+        self._terms[uid] = (email, full_name, first, last)
+        for exact in {email, full_name} - {''}:
+            self._exact.setdefault(exact, []).append(uid)
+        for term in (email, full_name, first, last):
+            for n in range(1, min(len(term), _SUGGEST_PREFIX_MAX) + 1):
+                self._prefixes.setdefault(term[:n], set()).add(uid)
+            for size in _SUGGEST_GRAMS:
+                for i in range(len(term) - size + 1):
+                    self._grams.setdefault(term[i:i + size], set()).add(uid)
+
+    def get(self, uid):
+        return self.users.get(uid)
+
+    def name(self, uid, default=None):
+        return self.names.get(uid, default)
+
+    def resolve(self, query: str) -> list:
+        """ID użytkowników, których email lub pełna nazwa jest równa zapytaniu (bez wielkości liter)."""
+        q = (query or '').strip().casefold()
+        return list(self._exact.get(q, [])) if q else []
+
+    def _rank(self, uid: str, q: str):
+        email, full_name, first, last = self._terms[uid]
+        if q in (email, full_name):
+            score = 0
+        elif any(t.startswith(q) for t in (email, full_name, first, last)):
+            score = 1
+        elif any(w.startswith(q) for w in full_name.split()) or any(w.startswith(q) for w in email.replace('@', '.').split('.')):
+            score = 2
+        else:
+            score = 3
+        return score, full_name or email, email
+
+    def suggest(self, query: str, limit: int = 10) -> list:
+        """Do `limit` użytkowników pasujących fragmentem emaila lub imienia i nazwiska.
+
+        Najpierw dopasowania od początku (email, pełna nazwa, imię, nazwisko), potem
+        od początku słowa, na końcu dowolny fragment.
+        """
+        q = (query or '').strip().casefold()
+        if not q:
+            return []
+        candidates = set(self._prefixes.get(q[:_SUGGEST_PREFIX_MAX], ()))
+        size = _SUGGEST_GRAMS[-1] if len(q) >= _SUGGEST_GRAMS[-1] else _SUGGEST_GRAMS[0]
+        if len(q) >= size:
+            grams = {q[i:i + size] for i in range(len(q) - size + 1)}
+            found = None
+            for gram in sorted(grams, key=lambda g: len(self._grams.get(g, ()))):
+                ids = self._grams.get(gram, set())
+                found = set(ids) if found is None else found & ids
+                if not found:
+                    break
+            candidates |= found or set()
+        email_or_name = [uid for uid in candidates
+                         if q in self._terms[uid][0] or (self._terms[uid][1] and q in self._terms[uid][1])]
+        ranked = sorted(email_or_name, key=lambda uid: self._rank(uid, q))
+        return [self.users[uid] for uid in ranked[:limit]]
+
+
+def _on_users_snapshot(docs, changes, read_time):
+    directory = UserDirectory(_get_doc_data(doc) for doc in docs if doc.exists)
+    with _user_directory_lock:
+        _user_directory['dir'] = directory
+        _user_directory['cached_at'] = time()
+        _user_directory['pid'] = os.getpid()
+
+
+def _start_users_listener(db) -> None:
+    if not _env_flag('USER_DIRECTORY_LISTENER', True):
+        return
+    watch = _user_directory['watch']
+    if watch is not None and getattr(watch, 'is_active', False):
+        return
+    try:
+        _user_directory['watch'] = db.collection(COLLECTION_USERS).on_snapshot(_on_users_snapshot)
+    except Exception as e:
+        print(f"User directory listener unavailable, using TTL only: {e}")
+        _user_directory['watch'] = None
+
+
+def _user_directory_is_fresh() -> bool:
+    c = _user_directory
+    if c['dir'] is None or c['pid'] != os.getpid():
+        return False
+    watch = c['watch']
+    if watch is not None and getattr(watch, 'is_active', False):
+        return True
+    return (time() - c['cached_at']) < c['ttl_seconds']
+
+
+def invalidate_user_directory() -> None:
+    with _user_directory_lock:
+        _user_directory['dir'] = None
+        _user_directory['cached_at'] = 0
+
+
+def get_user_directory() -> UserDirectory:
+    """Zwraca katalog użytkowników (z cache; ładuje go przy pierwszym użyciu lub po wygaśnięciu)."""
+    with _user_directory_lock:
+        if _user_directory_is_fresh():
+            return _user_directory['dir']
+        if _user_directory['pid'] != os.getpid():
+            _user_directory['watch'] = None
+
+    db = get_firestore_client()
+    directory = UserDirectory(get_all_users())
+    with _user_directory_lock:
+        _user_directory['dir'] = directory
+        _user_directory['cached_at'] = time()
+        _user_directory['pid'] = os.getpid()
+        _start_users_listener(db)
+    return directory
+
+
+def get_user_display_names() -> dict:
+    """Mapa user_id -> nazwa wyświetlana (z katalogu użytkowników)."""
+    return get_user_directory().names
+
+
+def _query_user_by(field: str, value: str):
     db = get_firestore_client()
-    query = db.collection(COLLECTION_USERS).where(filter=firestore.FieldFilter('email', '==', email)).limit(1)
+    query = db.collection(COLLECTION_USERS).where(filter=firestore.FieldFilter(field, '==', value)).limit(1)
     docs = list(query.stream())
     if docs:
         return _get_doc_data(docs[0])
     return None
 
+
+def _lookup_user(field: str, value: str):
+    """Szuka użytkownika po polu przez katalog, z potwierdzeniem w Firestore.
+
+    Trafienie w katalogu zamienia zapytanie na odczyt jednego dokumentu po ID (i weryfikuje,
+    że pole wciąż ma tę wartość – logowanie OAuth nie może polegać na nieświeżej mapie).
+    Brak w katalogu (np. użytkownik dodany w innym workerze) kończy się zwykłym zapytaniem.
+    """
+    if not value:
+        return None
+    directory = get_user_directory()
+    uid = directory.by_email.get(value) if field == 'email' else directory.by_provider[field].get(value)
+    if uid:
+        user = get_user_by_uid(uid)
+        if user and user.get(field) == value:
+            return user
+    return _query_user_by(field, value)
+
+
+def get_user_by_email(email: str):
+    """Pobiera użytkownika po adresie email."""
+    return _lookup_user('email', email)
+
 def get_user_by_google_id(google_id: str):
     """Pobiera użytkownika po Google ID."""
-    db = get_firestore_client()
-    query = db.collection(COLLECTION_USERS).where(filter=firestore.FieldFilter('google_id', '==', google_id)).limit(1)
-    docs = list(query.stream())
-    if docs:
-        return _get_doc_data(docs[0])
-    return None
+    return _lookup_user('google_id', google_id)
 
 def get_user_by_microsoft_id(microsoft_id: str):
     """Pobiera użytkownika po Microsoft ID."""
-    db = get_firestore_client()
-    query = db.collection(COLLECTION_USERS).where(filter=firestore.FieldFilter('microsoft_id', '==', microsoft_id)).limit(1)
-    docs = list(query.stream())
-    if docs:
-        return _get_doc_data(docs[0])
-    return None
+    return _lookup_user('microsoft_id', microsoft_id)
 
 def get_user_by_authentik_id(authentik_id: str):
     """Pobiera użytkownika po Authentik ID."""
-    db = get_firestore_client()
-    query = db.collection(COLLECTION_USERS).where(filter=firestore.FieldFilter('authentik_id', '==', authentik_id)).limit(1)
-    docs = list(query.stream())
-    if docs:
-        return _get_doc_data(docs[0])
-    return None
+    return _lookup_user('authentik_id', authentik_id)
 
 def get_all_users():
     """Pobiera wszystkich użytkowników."""
@@ -84,6 +294,7 @@ def create_user(uid: str, email: str, is_admin: bool = False, role: str = 'repor
         'updated_at': _warsaw_now()
     }
     db.collection(COLLECTION_USERS).document(uid).set(user_data)
+    invalidate_user_directory()
     return uid
 
 def update_user(uid: str, **kwargs):
@@ -91,6 +302,7 @@ def update_user(uid: str, **kwargs):
     db = get_firestore_client()
     kwargs['updated_at'] = _warsaw_now()
     db.collection(COLLECTION_USERS).document(uid).update(kwargs)
+    invalidate_user_directory()
 
 def link_google_account(uid: str, google_id: str):
     """Łączy konto użytkownika z kontem Google."""
@@ -142,6 +354,7 @@ def delete_user(uid: str):
     """Usuwa użytkownika z Firestore."""
     db = get_firestore_client()
     db.collection(COLLECTION_USERS).document(uid).delete()
+    invalidate_user_directory()
 
 
 # =========================
@@ -0,0 +1,138 @@
+"""Equipment facet index.
+
+Distinct values with counts for the fields used by filter dropdowns and form
+suggestions, kept globally and per category:
+
+    index.values('typ')                          -> sorted distinct values
+    index.top('ilosc', category='zelastwo', n=12) -> most frequent values first
+
+Like the hierarchy index it lives per worker process, is rebuilt when the sprzet
+cache version jumps (full reload) and is patched in place for single-item writes
+reported by the cache observer hook, so dropdowns never go stale.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import Counter
+
+from .db_firestore import (
+    get_all_sprzet,
+    get_sprzet_cache_version,
+    register_sprzet_cache_observer,
+)
+
+# Fields with distinct-value facets.
+FACET_FIELDS = (
+    'typ', 'lokalizacja', 'wodoszczelnosc', 'oficjalna_ewidencja',
+    'ilosc', 'material', 'owner', 'do_czego',
+)
+
+_ALL = None  # category key for global counts
+
+
+def _facet_value(value):
+    if value is None or isinstance(value, (list, dict)):
+        return None
+    v = str(value).strip()
+    return v or None
+
+
+class FacetIndex:
+    """Counts of distinct field values, globally and per category."""
+
+    def __init__(self, items, version=None):
+        self.version = version
+        # (field, category|None) -> Counter(value -> count)
+        self._counts: dict[tuple, Counter] = {}
+        # item id -> tuple of (field, category, value) it contributes
+        self._contrib: dict[str, tuple] = {}
+        self._lock = threading.RLock()
+        for item in items or []:
+            item_id = item.get('id') if isinstance(item, dict) else None
+            if item_id:
+                self._add(item_id, item)
+
+    def _entries(self, item: dict) -> tuple:
+        category = item.get('category') or ''
+        out = []
+        for field in FACET_FIELDS:
+            v = _facet_value(item.get(field))
+            if v is not None:
+                out.append((field, category, v))
+        return tuple(out)
+
+    def _add(self, item_id: str, item: dict) -> None:
+        entries = self._entries(item)
+        self._contrib[item_id] = entries
+        for field, category, v in entries:
+            self._counts.setdefault((field, _ALL), Counter())[v] += 1
+            self._counts.setdefault((field, category), Counter())[v] += 1
+
+    def _discard(self, item_id: str) -> None:
+        for field, category, v in self._contrib.pop(item_id, ()):
+            for key in ((field, _ALL), (field, category)):
+                counter = self._counts.get(key)
+                if counter is None:
+                    continue
+                counter[v] -= 1
+                if counter[v] <= 0:
+                    del counter[v]
+
+    def apply(self, item_id: str, item: dict | None, version=None) -> None:
+        """Applies a single-item change (`item=None` means removal)."""
+        with self._lock:
+            self._discard(item_id)
+            if item is not None:
+                self._add(item_id, item)
+            if version is not None:
+                self.version = version
+
+    def counts(self, field: str, category: str | None = None) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counts.get((field, category), {}))
+
+    def values(self, field: str, category: str | None = None) -> list[str]:
+        """Sorted distinct values."""
+        return sorted(self.counts(field, category))
+
+    def top(self, field: str, category: str | None = None, n: int | None = None) -> list[str]:
+        """Distinct values, most frequent first (ties alphabetically)."""
+        ranked = sorted(self.counts(field, category).items(), key=lambda kv: (-kv[1], kv[0]))
+        values = [v for v, _ in ranked]
+        return values[:n] if n is not None else values
+
+
+_index_state = {'index': None}
+_index_lock = threading.RLock()
+
+
+def _on_sprzet_change(item_id, data, version) -> None:
+    idx = _index_state['index']
+    # Patch in place only when exactly one version behind; otherwise rebuild on next read.
+    if idx is not None and idx.version is not None and idx.version == version - 1:
+        idx.apply(item_id, data, version)
+
+
+register_sprzet_cache_observer(_on_sprzet_change)
+
+
+def get_facet_index() -> FacetIndex:
+    """Returns the facet index for the current sprzet data version, rebuilding it if needed."""
+    version = get_sprzet_cache_version()
+    idx = _index_state['index']
+    if idx is not None and version is not None and idx.version == version:
+        return idx
+    with _index_lock:
+        idx = _index_state['index']
+        if idx is not None and version is not None and idx.version == version:
+            return idx
+        idx = FacetIndex(get_all_sprzet(fields=('category',) + FACET_FIELDS), version)
+        if version is not None:
+            _index_state['index'] = idx
+        return idx
+
+
+def invalidate_facet_index() -> None:
+    with _index_lock:
+        _index_state['index'] = None
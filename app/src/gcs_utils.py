@@ -1,6 +1,8 @@
 import os
+import threading
 from google.cloud import storage
 from google.auth.exceptions import DefaultCredentialsError
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,17 +10,76 @@ load_dotenv()
 from . import GOOGLE_PROJECT_ID, GOOGLE_CLOUD_STORAGE_BUCKET_NAME
 from urllib.parse import urlparse, unquote
 
-def get_storage_client():
-    """Zwraca klienta Google Cloud Storage."""
+# Rozmiar puli połączeń HTTP klienta GCS (równoległe podpisy/uploady w jednym workerze).
+GCS_HTTP_POOL_SIZE = int(os.getenv('GCS_HTTP_POOL_SIZE', '16'))
+
+# Upload wznawialny: próg rozmiaru i wielkość kawałka (GCS wymaga wielokrotności 256 KB).
+_CHUNK_ALIGN = 256 * 1024
+GCS_RESUMABLE_THRESHOLD = int(float(os.getenv('GCS_RESUMABLE_THRESHOLD_MB', '5')) * 1024 * 1024)
+GCS_UPLOAD_CHUNK_SIZE = max(1, int(float(os.getenv('GCS_UPLOAD_CHUNK_MB', '2')) * 1024 * 1024) // _CHUNK_ALIGN) * _CHUNK_ALIGN
+# Limit czasu pojedynczego żądania uploadu (s)
+GCS_UPLOAD_TIMEOUT = float(os.getenv('GCS_UPLOAD_TIMEOUT', '60'))
+
+# Jeden klient i uchwyt bucketa na proces workera. Po fork() (gunicorn --preload)
+# sesja HTTP rodzica nie może być współdzielona, więc PID wymusza przebudowę.
+_storage = {
+    'client': None,
+    'bucket': None,
+    'pid': None,
+}
+_storage_lock = threading.Lock()
+
+
+def _build_storage_client():
     try:
-        return storage.Client(project=GOOGLE_PROJECT_ID) if GOOGLE_PROJECT_ID else storage.Client()
+        client = storage.Client(project=GOOGLE_PROJECT_ID) if GOOGLE_PROJECT_ID else storage.Client()
     except DefaultCredentialsError:
         credentials_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
         if credentials_path and os.path.exists(credentials_path):
-            return storage.Client.from_service_account_json(credentials_path, project=GOOGLE_PROJECT_ID)
-        raise Exception("Brak poświadczeń Google Cloud.")
+            client = storage.Client.from_service_account_json(credentials_path, project=GOOGLE_PROJECT_ID)
+        else:
+            raise Exception("Brak poświadczeń Google Cloud.")
+    # Domyślna pula requests (10 połączeń) blokuje przy równoległych operacjach.
+    adapter = HTTPAdapter(pool_connections=GCS_HTTP_POOL_SIZE, pool_maxsize=GCS_HTTP_POOL_SIZE)
+    client._http.mount('https://', adapter)
+    return client
+
+
+def get_storage_client():
+    """Zwraca klienta Google Cloud Storage (jeden na proces, tworzony leniwie)."""
+    client = _storage['client']
+    if client is not None and _storage['pid'] == os.getpid():
+        return client
+    with _storage_lock:
+        if _storage['client'] is None or _storage['pid'] != os.getpid():
+            _storage['client'] = _build_storage_client()
+            _storage['bucket'] = None
+            _storage['pid'] = os.getpid()
+        return _storage['client']
+
+
+def get_storage_bucket():
+    """Zwraca uchwyt bucketa GOOGLE_CLOUD_STORAGE_BUCKET_NAME (bez zapytania do API)."""
+    if not GOOGLE_CLOUD_STORAGE_BUCKET_NAME:
+        raise ValueError("GOOGLE_CLOUD_STORAGE_BUCKET_NAME nie jest ustawione.")
+    client = get_storage_client()
+    bucket = _storage['bucket']
+    if bucket is None:
+        bucket = client.bucket(GOOGLE_CLOUD_STORAGE_BUCKET_NAME)
+        _storage['bucket'] = bucket
+    return bucket
+
+
+def reset_storage_client():
+    """Zapomina klienta i bucket (np. po zmianie poświadczeń)."""
+    with _storage_lock:
+        _storage['client'] = None
+        _storage['bucket'] = None
+        _storage['pid'] = None
 
 import datetime
+import time
+from collections import OrderedDict
 
 def extract_blob_name(url: str) -> str:
     """Wyciąga bezpiecznie blob_name z URL GCS (usuwa parametry podpisu).
@@ -70,37 +131,105 @@ def extract_blob_name(url: str) -> str:
         print(f"Error extracting blob name from {url}")
         return ""
 
-def generate_signed_url(blob_name: str) -> str:
-    """Generuje Signed URL (V4) dla obiektu w GCS."""
-    if not GOOGLE_CLOUD_STORAGE_BUCKET_NAME:
-        return ""
+# Ważność podpisu i minimalny zapas ważności, przy którym URL z cache jest jeszcze wydawany.
+SIGNED_URL_TTL_MINUTES = int(os.getenv('SIGNED_URL_TTL_MINUTES', '60'))
+SIGNED_URL_MIN_REMAINING_MINUTES = int(os.getenv('SIGNED_URL_MIN_REMAINING_MINUTES', '15'))
+SIGNED_URL_CACHE_SIZE = int(os.getenv('SIGNED_URL_CACHE_SIZE', '5000'))
 
-    try:
-        client = get_storage_client()
-        bucket = client.bucket(GOOGLE_CLOUD_STORAGE_BUCKET_NAME)
-        blob = bucket.blob(blob_name)
+# blob_name -> (url, wygasa_o [time.time()]); LRU per worker. Ten sam URL przez większość
+# godziny pozwala też przeglądarce trzymać zdjęcie w swoim cache.
+_signed_url_cache: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+_signed_url_lock = threading.Lock()
+
+
+def _cached_signed_url(blob_name: str, now: float) -> str | None:
+    with _signed_url_lock:
+        entry = _signed_url_cache.get(blob_name)
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if expires_at - now <= SIGNED_URL_MIN_REMAINING_MINUTES * 60:
+            del _signed_url_cache[blob_name]
+            return None
+        _signed_url_cache.move_to_end(blob_name)
+        return url
+
+
+def _store_signed_url(blob_name: str, url: str, expires_at: float) -> None:
+    with _signed_url_lock:
+        _signed_url_cache[blob_name] = (url, expires_at)
+        _signed_url_cache.move_to_end(blob_name)
+        while len(_signed_url_cache) > SIGNED_URL_CACHE_SIZE:
+            _signed_url_cache.popitem(last=False)
 
+
+def forget_signed_url(blob_name: str) -> None:
+    """Usuwa URL obiektu z cache (po nadpisaniu lub usunięciu pliku)."""
+    with _signed_url_lock:
+        _signed_url_cache.pop(blob_name, None)
+
+
+def invalidate_signed_url_cache() -> None:
+    with _signed_url_lock:
+        _signed_url_cache.clear()
+
+
+def _sign_blob_url(blob_name: str, now: float) -> str:
+    try:
+        blob = get_storage_bucket().blob(blob_name)
         url = blob.generate_signed_url(
             version="v4",
-            expiration=datetime.timedelta(hours=1),
+            expiration=datetime.timedelta(minutes=SIGNED_URL_TTL_MINUTES),
             method="GET",
         )
-        return url
     except Exception as e:
         print(f"Error generating signed URL for {blob_name}: {e}")
         return f"https://storage.googleapis.com/{GOOGLE_CLOUD_STORAGE_BUCKET_NAME}/{blob_name}"
+    _store_signed_url(blob_name, url, now + SIGNED_URL_TTL_MINUTES * 60)
+    return url
 
-def upload_blob_to_gcs(blob_name: str, file_obj, mime_type: str) -> str:
-    """Wgrywa obiekt do GCS i zwraca Signed URL."""
+
+def generate_signed_url(blob_name: str) -> str:
+    """Generuje Signed URL (V4) dla obiektu w GCS.
+
+    Zwraca URL z cache, dopóki zostało mu więcej niż SIGNED_URL_MIN_REMAINING_MINUTES ważności.
+    """
     if not GOOGLE_CLOUD_STORAGE_BUCKET_NAME:
-        raise ValueError("GOOGLE_CLOUD_STORAGE_BUCKET_NAME nie jest ustawione.")
+        return ""
 
-    client = get_storage_client()
-    bucket = client.bucket(GOOGLE_CLOUD_STORAGE_BUCKET_NAME)
-    blob = bucket.blob(blob_name)
+    now = time.time()
+    return _cached_signed_url(blob_name, now) or _sign_blob_url(blob_name, now)
 
+
+def generate_signed_urls(blob_names: list) -> list:
+    """Signed URL-e dla listy obiektów (w tej samej kolejności); podpisuje tylko brakujące w cache."""
+    if not GOOGLE_CLOUD_STORAGE_BUCKET_NAME:
+        return ["" for _ in blob_names]
+
+    now = time.time()
+    found = {}
+    for name in blob_names:
+        if name not in found:
+            found[name] = _cached_signed_url(name, now) or _sign_blob_url(name, now)
+    return [found[name] for name in blob_names]
+
+def upload_blob_to_gcs(blob_name: str, file_obj, mime_type: str) -> str:
+    """Wgrywa obiekt do GCS i zwraca Signed URL.
+
+    Pliki większe niż GCS_RESUMABLE_THRESHOLD_MB idą uploadem wznawialnym
+    w kawałkach GCS_UPLOAD_CHUNK_MB.
+    """
+    file_obj.seek(0, os.SEEK_END)
+    size = file_obj.tell()
     file_obj.seek(0)
-    blob.upload_from_file(file_obj, content_type=mime_type, rewind=True)
+    # Duże pliki: upload wznawialny w kawałkach (błąd sieci ponawia kawałek, nie cały plik)
+    chunk_size = GCS_UPLOAD_CHUNK_SIZE if size > GCS_RESUMABLE_THRESHOLD else None
+    blob = get_storage_bucket().blob(blob_name, chunk_size=chunk_size)
+
+    blob.upload_from_file(file_obj, content_type=mime_type, rewind=True, size=size,
+                          timeout=GCS_UPLOAD_TIMEOUT)
+    # Nadpisany plik dostaje nowy URL, żeby przeglądarka nie pokazała starej wersji z cache.
+    forget_signed_url(blob_name)
 
     return generate_signed_url(blob_name)
 
@@ -110,14 +239,9 @@ def list_files(prefix: str) -> list:
         return []
 
     try:
-        client = get_storage_client()
-        bucket = client.bucket(GOOGLE_CLOUD_STORAGE_BUCKET_NAME)
-        blobs = bucket.list_blobs(prefix=prefix)
+        blobs = get_storage_bucket().list_blobs(prefix=prefix)
         
-        urls = []
-        for blob in blobs:
-            if not blob.name.endswith('/'):
-                urls.append(generate_signed_url(blob.name))
+        urls = generate_signed_urls([blob.name for blob in blobs if not blob.name.endswith('/')])
         urls.sort()
         return urls
     except Exception as e:
@@ -129,18 +253,10 @@ def refresh_urls(urls):
     if not urls:
         return []
     
-    new_urls = []
-    for url in urls:
-        if not url:
-            continue
-            
-        blob_name = extract_blob_name(url)
-        if blob_name:
-            new_urls.append(generate_signed_url(blob_name))
-        else:
-            new_urls.append(url)
-            
-    return new_urls
+    urls = [url for url in urls if url]
+    blob_names = [extract_blob_name(url) for url in urls]
+    signed = iter(generate_signed_urls([name for name in blob_names if name]))
+    return [next(signed) if name else url for url, name in zip(urls, blob_names)]
 
 def list_equipment_photos(equipment_id: str):
     """Listuje zdjęcia sprzętu."""
@@ -165,10 +281,9 @@ def delete_blob_from_gcs(blob_name: str) -> bool:
         return False
 
     try:
-        client = get_storage_client()
-        bucket = client.bucket(GOOGLE_CLOUD_STORAGE_BUCKET_NAME)
-        blob = bucket.blob(blob_name)
+        blob = get_storage_bucket().blob(blob_name)
         blob.delete()
+        forget_signed_url(blob_name)
         return True
     except Exception as e:
         print(f"Error deleting blob {blob_name}: {e}")
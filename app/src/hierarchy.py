@@ -0,0 +1,205 @@
+"""Equipment hierarchy index.
+
+Equipment forms a tree via `parent_id` (magazyn -> półka/skrzynia -> przedmiot ...).
+Views used to rebuild an id -> item map and walk `parent_id` chains on every request;
+this module keeps one index per worker process instead:
+
+- children by parent and the set of ids that have children,
+- ancestor chain (nearest parent first),
+- nearest MAGAZYN ancestor,
+- full-subtree membership.
+
+The index is tied to the sprzet cache version (see `db_firestore.get_sprzet_cache_version`):
+it is rebuilt when the version jumps (full reload) and patched in place for single-item
+writes reported by the cache observer hook. Lookups are memoized until the next structural
+change (parent or category edit, removal).
+"""
+
+from __future__ import annotations
+
+import threading
+
+from .db_firestore import (
+    CATEGORIES,
+    get_all_sprzet,
+    get_sprzet_cache_version,
+    register_sprzet_cache_observer,
+)
+
+
+class HierarchyIndex:
+    """Immutable-by-convention view of the `parent_id` tree with memoized lookups."""
+
+    def __init__(self, items, version=None):
+        self.version = version
+        self._parent: dict[str, str] = {}
+        self._category: dict[str, str] = {}
+        self._name: dict[str, str] = {}
+        self._children: dict[str, set[str]] = {}
+        self._lock = threading.RLock()
+        self._reset_memo()
+        for item in items or []:
+            item_id = item.get('id') if isinstance(item, dict) else None
+            if item_id:
+                self._insert(item_id, item)
+
+    # ----------------------------------------------------------------- updates
+
+    def _reset_memo(self) -> None:
+        self._ancestors_memo: dict[str, tuple[str, ...]] = {}
+        self._subtree_memo: dict[str, frozenset[str]] = {}
+
+    def _insert(self, item_id: str, item: dict) -> None:
+        parent_id = item.get('parent_id') or None
+        if parent_id:
+            self._parent[item_id] = parent_id
+            self._children.setdefault(parent_id, set()).add(item_id)
+        self._category[item_id] = item.get('category') or ''
+        self._name[item_id] = item.get('nazwa') or ''
+
+    def _remove(self, item_id: str) -> None:
+        parent_id = self._parent.pop(item_id, None)
+        if parent_id:
+            siblings = self._children.get(parent_id)
+            if siblings is not None:
+                siblings.discard(item_id)
+                if not siblings:
+                    del self._children[parent_id]
+        self._category.pop(item_id, None)
+        self._name.pop(item_id, None)
+
+    def apply(self, item_id: str, item: dict | None, version=None) -> None:
+        """Applies a single-item change (`item=None` means removal)."""
+        with self._lock:
+            structural = True
+            if item is not None and item_id in self._category:
+                structural = (
+                    self._parent.get(item_id) != (item.get('parent_id') or None)
+                    or self._category.get(item_id) != (item.get('category') or '')
+                )
+            self._remove(item_id)
+            if item is not None:
+                self._insert(item_id, item)
+            if structural:
+                self._reset_memo()
+            if version is not None:
+                self.version = version
+
+    # ----------------------------------------------------------------- lookups
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self._category
+
+    def parent_of(self, item_id: str) -> str | None:
+        return self._parent.get(item_id)
+
+    def children_of(self, item_id: str) -> list[str]:
+        """Direct children ids, sorted like `order_by('__name__')`."""
+        return sorted(self._children.get(item_id, ()))
+
+    def has_children(self, item_id: str) -> bool:
+        return bool(self._children.get(item_id))
+
+    @property
+    def ids_with_children(self) -> set[str]:
+        return {pid for pid, kids in self._children.items() if kids}
+
+    def ancestors(self, item_id: str) -> tuple[str, ...]:
+        """Ancestor ids, nearest parent first. Cycles and dangling parents end the chain."""
+        memo = self._ancestors_memo.get(item_id)
+        if memo is not None:
+            return memo
+        with self._lock:
+            chain: list[str] = []
+            seen = {item_id}
+            curr = self._parent.get(item_id)
+            while curr and curr not in seen:
+                cached = self._ancestors_memo.get(curr)
+                if cached is not None:
+                    for a in (curr, *cached):
+                        if a in seen:
+                            break
+                        seen.add(a)
+                        chain.append(a)
+                    break
+                chain.append(curr)
+                seen.add(curr)
+                if curr not in self._category:
+                    break
+                curr = self._parent.get(curr)
+            result = tuple(chain)
+            self._ancestors_memo[item_id] = result
+            return result
+
+    def nearest_magazyn(self, item_id: str) -> str | None:
+        """Id of the closest MAGAZYN ancestor (the item itself is not considered)."""
+        magazyn = CATEGORIES['MAGAZYN']
+        for a in self.ancestors(item_id):
+            if self._category.get(a) == magazyn:
+                return a
+        return None
+
+    def magazyn_display(self, item_id: str) -> tuple[str | None, str | None]:
+        """(magazyn_id, display name) of the nearest MAGAZYN ancestor or (None, None)."""
+        mag_id = self.nearest_magazyn(item_id)
+        if not mag_id:
+            return None, None
+        return mag_id, (self._name.get(mag_id) or mag_id)
+
+    def subtree_ids(self, root_id: str, include_root: bool = True) -> frozenset[str]:
+        """All descendants of `root_id` at any depth."""
+        with self._lock:
+            memo = self._subtree_memo.get(root_id)
+            if memo is None:
+                out: set[str] = set()
+                stack = [root_id]
+                while stack:
+                    curr = stack.pop()
+                    for child in self._children.get(curr, ()):
+                        if child not in out and child != root_id:
+                            out.add(child)
+                            stack.append(child)
+                memo = frozenset(out)
+                self._subtree_memo[root_id] = memo
+        return memo | {root_id} if include_root else memo
+
+    def in_subtree(self, item_id: str, root_id: str) -> bool:
+        return item_id == root_id or root_id in self.ancestors(item_id)
+
+
+# Fields the index needs; the rest of each document is never copied.
+HIERARCHY_FIELDS = ('parent_id', 'category', 'nazwa')
+
+_index_state = {'index': None}
+_index_lock = threading.RLock()
+
+
+def _on_sprzet_change(item_id, data, version) -> None:
+    idx = _index_state['index']
+    # Patch in place only when exactly one version behind; otherwise rebuild on next read.
+    if idx is not None and idx.version is not None and idx.version == version - 1:
+        idx.apply(item_id, data, version)
+
+
+register_sprzet_cache_observer(_on_sprzet_change)
+
+
+def get_hierarchy_index() -> HierarchyIndex:
+    """Returns the index for the current sprzet data version, rebuilding it if needed."""
+    version = get_sprzet_cache_version()
+    idx = _index_state['index']
+    if idx is not None and version is not None and idx.version == version:
+        return idx
+    with _index_lock:
+        idx = _index_state['index']
+        if idx is not None and version is not None and idx.version == version:
+            return idx
+        idx = HierarchyIndex(get_all_sprzet(fields=HIERARCHY_FIELDS), version)
+        if version is not None:
+            _index_state['index'] = idx
+        return idx
+
+
+def invalidate_hierarchy_index() -> None:
+    with _index_lock:
+        _index_state['index'] = None
@@ -0,0 +1,200 @@
+"""Archiwizacja starych logów audytu do skompresowanych plików JSONL w GCS.
+
+Logi starsze niż LOG_ARCHIVE_DAYS są przenoszone z kolekcji `logs` do plików
+`<LOG_ARCHIVE_PREFIX>/RRRR/MM/DD/logs-<znacznik>.jsonl.gz` (partycja = dzień wpisu
+w czasie warszawskim). Wiersze serializuje `firestore_to_jsonable` ze
+scripts/firestore_export.py (daty jako obiekty z polem `__type__`).
+
+Dzięki temu kolekcja `logs` zawiera tylko „gorące” wpisy: count() na /logs oraz
+logi na kartach i profilach czytają mały zbiór. Starsze wpisy przegląda
+search_archive, które strumieniuje pliki z kolejnych dni.
+
+Uruchamianie: `python -m scripts.archive_logs` albo przycisk w ustawieniach admina.
+"""
+
+import gzip
+import io
+import json
+import os
+from datetime import date, datetime, timedelta
+
+from google.cloud import firestore
+
+from . import get_firestore_client
+from .db_firestore import (
+    BULK_WRITE_CHUNK, COLLECTION_LOGS, _apply_log_diff, _is_state_log, _normalize_doc_data,
+    _warsaw_now, flush_logs,
+)
+from .gcs_utils import get_storage_bucket
+from scripts.firestore_export import firestore_to_jsonable
+
+LOG_ARCHIVE_DAYS = int(os.getenv('LOG_ARCHIVE_DAYS', '365'))
+LOG_ARCHIVE_PREFIX = os.getenv('LOG_ARCHIVE_PREFIX', 'archive/logs').strip('/')
+# Maksymalna liczba logów przenoszonych w jednym uruchomieniu (kolejne uruchomienie bierze następne).
+LOG_ARCHIVE_LIMIT = int(os.getenv('LOG_ARCHIVE_LIMIT', '20000'))
+
+
+def _bucket():
+    return get_storage_bucket()
+
+
+def _local(dt: datetime) -> datetime:
+    """Data w strefie Europe/Warsaw (tak jak zapisuje add_log)."""
+    tz = _warsaw_now().tzinfo
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(tz) if tz else dt
+
+
+def _partition_prefix(day: date) -> str:
+    return f"{LOG_ARCHIVE_PREFIX}/{day:%Y/%m/%d}/"
+
+
+def _upload_partition(bucket, day: date, lines: list, run_stamp: str) -> str:
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as gz:
+        for line in lines:
+            gz.write(line.encode('utf-8'))
+            gz.write(b'\n')
+    blob_name = f"{_partition_prefix(day)}logs-{run_stamp}.jsonl.gz"
+    buf.seek(0)
+    bucket.blob(blob_name).upload_from_file(buf, content_type='application/gzip', rewind=True)
+    return blob_name
+
+
+def _rebase_hot_chain(db, target_type: str, target_id: str, state: dict, cutoff: datetime) -> bool:
+    """Zamienia najstarszy pozostający wpis różnicowy obiektu na pełny stan.
+
+    Po przeniesieniu checkpointu do archiwum łańcuch w Firestore musi zaczynać się
+    od pełnego stanu, żeby expand_logs dalej odtwarzało nowsze wpisy.
+    """
+    query = (db.collection(COLLECTION_LOGS)
+             .where(filter=firestore.FieldFilter('target_id', '==', target_id))
+             .where(filter=firestore.FieldFilter('timestamp', '>=', cutoff))
+             .order_by('timestamp', direction=firestore.Query.DESCENDING))
+    oldest = None
+    for doc in query.stream():
+        data = doc.to_dict() or {}
+        if data.get('target_type') == target_type and _is_state_log(data):
+            oldest = (doc, data)
+    if oldest is None or not oldest[1].get('diff'):
+        return False
+    doc, data = oldest
+    before, after = _apply_log_diff(state, data)
+    doc.reference.update({'before': before, 'after': after, 'diff': firestore.DELETE_FIELD})
+    return True
+
+
+def archive_logs(older_than_days: int | None = None, limit: int | None = None, dry_run: bool = False) -> dict:
+    """Przenosi logi starsze niż `older_than_days` dni do GCS i usuwa je z Firestore.
+
+    Kolejność: upload plików → uzupełnienie łańcuchów różnicowych → usunięcie
+    dokumentów. Przerwanie w trakcie może zostawić wpis w archiwum i w Firestore
+    (kolejne uruchomienie zarchiwizuje go ponownie), ale nigdy go nie gubi.
+    Wpisy różnicowe trafiają do archiwum już jako pełne stany.
+    """
+    days = LOG_ARCHIVE_DAYS if older_than_days is None else int(older_than_days)
+    limit = LOG_ARCHIVE_LIMIT if limit is None else int(limit)
+    cutoff = _warsaw_now() - timedelta(days=days)
+
+    flush_logs()
+    db = get_firestore_client()
+    query = (db.collection(COLLECTION_LOGS)
+             .where(filter=firestore.FieldFilter('timestamp', '<', cutoff))
+             .order_by('timestamp'))
+    if limit:
+        query = query.limit(limit)
+
+    bucket = None if dry_run else _bucket()
+    run_stamp = _warsaw_now().strftime('%Y%m%dT%H%M%S')
+    refs, files = [], []
+    states: dict = {}
+    day, lines = None, []
+
+    for doc in query.stream():
+        data = doc.to_dict() or {}
+        ts = data.get('timestamp')
+        doc_day = _local(ts).date() if isinstance(ts, datetime) else None
+        if _is_state_log(data):
+            key = (data.get('target_type'), data.get('target_id'))
+            if data.get('diff'):
+                if states.get(key) is not None:
+                    data['before'], data['after'] = _apply_log_diff(states[key], data)
+                    data.pop('diff')
+                    states[key] = data['after']
+            else:
+                states[key] = data.get('after') if isinstance(data.get('after'), dict) else None
+        if doc_day != day and lines:
+            if not dry_run:
+                files.append(_upload_partition(bucket, day or date(1970, 1, 1), lines, run_stamp))
+            lines = []
+        day = doc_day
+        lines.append(json.dumps(firestore_to_jsonable({**data, 'id': doc.id}), ensure_ascii=False))
+        refs.append(doc.reference)
+    if lines and not dry_run:
+        files.append(_upload_partition(bucket, day or date(1970, 1, 1), lines, run_stamp))
+
+    rebased = 0
+    if not dry_run:
+        for (target_type, target_id), state in states.items():
+            if isinstance(state, dict) and _rebase_hot_chain(db, target_type, target_id, state, cutoff):
+                rebased += 1
+        for i in range(0, len(refs), BULK_WRITE_CHUNK):
+            batch = db.batch()
+            for ref in refs[i:i + BULK_WRITE_CHUNK]:
+                batch.delete(ref)
+            batch.commit()
+
+    return {'archived': len(refs), 'files': files, 'rebased': rebased, 'cutoff': cutoff, 'dry_run': dry_run}
+
+
+def _from_jsonable(value):
+    """Odwrotność firestore_to_jsonable dla typów występujących w logach."""
+    if isinstance(value, list):
+        return [_from_jsonable(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    kind = value.get('__type__')
+    if kind == 'datetime':
+        return _local(datetime.fromisoformat(value['value'].replace('Z', '+00:00')))
+    if kind == 'date':
+        return date.fromisoformat(value['value'])
+    if kind is not None and 'value' in value:
+        return value['value']
+    return {k: _from_jsonable(v) for k, v in value.items()}
+
+
+def search_archive(date_from: date, date_to: date, target_id: str | None = None, user_id: str | None = None,
+                   action: str | None = None, text: str | None = None, limit: int = 200) -> list:
+    """Przeszukuje zarchiwizowane logi z dni [date_from, date_to], od najnowszych.
+
+    Pliki są czytane strumieniowo (gzip w locie); `text` jest dopasowywany do
+    surowego wiersza JSON, więc filtruje przed parsowaniem.
+    """
+    bucket = _bucket()
+    needle = (text or '').strip().lower()
+    results = []
+    day = date_to
+    while day >= date_from and len(results) < limit:
+        blobs = sorted(bucket.list_blobs(prefix=_partition_prefix(day)), key=lambda b: b.name, reverse=True)
+        for blob in blobs:
+            matches = []
+            with blob.open('rb') as raw, gzip.GzipFile(fileobj=raw) as gz:
+                for raw_line in gz:
+                    line = raw_line.decode('utf-8')
+                    if needle and needle not in line.lower():
+                        continue
+                    data = _from_jsonable(json.loads(line))
+                    if target_id and data.get('target_id') != target_id:
+                        continue
+                    if user_id and data.get('user_id') != user_id:
+                        continue
+                    if action and data.get('action') != action:
+                        continue
+                    matches.append(_normalize_doc_data(data, data.get('id')))
+            # W pliku wpisy są rosnąco – odwracamy, żeby zachować kolejność od najnowszych.
+            results.extend(reversed(matches))
+            if len(results) >= limit:
+                break
+        day -= timedelta(days=1)
+    return results[:limit]
@@ -0,0 +1,249 @@
+"""Equipment full-text search index.
+
+An inverted index over the text fields searched on the equipment list:
+
+    index.search('zapalki 10')  -> set of matching item ids
+    index.top('ns 0', n=10)      -> best matching ids first (typeahead)
+
+Text is folded to lowercase ASCII (Polish diacritics removed, so "zapalki"
+matches "zapałki") and split into alphanumeric tokens. Every query token must
+occur in the item: tokens of 3+ characters are looked up by trigrams and then
+verified as substrings of the item text, shorter ones match token prefixes.
+
+Like the facet index it lives per worker process, is rebuilt when the sprzet
+cache version jumps (full reload) and is patched in place for single-item writes
+reported by the cache observer hook.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import unicodedata
+
+from .db_firestore import (
+    get_all_sprzet,
+    get_sprzet_cache_version,
+    register_sprzet_cache_observer,
+)
+
+# Fields searched on the equipment list. Much of the data is optional and
+# category specific, so every value is matched through str().
+SEARCH_FIELDS = (
+    'id', 'nazwa', 'typ',
+    'przeznaczenie',
+    'lokalizacja', 'magazyn_display',
+    'informacje', 'uwagi',
+    'stan_ogolny',
+    'wodoszczelnosc',
+    'ilosc', 'jednostka',
+    'oficjalna_ewidencja',
+    'owner',
+    # namioty
+    'zapalki', 'kolor_dachu', 'kolor_bokow',
+    # żelastwo
+    'typ_zelastwa', 'do_czego',
+    # kanadyjki
+    'material',
+    # legacy imports
+    'historia',
+)
+
+# Letters that NFKD does not decompose into base + combining mark.
+_FOLD_EXTRA = str.maketrans({'ł': 'l', 'Ł': 'l', 'ß': 'ss', 'æ': 'ae', 'ø': 'o', 'đ': 'd'})
+_TOKEN_RE = re.compile(r'[0-9a-z]+')
+# Query tokens shorter than this match token prefixes instead of trigrams.
+_NGRAM = 3
+
+
+def fold(text) -> str:
+    """Lowercase ASCII form of `text` used for indexing and queries."""
+    text = str(text).translate(_FOLD_EXTRA)
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text) -> list[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+def _trigrams(token: str) -> set[str]:
+    return {token[i:i + _NGRAM] for i in range(len(token) - _NGRAM + 1)}
+
+
+def _prefixes(token: str) -> set[str]:
+    return {token[:n] for n in range(1, min(len(token), _NGRAM - 1) + 1)}
+
+
+class SearchIndex:
+    """Trigram and short-prefix postings over the folded item text."""
+
+    def __init__(self, items, version=None):
+        self.version = version
+        self._postings: dict[str, set[str]] = {}
+        # item id -> (folded text, posting keys it contributes)
+        self._docs: dict[str, tuple[str, tuple]] = {}
+        # item id -> (folded id, folded nazwa) used for ranking
+        self._heads: dict[str, tuple[str, str]] = {}
+        self._lock = threading.RLock()
+        for item in items or []:
+            item_id = item.get('id') if isinstance(item, dict) else None
+            if item_id:
+                self._add(item_id, item)
+
+    def _add(self, item_id: str, item: dict) -> None:
+        text = item_text({**item, 'id': item_id})
+        keys = set()
+        for token in _TOKEN_RE.findall(text):
+            keys.update(_trigrams(token))
+            keys.update('^' + p for p in _prefixes(token))
+        self._docs[item_id] = (text, tuple(keys))
+        self._heads[item_id] = (fold(item_id), fold(item.get('nazwa') or ''))
+        for key in keys:
+            self._postings.setdefault(key, set()).add(item_id)
+
+    def _discard(self, item_id: str) -> None:
+        _, keys = self._docs.pop(item_id, ('', ()))
+        self._heads.pop(item_id, None)
+        for key in keys:
+            ids = self._postings.get(key)
+            if ids is None:
+                continue
+            ids.discard(item_id)
+            if not ids:
+                del self._postings[key]
+
+    def apply(self, item_id: str, item: dict | None, version=None) -> None:
+        """Applies a single-item change (`item=None` means removal)."""
+        with self._lock:
+            self._discard(item_id)
+            if item is not None:
+                self._add(item_id, item)
+            if version is not None:
+                self.version = version
+
+    def _token_ids(self, token: str) -> set[str]:
+        if len(token) < _NGRAM:
+            return set(self._postings.get('^' + token, ()))
+        ids = None
+        for gram in sorted(_trigrams(token), key=lambda g: len(self._postings.get(g, ()))):
+            postings = self._postings.get(gram)
+            if not postings:
+                return set()
+            ids = set(postings) if ids is None else ids & postings
+            if not ids:
+                return ids
+        return {i for i in ids if token in self._docs[i][0]}
+
+    def search(self, query: str) -> set[str] | None:
+        """Ids of items containing every query token.
+
+        Returns None when the query has no searchable tokens (only punctuation);
+        callers fall back to a plain substring scan then.
+        """
+        tokens = sorted(set(tokenize(query or '')), key=len, reverse=True)
+        if not tokens:
+            return None
+        with self._lock:
+            result = None
+            for token in tokens:
+                ids = self._token_ids(token)
+                result = ids if result is None else result & ids
+                if not result:
+                    return set()
+            return result
+
+    def top(self, query: str, n: int = 10) -> list[str]:
+        """Up to `n` matching ids, best first.
+
+        Exact id, then id prefix, then name prefix, then a word starting with the
+        query, then any other match; ties by id.
+        """
+        ids = self.search(query)
+        if not ids:
+            return []
+        q = ' '.join(tokenize(query))
+        first = q.split(' ', 1)[0]
+
+        def _rank(item_id):
+            folded_id, name = self._heads.get(item_id, ('', ''))
+            plain_id = ' '.join(_TOKEN_RE.findall(folded_id))
+            if plain_id == q:
+                score = 0
+            elif plain_id.startswith(q):
+                score = 1
+            elif name.startswith(q):
+                score = 2
+            elif any(w.startswith(first) for w in _TOKEN_RE.findall(name)):
+                score = 3
+            else:
+                score = 4
+            return score, len(folded_id), item_id
+
+        with self._lock:
+            return sorted(ids, key=_rank)[:n]
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self._docs
+
+
+def item_text(item: dict) -> str:
+    """Folded searchable text of a single item (same as the index uses)."""
+    values = []
+    for field in SEARCH_FIELDS:
+        value = item.get(field)
+        if value is not None and value != '':
+            values.append(fold(value))
+    return '\n'.join(values)
+
+
+def item_matches(query: str, item: dict) -> bool:
+    """Same match rule as SearchIndex.search, evaluated on one item without the index.
+
+    Used for items the index does not know yet (e.g. query results newer than it).
+    """
+    text = item_text(item)
+    tokens = set(tokenize(query or ''))
+    words = _TOKEN_RE.findall(text)
+    for token in tokens:
+        if len(token) < _NGRAM:
+            if not any(w.startswith(token) for w in words):
+                return False
+        elif token not in text:
+            return False
+    return True
+
+
+_index_state = {'index': None}
+_index_lock = threading.RLock()
+
+
+def _on_sprzet_change(item_id, data, version) -> None:
+    idx = _index_state['index']
+    # Patch in place only when exactly one version behind; otherwise rebuild on next read.
+    if idx is not None and idx.version is not None and idx.version == version - 1:
+        idx.apply(item_id, data, version)
+
+
+register_sprzet_cache_observer(_on_sprzet_change)
+
+
+def get_search_index() -> SearchIndex:
+    """Returns the search index for the current sprzet data version, rebuilding it if needed."""
+    version = get_sprzet_cache_version()
+    idx = _index_state['index']
+    if idx is not None and version is not None and idx.version == version:
+        return idx
+    with _index_lock:
+        idx = _index_state['index']
+        if idx is not None and version is not None and idx.version == version:
+            return idx
+        idx = SearchIndex(get_all_sprzet(fields=tuple(f for f in SEARCH_FIELDS if f != 'id')), version)
+        if version is not None:
+            _index_state['index'] = idx
+        return idx
+
+
+def invalidate_search_index() -> None:
+    with _index_lock:
+        _index_state['index'] = None
@@ -10,7 +10,11 @@ from google.cloud import firestore
 import qrcode
 from io import BytesIO
 import html
-from PIL import Image
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
 
 from . import get_firestore_client
 from .auth import login_required, admin_required, quartermaster_required, full_login_required, pin_restricted_required
@@ -20,48 +24,58 @@ from .db_firestore import (
     update_usterka, update_sprzet, get_all_sprzet, get_all_usterki, get_items_by_filters,
     COLLECTION_SPRZET, COLLECTION_USTERKI, COLLECTION_WYPOZYCZENIA, add_item, set_item,
     add_log, get_all_logs, update_item, delete_item, CATEGORIES, MAGAZYNY_NAMES,
-    add_loan, get_active_loans, get_loans_for_item, mark_loan_returned, _warsaw_now,
+    add_loan, get_active_loans, get_loans_for_item, get_loans_history, mark_loan_returned, _warsaw_now,
     get_all_items, get_item, get_items_by_parent, get_list_setting,
     get_list, get_lists_for_user, create_list, update_list, delete_list,
     add_items_to_list, remove_items_from_list, add_members_to_list, remove_members_from_list,
-    get_config
+    get_config, make_page_token, bulk_op, bulk_write, get_items_many, record_report_created,
+    get_sprzet_cache_version,
 )
 from .exports import export_to_csv, export_to_xlsx, export_to_docx, export_to_pdf, export_qr_codes_pdf
 from .id_utils import generate_unique_magazyn_id
+from .hierarchy import get_hierarchy_index
+from .facets import get_facet_index
+from .search import SEARCH_FIELDS, get_search_index, invalidate_search_index, item_matches
+from .background import submit as submit_background
 
 views_bp = Blueprint('views', __name__, url_prefix='/')
 
 # Maksymalna liczba błędów pokazywanych użytkownikowi w bulk edit
 MAX_DISPLAYED_ERRORS = 5
 
-# Cache agregacji sprzętu: typy, lokalizacje, ewidencje (5 minut TTL)
-_sprzet_aggregates_cache = {
-    'typy': None,
-    'lokalizacje': None,
-    'wodoszczelnosci': None,
-    'ewidencje': None,
-    'cached_at': 0,
-    'ttl_seconds': 300  # 5 minut
+# Projekcje pól sprzętu dla widoków, które nie potrzebują całych dokumentów
+PARENT_PICKER_FIELDS = ['category', 'nazwa', 'typ']
+USTERKI_SPRZET_FIELDS = ['nazwa', 'lokalizacja', 'oficjalna_ewidencja']
+
+# Format zapisu przetworzonych zdjęć (config/app_settings: photo_format, photo_quality)
+PHOTO_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
 }
+PHOTO_EXTENSIONS = {'image/webp': '.webp', 'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif'}
+DEFAULT_PHOTO_FORMAT = 'webp'
+DEFAULT_PHOTO_QUALITY = 80
+EXIF_ORIENTATION_TAG = 0x0112
 
+# Liczba wątków skalujących i wgrywających zdjęcia w jednym żądaniu (process_uploads)
+UPLOAD_WORKERS = max(1, int(os.getenv('UPLOAD_WORKERS', '4')))
 
-def _get_cached_sprzet_aggregates():
-    """Zwraca cached agregacje sprzętu jeśli są świeże, inaczej None."""
-    from time import time
-    now = time()
-    if _sprzet_aggregates_cache['cached_at'] and (now - _sprzet_aggregates_cache['cached_at']) < _sprzet_aggregates_cache['ttl_seconds']:
-        return {k: v for k, v in _sprzet_aggregates_cache.items() if k not in ['cached_at', 'ttl_seconds']}
-    return None
+# Podpowiedzi /api/sprzet/search: limity odpowiedzi i cache wyników.
+# Klucz zawiera wersję cache sprzętu, więc każdy zapis sprzętu unieważnia stare wpisy.
+TYPEAHEAD_DEFAULT_LIMIT = 8
+TYPEAHEAD_MAX_LIMIT = 20
+TYPEAHEAD_MAX_QUERY = 64
+TYPEAHEAD_CACHE_SIZE = 256
+_typeahead_cache: OrderedDict = OrderedDict()
+_typeahead_cache_lock = threading.Lock()
 
 
-def _cache_sprzet_aggregates(typy, lokalizacje, wodoszczelnosci, ewidencje):
-    """Cache'uje agregacje sprzętu z timestamp."""
-    from time import time
-    _sprzet_aggregates_cache['typy'] = typy
-    _sprzet_aggregates_cache['lokalizacje'] = lokalizacje
-    _sprzet_aggregates_cache['wodoszczelnosci'] = wodoszczelnosci
-    _sprzet_aggregates_cache['ewidencje'] = ewidencje
-    _sprzet_aggregates_cache['cached_at'] = time()
+def invalidate_search_caches() -> None:
+    """Czyści indeks wyszukiwania sprzętu i cache podpowiedzi."""
+    invalidate_search_index()
+    with _typeahead_cache_lock:
+        _typeahead_cache.clear()
 
 
 def _owners_list() -> list[str]:
@@ -103,20 +117,90 @@ def _resolve_owner_default(parent_id: str | None) -> str | None:
     return _normalize_owner(parent.get('owner_default') or parent.get('owner'))
 
 
+def _encode_photo(f, max_width, photo_format, quality):
+    """Obraca zdjęcie wg EXIF, skaluje do max_width i koduje w `photo_format` bez metadanych.
+
+    Plik bez metadanych, który nie wymaga skalowania, zostaje bez zmian. Duże JPEG-i
+    są dekodowane od razu w zmniejszonej skali (Image.draft), a resize z reducing_gap
+    najpierw zmniejsza obraz szybkim reduce(), zanim użyje LANCZOS.
+    """
+    img = Image.open(f.stream)
+    exif = img.getexif()
+    # Orientacje 5–8 zamieniają szerokość z wysokością
+    rotated = exif.get(EXIF_ORIENTATION_TAG, 1) in (5, 6, 7, 8)
+    width, height = (img.height, img.width) if rotated else (img.width, img.height)
+    resize = bool(max_width) and width > max_width
+    if not resize and not len(exif) and 'xmp' not in img.info:
+        f.stream.seek(0)
+        return
+
+    if resize:
+        target = (max_width, max(1, int(height * max_width / width)))
+        if img.format == 'JPEG':
+            img.draft('RGB', (target[1], target[0]) if rotated else target)
+    icc_profile = img.info.get('icc_profile')
+    img = ImageOps.exif_transpose(img)
+    if resize:
+        img = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    pil_format, mimetype = PHOTO_FORMATS.get(photo_format, PHOTO_FORMATS[DEFAULT_PHOTO_FORMAT])
+    has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    if pil_format == 'JPEG':
+        if has_alpha:
+            background = Image.new('RGB', img.size, 'white')
+            background.paste(img.convert('RGBA'), mask=img.convert('RGBA').getchannel('A'))
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        options = {'quality': quality, 'optimize': True, 'progressive': True}
+    elif pil_format == 'WEBP':
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if has_alpha else 'RGB')
+        options = {'quality': quality, 'method': 4}
+    else:
+        options = {}
+    # Bez exif/xmp (GPS, model aparatu); profil ICC zostaje, bo wpływa na kolory.
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+
+    output_stream = BytesIO()
+    img.save(output_stream, format=pil_format, **options)
+    output_stream.seek(0)
+    f.stream = output_stream
+    f.mimetype = mimetype
+
+
+def _process_upload(f, blob_base, max_width, photo_format, quality):
+    """Przetwarza i wgrywa jeden plik. Zwraca (url, None) albo (None, błąd)."""
+    try:
+        _encode_photo(f, max_width, photo_format, quality)
+    except Exception as e:
+        return None, f'Błąd przetwarzania zdjęcia {f.filename}: {e}'
+
+    blob_name = blob_base + PHOTO_EXTENSIONS.get(f.mimetype, '')
+    return upload_blob_to_gcs(blob_name, f.stream, f.mimetype), None
+
+
 def process_uploads(files, folder, id_prefix=None):
-    """Waliduje i wgrywa pliki do GCS."""
+    """Waliduje i wgrywa pliki do GCS.
+
+    Typ i rozmiar są sprawdzane dla wszystkich plików przed wgraniem czegokolwiek.
+    Skalowanie i upload idą równolegle (najwyżej UPLOAD_WORKERS wątków); wynik
+    zachowuje kolejność plików, a błąd dotyczy pierwszego w kolejności wadliwego pliku.
+    """
     ALLOWED_MIMES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
     config = get_config()
     max_size_mb = config.get('max_photo_size_mb', 5)
     max_width = config.get('max_photo_width', 1920)
+    photo_format = config.get('photo_format', DEFAULT_PHOTO_FORMAT)
+    quality = config.get('photo_quality', DEFAULT_PHOTO_QUALITY)
     MAX_SIZE = max_size_mb * 1024 * 1024
     
     valid_files = [f for f in files if f and f.filename]
     if not valid_files:
         return [], None
-        
-    saved_urls = []
-    for i, f in enumerate(valid_files):
+
+    for f in valid_files:
         if f.mimetype not in ALLOWED_MIMES:
             return [], f'Nieobsługiwany typ pliku: {f.filename}'
 
@@ -126,38 +210,34 @@ def process_uploads(files, folder, id_prefix=None):
         if size > MAX_SIZE:
             return [], f'Plik za duży (>{max_size_mb}MB): {f.filename}'
 
-        # Resize if needed
-        if max_width:
-            try:
-                img = Image.open(f.stream)
-                if img.width > max_width:
-                    w_percent = (max_width / float(img.width))
-                    h_size = int((float(img.height) * float(w_percent)))
-                    img = img.resize((max_width, h_size), Image.Resampling.LANCZOS)
-
-                    # Save resized image back to a stream
-                    output_stream = BytesIO()
-                    img.save(output_stream, format='PNG')
-                    output_stream.seek(0)
-                    f.stream = output_stream
-                    f.mimetype = 'image/png'
-                else:
-                    f.stream.seek(0)
-            except Exception as e:
-                return [], f'Błąd przetwarzania zdjęcia {f.filename}: {e}'
-
+    # Nazwy bez rozszerzenia – dopisuje je _process_upload wg typu zapisanego pliku
+    blob_bases = []
+    # Dodajemy timestamp, aby uniknąć nadpisywania starych zdjęć o tych samych nazwach
+    timestamp = int(time.time())
+    for i, f in enumerate(valid_files):
         if id_prefix:
-            import time
-            # Dodajemy timestamp, aby uniknąć nadpisywania starych zdjęć o tych samych nazwach
-            timestamp = int(time.time())
-            blob_name = f"{folder}/{id_prefix}/{id_prefix}_foto{i:02d}_{timestamp}.png"
+            blob_bases.append(f"{folder}/{id_prefix}/{id_prefix}_foto{i:02d}_{timestamp}")
         else:
-            filename = secure_filename(f.filename)
-            base, ext = os.path.splitext(filename)
-            blob_name = f"{folder}/{base}_{uuid.uuid4().hex[:8]}{ext}"
+            base, _ = os.path.splitext(secure_filename(f.filename))
+            blob_bases.append(f"{folder}/{base}_{uuid.uuid4().hex[:8]}")
 
-        url = upload_blob_to_gcs(blob_name, f.stream, f.mimetype)
-        saved_urls.append(url)
+    saved_urls = []
+    with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(valid_files))) as pool:
+        futures = [pool.submit(_process_upload, f, base, max_width, photo_format, quality)
+                   for f, base in zip(valid_files, blob_bases)]
+        for future in futures:
+            try:
+                url, err = future.result()
+            except Exception:
+                for pending in futures:
+                    pending.cancel()
+                raise
+            if err:
+                # Pliki jeszcze nierozpoczęte nie są już wgrywane
+                for pending in futures:
+                    pending.cancel()
+                return [], err
+            saved_urls.append(url)
     return saved_urls, None
 
 
@@ -171,57 +251,24 @@ def build_user_map(users):
     Returns:
         Dict mapujący user_id na wyświetlaną nazwę (imię nazwisko, imię, nazwisko lub email)
     """
+    from .db_users import user_display_name
     user_map = {}
     for user in users:
-        first_name = user.get('first_name', '')
-        last_name = user.get('last_name', '')
-        if first_name and last_name:
-            user_map[user['id']] = f"{first_name} {last_name}"
-        elif first_name:
-            user_map[user['id']] = first_name
-        elif last_name:
-            user_map[user['id']] = last_name
-        else:
-            user_map[user['id']] = user.get('email', user['id'])
+        user_map[user['id']] = user_display_name(user)
     return user_map
 
 
 def _build_qty_suggestions(category_value: str, limit: int = 12) -> list[str]:
-    """Buduje krótką listę podpowiedzi ilości na podstawie istniejących elementów."""
-    seen: set[str] = set()
-    out: list[str] = []
-    for s in get_all_sprzet():
-        if s.get('category') != category_value:
-            continue
-        val = s.get('ilosc')
-        if val is None:
-            continue
-        v = str(val).strip()
-        if not v:
-            continue
-        if v in seen:
-            continue
-        seen.add(v)
-        out.append(v)
-        if len(out) >= limit:
-            break
-    return out
+    """Buduje krótką listę podpowiedzi ilości (najczęstsze wartości w danej kategorii)."""
+    return get_facet_index().top('ilosc', category=category_value, n=limit)
 
 
 def _build_do_czego_suggestions() -> list[str]:
     """Buduje listę podpowiedzi dla pola 'do_czego' (typ namiotu/kanadyjki)."""
-    seen: set[str] = set()
-    for s in get_all_sprzet():
-        cat = s.get('category')
-        if cat == CATEGORIES['NAMIOT']:
-            val = s.get('typ')
-            if val:
-                seen.add(str(val).strip())
-        elif cat == CATEGORIES['KANADYJKI']:
-            val = s.get('material')
-            if val:
-                seen.add(str(val).strip())
-    return sorted(list(seen))
+    facets = get_facet_index()
+    seen = set(facets.values('typ', category=CATEGORIES['NAMIOT']))
+    seen.update(facets.values('material', category=CATEGORIES['KANADYJKI']))
+    return sorted(seen)
 
 
 def _build_owner_suggestions(limit: int = 40) -> list[str]:
@@ -235,18 +282,13 @@ def _build_owner_suggestions(limit: int = 40) -> list[str]:
             seen.add(o)
 
     # Dodaj to co już jest w sprzęcie (jeśli ktoś wpisał niestandardowe)
-    for s in get_all_sprzet():
-        v = s.get('owner')
-        if not v:
-            continue
-        vv = str(v).strip()
-        if not vv or vv in seen:
+    for vv in get_facet_index().top('owner'):
+        if len(out) >= limit:
+            break
+        if vv in seen:
             continue
         out.append(vv)
         seen.add(vv)
-        if len(out) >= limit:
-            break
-
     return out
 
 
@@ -343,89 +385,53 @@ def sprzet_list():
         items = get_all_sprzet(category=CATEGORIES['MAGAZYN']) if not search_query else get_all_sprzet()
     after_firestore = perf_counter()
 
-    # Wyszukiwanie lokalne (Firestore nie wspiera łatwo full-text search bez zewnętrznych usług)
+    # Wyszukiwanie lokalne (Firestore nie wspiera łatwo full-text search bez zewnętrznych usług):
+    # indeks odwrócony trigramów (aktualizowany przyrostowo przy zapisach), bez polskich znaków.
     if search_query:
-        s = search_query.lower().strip()
-
-        # Lista pól, po których chcemy szukać (dużo danych jest opcjonalnych, więc wszystko przez str()).
-        # Celowo obejmujemy pola ogólne + specyficzne dla kategorii.
-        searchable_fields = [
-            'id', 'nazwa', 'typ',
-            'przeznaczenie',
-            'lokalizacja', 'magazyn_display',
-            'informacje', 'uwagi',
-            'stan_ogolny',
-            'wodoszczelnosc',
-            'ilosc', 'jednostka',
-            'oficjalna_ewidencja',
-            'owner',
-            # namioty
-            'zapalki', 'kolor_dachu', 'kolor_bokow',
-            # żelastwo
-            'typ_zelastwa', 'do_czego',
-            # kanadyjki
-            'material',
-            # kompatybilność wsteczna/importy
-            'historia',
-        ]
+        index = get_search_index()
+        matched_ids = index.search(search_query)
+        if matched_ids is not None:
+            # Pozycje spoza indeksu (np. świeższe niż on) sprawdzamy tą samą regułą bezpośrednio.
+            items = [i for i in items if i.get('id') in matched_ids
+                     or (i.get('id') not in index and item_matches(search_query, i))]
+        else:
+            # Zapytanie bez liter i cyfr (np. samo "-") – zwykłe wyszukiwanie podciągu.
+            s = search_query.lower().strip()
 
-        def _matches(item: dict) -> bool:
-            for key in searchable_fields:
-                try:
-                    if s in str(item.get(key, '')).lower():
-                        return True
-                except Exception:
-                    # W razie nietypowych typów danych w polach – pomiń.
-                    continue
-            return False
+            def _matches(item: dict) -> bool:
+                for key in SEARCH_FIELDS:
+                    try:
+                        if s in str(item.get(key, '')).lower():
+                            return True
+                    except Exception:
+                        # W razie nietypowych typów danych w polach – pomiń.
+                        continue
+                return False
 
-        items = [i for i in items if _matches(i)]
+            items = [i for i in items if _matches(i)]
 
-    # Pobieramy unikalne wartości do filtrów - z cache jeśli dostępne
+    # Unikalne wartości do filtrów z indeksu facet (aktualizowany przyrostowo przy zapisach)
     start_agg = perf_counter()
-    cached_agg = _get_cached_sprzet_aggregates()
-    
-    if cached_agg:
-        typy = cached_agg['typy']
-        lokalizacje = cached_agg['lokalizacje']
-        wodoszczelnosci = cached_agg['wodoszczelnosci']
-        ewidencje = cached_agg['ewidencje']
-        agg_source = 'cache'
-    else:
-        all_items = get_all_sprzet()
-        typy = sorted(list(set(i.get('typ') for i in all_items if i.get('typ'))))
-        lokalizacje = sorted(list(set(i.get('lokalizacja') for i in all_items if i.get('lokalizacja'))))
-        wodoszczelnosci = sorted(list(set(i.get('wodoszczelnosc') for i in all_items if i.get('wodoszczelnosc'))))
-        ewidencje = sorted(list(set(i.get('oficjalna_ewidencja') for i in all_items if i.get('oficjalna_ewidencja'))))
-        _cache_sprzet_aggregates(typy, lokalizacje, wodoszczelnosci, ewidencje)
-        agg_source = 'firestore'
-        # Użyj all_items dla sprzet_map (zamiast drugiego get_all_sprzet())
+    facets = get_facet_index()
+    typy = facets.values('typ')
+    lokalizacje = facets.values('lokalizacja')
+    wodoszczelnosci = facets.values('wodoszczelnosc')
+    ewidencje = facets.values('oficjalna_ewidencja')
+    agg_source = 'facets'
     
     after_agg = perf_counter()
     
-    # Pobieramy mapę ID -> obiekt dla wszystkich sprzętów (jeśli z cache, musimy pobrać raz więcej dla mapy)
-    if cached_agg:
-        all_items = get_all_sprzet()  # Musimy pobrać dla mapy hierarchii
-    
-    sprzet_map = {s['id']: s for s in all_items if 'id' in s}
+    # Indeks hierarchii (budowany raz na wersję danych) zamiast mapy i przechodzenia łańcucha parent_id
+    hierarchy = get_hierarchy_index()
 
     # Dodajemy informację o nazwie magazynu nadrzędnego
     for item in items:
         # Poczyszczenie po ewentualnych brakach w logice filtrów/importów
-        if not item.get('magazyn_display'):
-            # Szukamy nadrzędnego magazynu w hierarchii
-            curr = item
-            visited = set()
-            while curr.get('parent_id') and curr['parent_id'] not in visited:
-                visited.add(curr['id'])
-                parent = sprzet_map.get(curr['parent_id'])
-                if not parent:
-                    break
-                if parent.get('category') == CATEGORIES['MAGAZYN']:
-                    item['magazyn_display'] = parent.get('nazwa') or parent.get('id')
-                    item['magazyn_id'] = parent.get('id')
-                    break
-                curr = parent
+        if not item.get('magazyn_display') and item.get('id'):
+            mag_id, mag_name = hierarchy.magazyn_display(item['id'])
+            if mag_id:
+                item['magazyn_display'] = mag_name
+                item['magazyn_id'] = mag_id
 
         if not item.get('magazyn_display'):
             if item.get('lokalizacja'):
@@ -504,35 +510,25 @@ def sprzet_list():
         grouped_items.extend(other_items)
         items = grouped_items
 
-    # Fast-card: jeśli jesteśmy w folderze (parent_id) -> policz które elementy mają dzieci.
-    # Dotyczy: namiot/przedmiot/żelastwo/kanadyjki/materace.
-    if parent_id and items:
-        children = get_items_by_parent(parent_id)
-        parent_ids_with_children = {c.get('parent_id') for c in children if c.get('parent_id')}
-        fast_card_cats = {CATEGORIES['NAMIOT'], CATEGORIES['PRZEDMIOT'], CATEGORIES['ZELASTWO'], CATEGORIES['KANADYJKI'], CATEGORIES['MATERACE']}
-        for it in items:
-            it['has_children'] = (it.get('id') in parent_ids_with_children)
-            it['fast_card'] = (it.get('category') in fast_card_cats)
-
     # Fast-card: ustaw flagi dla namiot/przedmiot/żelastwo/kanadyjki/materace, żeby UI mógł
     # przekierować klik w nazwę prosto na kartę, jeśli element nie ma dzieci.
+    # has_children liczymy zbiorowo (indeks hierarchii + dzieci bieżącego folderu),
+    # bez osobnego zapytania o dzieci dla każdego elementu.
     if items:
         fast_card_cats = {CATEGORIES['NAMIOT'], CATEGORIES['PRZEDMIOT'], CATEGORIES['ZELASTWO'], CATEGORIES['KANADYJKI'], CATEGORIES['MATERACE']}
-        # Minimalnie: sprawdzamy dzieci tylko dla elementów, które mogą używać fast-card.
-        candidate_parent_ids = [it.get('id') for it in items if it.get('id') and it.get('category') in fast_card_cats]
         parent_ids_with_children: set[str] = set()
-        for pid in candidate_parent_ids:
-            try:
-                children = get_items_by_parent(pid)
-            except Exception:
-                children = []
-            if children:
-                parent_ids_with_children.add(pid)
+        if parent_id:
+            children = get_items_by_parent(parent_id)
+            parent_ids_with_children = {c.get('parent_id') for c in children if c.get('parent_id')}
 
         for it in items:
             it['fast_card'] = (it.get('category') in fast_card_cats)
             # default False; tylko dla kandydatów liczymy realnie
-            it['has_children'] = (it.get('id') in parent_ids_with_children)
+            it_id = it.get('id')
+            it['has_children'] = bool(
+                it_id and it['fast_card']
+                and (it_id in parent_ids_with_children or hierarchy.has_children(it_id))
+            )
 
     parent_item = get_sprzet_item(parent_id) if parent_id else None
     if parent_item:
@@ -590,7 +586,7 @@ def sprzet_add():
         elif category == CATEGORIES['MAGAZYN']:
             # Human-readable ID based on warehouse name, e.g. MAG_WARSZAWA / MAG_WARSZAWA_2
             magazyn_name = (request.form.get('nazwa') or request.form.get('lokalizacja') or '').strip()
-            existing_ids = {s.get('id') for s in get_all_sprzet() if s.get('id')}
+            existing_ids = {s.get('id') for s in get_all_sprzet(fields=['category']) if s.get('id')}
             sprzet_id = generate_unique_magazyn_id(magazyn_name, existing_ids)
         else:
             dozwolone_znaki = {' ':'_','Ą':'A','Ę':'E','Ć':'C','Ź':'Z','Ż':'Z'}
@@ -648,18 +644,12 @@ def sprzet_add():
 
             set_item(COLLECTION_SPRZET, sprzet_id, data)
             add_log(session.get('user_id'), 'add', 'sprzet', sprzet_id, after=data)
-            # Ogólny warunek: liczba logów (log_count)
-            try:
-                from .achievements_service import maybe_award_on_log
-                maybe_award_on_log(session.get('user_id'), 'add', 'sprzet', (data or {}).get('category'))
-            except Exception as _ach_err:
-                current_app.logger.warning(f"Achievements check (log:add sprzet) failed: {_ach_err}")
-            # Automatyczne osiągnięcia – dodanie elementu (z opcjonalnym filtrem kategorii)
-            try:
-                from .achievements_service import maybe_award_on_item_created
-                maybe_award_on_item_created(session.get('user_id'), data.get('category'))
-            except Exception as _ach_err:
-                current_app.logger.warning(f"Achievements check (item_created) failed: {_ach_err}")
+            # Osiągnięcia w tle: ogólny warunek liczby logów (log_count) i dodanie elementu
+            from .achievements_service import maybe_award_on_log, maybe_award_on_item_created
+            submit_background(maybe_award_on_log, session.get('user_id'), 'add', 'sprzet', (data or {}).get('category'),
+                              job='achievements:log')
+            submit_background(maybe_award_on_item_created, session.get('user_id'), data.get('category'),
+                              job='achievements:item_created')
             flash(f'Sprzęt {sprzet_id} został dodany.', 'success')
             # Po dodaniu wróć do kontekstu listy, jeśli był podany
             if return_query:
@@ -667,7 +657,7 @@ def sprzet_add():
             return redirect(url_for('views.sprzet_list'))
 
     # Filtrujemy potencjalnych rodziców: tylko Magazyny i Półki/Skrzynie
-    potential_parents = [s for s in get_all_sprzet() if s.get('category') in [CATEGORIES['MAGAZYN'], CATEGORIES['POLKA']]]
+    potential_parents = [s for s in get_all_sprzet(fields=PARENT_PICKER_FIELDS) if s.get('category') in [CATEGORIES['MAGAZYN'], CATEGORIES['POLKA']]]
 
     # Prefill parent_id z querystring (ułatwia dodawanie elementów w konkretnym magazynie/półce)
     prefill_parent_id = (request.args.get('parent_id') or '').strip().upper() or None
@@ -868,19 +858,28 @@ def sprzet_import():
 @quartermaster_required
 def sprzet_import_confirm():
     import_ids = request.form.getlist('import_ids')
-    count = 0
+    ops = []
     for sid in import_ids:
         data_json = request.form.get(f'data_{sid}')
         if data_json:
             data = json.loads(data_json)
             before_json = request.form.get(f'before_{sid}')
             before_data = json.loads(before_json) if before_json else None
-            
-            set_item(COLLECTION_SPRZET, sid, data)
-            add_log(session.get('user_id'), 'import', 'sprzet', sid, before=before_data, after=data)
-            count += 1
-    
-    flash(f'Pomyślnie zaimportowano/zaktualizowano {count} pozycji.', 'success')
+
+            ops.append(bulk_op('set', COLLECTION_SPRZET, sid, data, log={
+                'user_id': session.get('user_id'), 'action': 'import', 'target_type': 'sprzet',
+                'before': before_data, 'after': data,
+            }))
+
+    # Zapis zbiorczy: dane + logi w paczkach WriteBatch zamiast 2 round-tripów na pozycję
+    done, failed = bulk_write(ops)
+
+    flash(f'Pomyślnie zaimportowano/zaktualizowano {len(done)} pozycji.', 'success')
+    if failed:
+        flash(f'Wystąpiły błędy dla {len(failed)} pozycji:', 'danger')
+        for sid, err in failed[:MAX_DISPLAYED_ERRORS]:
+            flash(f"{sid}: {err}", 'danger')
+            current_app.logger.error(f"Import error: {sid}: {err}")
     return redirect(url_for('views.sprzet_list'))
 
 @views_bp.route('/sprzet/edit/<sprzet_id>', methods=['GET', 'POST'])
@@ -965,13 +964,10 @@ def sprzet_edit(sprzet_id):
 
         update_sprzet(sprzet_id, **data)
         add_log(session.get('user_id'), 'edit', 'sprzet', sprzet_id, before=before_data, after=data)
-        # Automatyczne osiągnięcia – edycja elementu (z opcjonalnym filtrem kategorii)
-        try:
-            from .achievements_service import maybe_award_on_item_edited
-            _cat = data.get('category') or sprzet.get('category')
-            maybe_award_on_item_edited(session.get('user_id'), _cat)
-        except Exception as _ach_err:
-            current_app.logger.warning(f"Achievements check (item_edited) failed: {_ach_err}")
+        # Automatyczne osiągnięcia (w tle) – edycja elementu (z opcjonalnym filtrem kategorii)
+        from .achievements_service import maybe_award_on_item_edited
+        _cat = data.get('category') or sprzet.get('category')
+        submit_background(maybe_award_on_item_edited, session.get('user_id'), _cat, job='achievements:item_edited')
         flash(f'Sprzęt {sprzet_id} został zaktualizowany.', 'success')
         # Przekaż return dalej na kartę, żeby 'Powrót do katalogu' wracał do właściwego miejsca.
         if return_query:
@@ -987,7 +983,7 @@ def sprzet_edit(sprzet_id):
         sprzet['zdjecia_lista_url'] = list_equipment_photos(sprzet_id)
 
     # Filtrujemy potencjalnych rodziców: tylko Magazyny i Półki/Skrzynie
-    potential_parents = [s for s in get_all_sprzet() if s.get('category') in [CATEGORIES['MAGAZYN'], CATEGORIES['POLKA']]]
+    potential_parents = [s for s in get_all_sprzet(fields=PARENT_PICKER_FIELDS) if s.get('category') in [CATEGORIES['MAGAZYN'], CATEGORIES['POLKA']]]
 
     return render_template('sprzet_edit.html',
                            sprzet=sprzet,
@@ -1171,13 +1167,12 @@ def sprzet_card(sprzet_id):
                         'zdjecia': urls
                     }
                     doc_ref.set(data)
+                    record_report_created(session.get('user_id'))
                     add_log(session.get('user_id'), 'add', 'usterka', doc_ref.id, data)
-                    # Automatyczne osiągnięcia – pierwszy raport / 5 raportów
-                    try:
-                        from .achievements_service import maybe_award_on_report_created
-                        maybe_award_on_report_created(session.get('user_id'))
-                    except Exception as _ach_err:
-                        current_app.logger.warning(f"Achievements check (report_created) failed: {_ach_err}")
+                    # Automatyczne osiągnięcia (w tle) – pierwszy raport / 5 raportów
+                    from .achievements_service import maybe_award_on_report_created
+                    submit_background(maybe_award_on_report_created, session.get('user_id'),
+                                      job='achievements:report_created')
                     flash(f'Usterka dla {sprzet_id} została zgłoszona!', 'success')
             except Exception as e:
                 flash(f'Błąd: {e}', 'danger')
@@ -1193,33 +1188,22 @@ def sprzet_card(sprzet_id):
         sprzet_item['zdjecia_lista_url'] = list_equipment_photos(sprzet_id)
 
     # Pobieranie logów aktywności dla tego sprzętu
-    from .db_firestore import get_logs_by_target
-    from .db_users import get_all_users
+    from .db_firestore import get_logs_by_target, expand_logs
+    from .db_users import get_user_display_names
 
     # Pobieramy tylko ostatnie 15 logów dla wydajności karty
-    logs = get_logs_by_target(sprzet_id, limit=15)
-    users = get_all_users()
-    user_map = build_user_map(users)
+    logs = expand_logs(get_logs_by_target(sprzet_id, limit=15))
+    user_map = get_user_display_names()
 
     for log in logs:
         log['user_name'] = user_map.get(log.get('user_id'), log.get('user_id', 'Nieznany'))
 
-    # Dodaj mapę sprzętów do sprzet_card, aby wyciągnąć magazyn_id i magazyn_display
-    all_items = get_all_sprzet()
-    sprzet_map = {s['id']: s for s in all_items if 'id' in s}
+    # Magazyn nadrzędny z indeksu hierarchii (magazyn_id i magazyn_display)
     if not sprzet_item.get('magazyn_display'):
-        curr = sprzet_item
-        visited = set()
-        while curr.get('parent_id') and curr['parent_id'] not in visited:
-            visited.add(curr['id'])
-            parent = sprzet_map.get(curr['parent_id'])
-            if not parent:
-                break
-            if parent.get('category') == CATEGORIES['MAGAZYN']:
-                sprzet_item['magazyn_display'] = parent.get('nazwa') or parent.get('id')
-                sprzet_item['magazyn_id'] = parent.get('id')
-                break
-            curr = parent
+        mag_id, mag_name = get_hierarchy_index().magazyn_display(sprzet_id)
+        if mag_id:
+            sprzet_item['magazyn_display'] = mag_name
+            sprzet_item['magazyn_id'] = mag_id
         if not sprzet_item.get('magazyn_display') and sprzet_item.get('lokalizacja'):
             sprzet_item['magazyn_display'] = sprzet_item['lokalizacja']
 
@@ -1258,7 +1242,8 @@ def quick_photo(sprzet_id):
             aktualne_zdjecia = sprzet.get('zdjecia', [])
             aktualne_zdjecia.extend(urls)
             update_sprzet(sprzet_id, zdjecia=aktualne_zdjecia)
-            add_log(session.get('user_id'), 'edit', 'sprzet', sprzet_id, details={'action': 'quick_photo_add'})
+            add_log(session.get('user_id'), 'edit', 'sprzet', sprzet_id, details={'action': 'quick_photo_add'},
+                    category=sprzet.get('category'))
             flash('Zdjęcie zostało dodane.', 'success')
 
     return redirect(url_for('views.sprzet_card', sprzet_id=sprzet_id) + (f'?return={return_query}' if return_query else ''))
@@ -1395,9 +1380,13 @@ def usterki_list():
     # Paginacja: 50 usterek na stronę, ale tylko gdy nie ma aktywnych filtrów
     # (filtry w pamięci na obciętym zbiorze dają niekompletne wyniki)
     any_filter_active = any([status, magazyn, sprzet_id, oficjalna_ewidencja])
-    page = request.args.get('page', 1, type=int)
+    # Paginacja kursorem: page_token wskazuje ostatnią usterkę poprzedniej strony,
+    # `page` służy tylko do wyświetlenia numeru strony.
+    page_token = request.args.get('page_token') or None
+    page = request.args.get('page', 1, type=int) if page_token else 1
     page = max(page, 1)
     limit_per_page = 50
+    next_page_token = None
 
     start_usterki = perf_counter()
     if any_filter_active:
@@ -1406,15 +1395,15 @@ def usterki_list():
         has_next = False
         page = 1
     else:
-        offset = (page - 1) * limit_per_page
-        usterki = get_all_usterki(limit=limit_per_page + 1, offset=offset)  # +1 aby wiedzieć czy jest następna strona
+        usterki = get_all_usterki(limit=limit_per_page + 1, page_token=page_token)  # +1 aby wiedzieć czy jest następna strona
         has_next = len(usterki) > limit_per_page
         if has_next:
             usterki = usterki[:limit_per_page]  # Obetnij do limit
+            next_page_token = make_page_token(usterki)
     after_usterki = perf_counter()
     
     start_sprzet = perf_counter()
-    sprzet_items = get_all_sprzet()
+    sprzet_items = get_all_sprzet(fields=USTERKI_SPRZET_FIELDS)
     after_sprzet = perf_counter()
     
     sprzet_map = {s['id']: s for s in sprzet_items}
@@ -1479,6 +1468,7 @@ def usterki_list():
                            ewidencje=ewidencje,
                            selected_filters=request.args,
                            current_page=page,
+                           next_page_token=next_page_token,
                            has_next_page=has_next,
                            has_prev_page=page > 1)
 
@@ -1504,13 +1494,12 @@ def usterka_card(usterka_id):
     usterka['zdjecia_lista_url'] = photos
 
     # Pobieranie logów aktywności dla tej usterki
-    from .db_firestore import get_logs_by_target
-    from .db_users import get_all_users
+    from .db_firestore import get_logs_by_target, expand_logs
+    from .db_users import get_user_display_names
     
     # Pobieramy tylko ostatnie 15 logów dla wydajności profilu
-    logs = get_logs_by_target(usterka_id, limit=15)
-    users = get_all_users()
-    user_map = build_user_map(users)
+    logs = expand_logs(get_logs_by_target(usterka_id, limit=15))
+    user_map = get_user_display_names()
     
     for log in logs:
         log['user_name'] = user_map.get(log.get('user_id'), log.get('user_id', 'Nieznany'))
@@ -1576,18 +1565,15 @@ def usterka_edit(usterka_id):
         update_usterka(usterka_id, **data)
         add_log(session.get('user_id'), 'edit', 'usterka', usterka_id, before=before_data, after=data)
 
-        # Automatyczne osiągnięcia – pomoc w rozwiązaniu cudzej usterki
-        try:
-            if is_quartermaster:
-                new_status = data.get('status')
-                old_status = before_data.get('status')
-                actor_uid = session.get('user_id')
-                owner_uid = usterka.get('user_id')
-                if new_status == 'naprawiona' and old_status != 'naprawiona' and owner_uid and owner_uid != actor_uid:
-                    from .achievements_service import maybe_award_on_help_resolve
-                    maybe_award_on_help_resolve(actor_uid, usterka)
-        except Exception as _ach_err:
-            current_app.logger.warning(f"Achievements check (help_resolve) failed: {_ach_err}")
+        # Automatyczne osiągnięcia (w tle) – pomoc w rozwiązaniu cudzej usterki
+        if is_quartermaster:
+            new_status = data.get('status')
+            old_status = before_data.get('status')
+            actor_uid = session.get('user_id')
+            owner_uid = usterka.get('user_id')
+            if new_status == 'naprawiona' and old_status != 'naprawiona' and owner_uid and owner_uid != actor_uid:
+                from .achievements_service import maybe_award_on_help_resolve
+                submit_background(maybe_award_on_help_resolve, actor_uid, usterka, job='achievements:help_resolve')
         flash(f'Usterka {usterka_id} zaktualizowana.', 'success')
         return redirect(url_for('views.usterka_card', usterka_id=usterka_id))
 
@@ -1624,18 +1610,26 @@ def usterki_bulk_edit():
         flash('Nieprawidłowy status.', 'warning')
         return redirect(url_for('views.usterki_list'))
 
-    count = 0
-    for uid in usterka_ids:
-        usterka = get_usterka_item(uid)
-        if usterka:
-            before_data = {k: v for k, v in usterka.items() if k not in ['id', 'zdjecia_lista_url']}
-            update_usterka(uid, status=new_status)
-            after_data = dict(before_data)
-            after_data['status'] = new_status
-            add_log(session.get('user_id'), 'bulk_edit', 'usterka', uid, before=before_data, after=after_data)
-            count += 1
-    
-    flash(f'Pomyślnie zaktualizowano {count} usterek.', 'success')
+    ops = []
+    # Jeden batch-get dla wszystkich zaznaczonych usterek (nieistniejące są pomijane)
+    for usterka in get_items_many(COLLECTION_USTERKI, usterka_ids):
+        uid = usterka['id']
+        before_data = {k: v for k, v in usterka.items() if k not in ['id', 'zdjecia_lista_url']}
+        after_data = dict(before_data)
+        after_data['status'] = new_status
+        ops.append(bulk_op('update', COLLECTION_USTERKI, uid, {'status': new_status}, log={
+            'user_id': session.get('user_id'), 'action': 'bulk_edit', 'target_type': 'usterka',
+            'before': before_data, 'after': after_data,
+        }))
+
+    done, failed = bulk_write(ops)
+
+    flash(f'Pomyślnie zaktualizowano {len(done)} usterek.', 'success')
+    if failed:
+        flash(f'Wystąpiły błędy dla {len(failed)} usterek:', 'danger')
+        for uid, err in failed[:MAX_DISPLAYED_ERRORS]:
+            flash(f"{uid}: {err}", 'danger')
+            current_app.logger.error(f"Bulk edit usterki error: {uid}: {err}")
     return redirect(url_for('views.usterki_list'))
 
 
@@ -1653,20 +1647,19 @@ def sprzet_bulk_delete():
         flash('Nie wybrano żadnych elementów.', 'warning')
         return redirect(url_for('views.sprzet_list'))
 
-    count = 0
-    errors = 0
+    done, failed = bulk_write([
+        bulk_op('delete', COLLECTION_SPRZET, sid, log={
+            'user_id': session.get('user_id'), 'action': 'delete', 'target_type': 'sprzet',
+        })
+        for sid in sprzet_ids
+    ])
+    count = len(done)
+    errors = len(failed)
     error_details = []
-
-    for sid in sprzet_ids:
-        try:
-            delete_item(COLLECTION_SPRZET, sid)
-            add_log(session.get('user_id'), 'delete', 'sprzet', sid)
-            count += 1
-        except Exception as e:
-            errors += 1
-            error_msg = f"{sid}: {str(e)}"
-            error_details.append(error_msg)
-            current_app.logger.error(f"Bulk delete error: {error_msg}", exc_info=True)
+    for sid, err in failed:
+        error_msg = f"{sid}: {err}"
+        error_details.append(error_msg)
+        current_app.logger.error(f"Bulk delete error: {error_msg}")
 
     if count:
         flash(f'Pomyślnie usunięto {count} elementów.', 'success')
@@ -1691,15 +1684,25 @@ def sprzet_bulk_delete():
 @quartermaster_required
 def loans_list():
     show_history = request.args.get('history', '0') == '1'
+    page_token = request.args.get('page_token') or None
+    page = max(request.args.get('page', 1, type=int), 1) if page_token else 1
+    per_page = 50
+    next_page_token = None
     if show_history:
-        loans = get_all_items(COLLECTION_WYPOZYCZENIA, order_by='timestamp')
+        # Historia rośnie bez końca – stronicujemy kursorem (start_after), nie offsetem.
+        loans = get_loans_history(limit=per_page + 1, page_token=page_token)
+        if len(loans) > per_page:
+            loans = loans[:per_page]
+            next_page_token = make_page_token(loans)
     else:
         loans = get_active_loans()
 
-    # Dodajemy informacje o sprzęcie do każdego wypożyczenia
+    # Dodajemy informacje o sprzęcie do każdego wypożyczenia (jeden batch-get zamiast N odczytów)
+    items_map = {i['id']: i for i in get_items_many(COLLECTION_SPRZET, [l.get('item_id') for l in loans])}
     for loan in loans:
-        loan['item'] = get_sprzet_item(loan.get('item_id'))
-    return render_template('loans_list.html', loans=loans, show_history=show_history)
+        loan['item'] = items_map.get(loan.get('item_id'))
+    return render_template('loans_list.html', loans=loans, show_history=show_history,
+                           page=page, next_page_token=next_page_token)
 
 @views_bp.route('/loan/add/<item_id>', methods=['GET', 'POST'])
 @quartermaster_required
@@ -1724,18 +1727,16 @@ def loan_add(item_id):
         }
         add_loan(data)
         add_log(session.get('user_id'), 'loan', 'sprzet', item_id, after=data)
-        # Automatyczne osiągnięcia – przypisz po e‑mailu w polu 'kontakt'
-        try:
-            from .achievements_service import maybe_award_on_loan_created
-            maybe_award_on_loan_created(data.get('kontakt'))
-        except Exception as _ach_err:
-            current_app.logger.warning(f"Achievements check (loan_created) failed: {_ach_err}")
+        # Automatyczne osiągnięcia (w tle) – przypisz po e‑mailu w polu 'kontakt'
+        from .achievements_service import maybe_award_on_loan_created
+        submit_background(maybe_award_on_loan_created, data.get('kontakt'), job='achievements:loan_created')
         flash(f'Wypożyczono {item_id}.', 'success')
         return redirect(url_for('views.loans_list'))
     
-    from .db_users import get_all_users
-    users = get_all_users()
-    user_names = sorted(list(set(build_user_map(users).values())))
+    from .db_users import get_user_directory
+    directory = get_user_directory()
+    users = list(directory.users.values())
+    user_names = sorted(set(directory.names.values()))
     
     # Budujemy mapę użytkowników do auto-uzupełniania kontaktu
     user_contact_map = {}
@@ -1775,12 +1776,9 @@ def loan_return(loan_id):
             return redirect(url_for('views.loans_list'))
 
     mark_loan_returned(loan_id)
-    # Automatyczne osiągnięcia – szybki zwrot (dla wypożyczającego)
-    try:
-        from .achievements_service import maybe_award_on_loan_return
-        maybe_award_on_loan_return(loan)
-    except Exception as _ach_err:
-        current_app.logger.warning(f"Achievements check (loan_return) failed: {_ach_err}")
+    # Automatyczne osiągnięcia (w tle) – szybki zwrot (dla wypożyczającego)
+    from .achievements_service import maybe_award_on_loan_return
+    submit_background(maybe_award_on_loan_return, loan, job='achievements:loan_return')
     flash('Przedmiot został zwrócony.', 'success')
     return redirect(url_for('views.loans_list'))
 
@@ -1789,33 +1787,39 @@ def loan_return(loan_id):
 def logs_list():
     """Wyświetla listę wszystkich logów (QUARTERMASTER/ADMIN)."""
     from time import perf_counter
-    from .db_firestore import get_all_logs, get_logs_count, get_logs_by_user, get_logs_by_target
-    from .db_users import get_all_users
+    from .db_firestore import get_all_logs, get_logs_count, get_logs_by_user, get_logs_by_target, expand_logs
+    from .db_users import get_user_display_names
 
     start = perf_counter()
     
-    page = request.args.get('page', 1, type=int)
+    # Paginacja kursorem (page_token = ostatni log poprzedniej strony) – głębokie strony
+    # kosztują tyle samo co pierwsza. `page` jest tylko numerem do wyświetlenia.
+    page_token = request.args.get('page_token') or None
+    page = max(request.args.get('page', 1, type=int), 1) if page_token else 1
     per_page = 50
-    offset = (page - 1) * per_page
     
     user_id_filter = request.args.get('user_id')
     target_id_filter = request.args.get('target_id')
 
     start_logs = perf_counter()
     if user_id_filter:
-        logs = get_logs_by_user(user_id_filter, limit=per_page, offset=offset)
+        logs = get_logs_by_user(user_id_filter, limit=per_page + 1, page_token=page_token)
         total_logs = get_logs_count(user_id=user_id_filter)
     elif target_id_filter:
-        logs = get_logs_by_target(target_id_filter, limit=per_page, offset=offset)
+        logs = get_logs_by_target(target_id_filter, limit=per_page + 1, page_token=page_token)
         total_logs = get_logs_count(target_id=target_id_filter)
     else:
-        logs = get_all_logs(limit=per_page, offset=offset)
+        logs = get_all_logs(limit=per_page + 1, page_token=page_token)
         total_logs = get_logs_count()
+    next_page_token = None
+    if len(logs) > per_page:
+        logs = logs[:per_page]
+        next_page_token = make_page_token(logs)
+    expand_logs(logs)
     after_logs = perf_counter()
 
     start_users = perf_counter()
-    users = get_all_users()
-    user_map = build_user_map(users)
+    user_map = get_user_display_names()
     after_users = perf_counter()
 
     for log in logs:
@@ -1840,15 +1844,110 @@ def logs_list():
                            page=page, 
                            total_pages=total_pages,
                            total_logs=total_logs,
+                           next_page_token=next_page_token,
                            user_id_filter=user_id_filter,
                            target_id_filter=target_id_filter)
 
+@views_bp.route('/logs/archive')
+@quartermaster_required
+def logs_archive():
+    """Przeszukuje logi przeniesione do archiwum w GCS (QUARTERMASTER/ADMIN)."""
+    from datetime import date, timedelta
+    from .log_archive import search_archive
+    from .db_users import get_user_display_names
+
+    def _parse_date(value, default):
+        try:
+            return date.fromisoformat(value) if value else default
+        except ValueError:
+            return default
+
+    today = date.today()
+    date_to = _parse_date(request.args.get('date_to'), today)
+    date_from = _parse_date(request.args.get('date_from'), date_to - timedelta(days=30))
+    # Każdy dzień to osobny prefiks w GCS – ograniczamy zakres jednego wyszukiwania.
+    if (date_to - date_from).days > 366:
+        date_from = date_to - timedelta(days=366)
+        flash('Zakres wyszukiwania ograniczono do 366 dni.', 'info')
+    filters = {
+        'target_id': (request.args.get('target_id') or '').strip() or None,
+        'user_id': (request.args.get('user_id') or '').strip() or None,
+        'action': (request.args.get('action') or '').strip() or None,
+        'text': (request.args.get('q') or '').strip() or None,
+    }
+
+    logs = []
+    searched = request.args.get('search') is not None
+    if searched:
+        try:
+            logs = search_archive(date_from, date_to, **filters)
+        except Exception as e:
+            current_app.logger.error(f"Log archive search failed: {e}", exc_info=True)
+            flash('Nie udało się przeszukać archiwum logów.', 'danger')
+        user_map = get_user_display_names()
+        for log in logs:
+            log['user_name'] = user_map.get(log.get('user_id'), log.get('user_id', 'Nieznany'))
+
+    return render_template('logs_archive.html', logs=logs, searched=searched,
+                           date_from=date_from, date_to=date_to, filters=filters)
+
+@views_bp.route('/logs/history/<target_type>/<target_id>')
+@quartermaster_required
+def item_history(target_type, target_id):
+    """Stan sprzętu/usterki w wybranej chwili oraz różnice między dwiema datami (QUARTERMASTER/ADMIN).
+
+    ?at=RRRR-MM-DDTGG:MM – chwila (domyślnie teraz), ?compare=... – druga chwila do porównania,
+    ?format=json – odpowiedź JSON zamiast strony.
+    """
+    from datetime import datetime
+    from .db_firestore import get_item_state_at, diff_states, _warsaw_now
+
+    if target_type not in ('sprzet', 'usterka'):
+        flash('Nieznany typ obiektu.', 'danger')
+        return redirect(url_for('views.logs_list'))
+
+    now = _warsaw_now()
+
+    def _parse_moment(value):
+        if not value:
+            return None
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        return moment.replace(tzinfo=now.tzinfo) if moment.tzinfo is None else moment
+
+    at = _parse_moment(request.args.get('at')) or now
+    compare = _parse_moment(request.args.get('compare'))
+
+    state, log = get_item_state_at(target_type, target_id, at)
+    compare_state = compare_log = changes = None
+    if compare is not None:
+        compare_state, compare_log = get_item_state_at(target_type, target_id, compare)
+        changes = diff_states(compare_state, state)
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'target_type': target_type,
+            'target_id': target_id,
+            'at': at.isoformat(),
+            'state': state,
+            'log_id': (log or {}).get('id'),
+            'compare': compare.isoformat() if compare else None,
+            'compare_state': compare_state,
+            'changes': [{'field': f, 'old': old, 'new': new} for f, old, new in changes] if changes is not None else None,
+        })
+
+    return render_template('item_history.html', target_type=target_type, target_id=target_id,
+                           at=at, state=state, log=log, compare=compare, compare_state=compare_state,
+                           compare_log=compare_log, changes=changes)
+
 @views_bp.route('/user/<user_id>')
 @login_required
 def user_profile(user_id):
     """Wyświetla profil użytkownika."""
     from .db_users import get_user_by_uid
-    from .db_firestore import get_logs_by_user
+    from .db_firestore import get_logs_by_user, get_user_stats, expand_logs
     from .achievements_service import get_achievements_defs_map, get_user_achievements_progress, maybe_award_all_for_user
 
     user = get_user_by_uid(user_id)
@@ -1857,7 +1956,7 @@ def user_profile(user_id):
         return redirect(url_for('views.sprzet_list'))
 
     # Pobieramy tylko ostatnie 15 logów dla wydajności profilu
-    logs = get_logs_by_user(user_id, limit=15)
+    logs = expand_logs(get_logs_by_user(user_id, limit=15))
 
     # Ustawiamy czytelną nazwę użytkownika dla logów
     user_name = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip() or user.get('email', user_id)
@@ -1870,8 +1969,9 @@ def user_profile(user_id):
     if feats.get('achievements_enabled'):
         try:
             # Leniwa retro‑ewaluacja: jeśli spełnione progi, przyznaj brakujące odznaki
-            maybe_award_all_for_user(user_id)
-            achievements_progress = get_user_achievements_progress(user_id)
+            stats = get_user_stats(user_id)
+            earned = maybe_award_all_for_user(user_id, stats, user=user)
+            achievements_progress = get_user_achievements_progress(user_id, stats, earned_map=earned)
         except Exception:
             achievements_progress = []
 
@@ -1910,17 +2010,10 @@ def sprzet_zestawienie():
 
     # Filtrowanie po magazynie (opcjonalne)
     if magazyn_id:
-        # Znajdź wszystkie dzieci tego magazynu (rekurencyjnie lub tylko bezpośrednie?)
-        # W tej aplikacji struktura jest zazwyczaj: Magazyn -> Polka/Skrzynia -> Przedmiot
-        # lub Magazyn -> Przedmiot.
-        # Pobierzmy wszystkie przedmioty i przefiltrujmy po parent_id lub lokalizacji.
-        magazyn_children_ids = {magazyn_id}
-        # Dodajmy półki które są w tym magazynie
-        for i in items:
-            if i.get('parent_id') == magazyn_id:
-                magazyn_children_ids.add(i.get('id'))
-
-        items = [i for i in items if i.get('id') == magazyn_id or i.get('parent_id') in magazyn_children_ids]
+        # Cała zawartość magazynu niezależnie od głębokości zagnieżdżenia
+        # (Magazyn -> Półka/Skrzynia -> Przedmiot -> ...).
+        magazyn_subtree = get_hierarchy_index().subtree_ids(magazyn_id)
+        items = [i for i in items if i.get('id') in magazyn_subtree]
 
     summary = {}
 
@@ -2135,11 +2228,8 @@ def export_sprzet(format):
         items = get_all_sprzet()
         
         if magazyn_id:
-            magazyn_children_ids = {magazyn_id}
-            for i in items:
-                if i.get('parent_id') == magazyn_id:
-                    magazyn_children_ids.add(i.get('id'))
-            items = [i for i in items if i.get('id') == magazyn_id or i.get('parent_id') in magazyn_children_ids]
+            magazyn_subtree = get_hierarchy_index().subtree_ids(magazyn_id)
+            items = [i for i in items if i.get('id') in magazyn_subtree]
 
         export_rows = []
         title = "Zestawienie Elementów"
@@ -2324,7 +2414,7 @@ def export_usterki(format):
     oficjalna_ewidencja = request.args.get('oficjalna_ewidencja')
 
     usterki = get_all_usterki()
-    sprzet_items = get_all_sprzet()
+    sprzet_items = get_all_sprzet(fields=USTERKI_SPRZET_FIELDS)
     sprzet_map = {s['id']: s for s in sprzet_items if 'id' in s}
 
     filtered = []
@@ -2376,15 +2466,13 @@ def sprzet_bulk_edit():
         return redirect(url_for('views.sprzet_list'))
 
     # Pobieramy dane wybranych sprzętów, aby wyświetlić podsumowanie/przegląd przed masową edycją.
-    all_sprzet = get_all_sprzet()
-    sprzet_map = {s.get('id'): s for s in all_sprzet if isinstance(s, dict)}
-    sprzet_selected = [sprzet_map[s_id] for s_id in sprzet_ids if s_id in sprzet_map]
+    sprzet_selected = get_items_many(COLLECTION_SPRZET, sprzet_ids)
 
     return_query = (request.form.get('return_query') or '').strip()
     cancel_url = url_for('views.sprzet_list') + (f'?{return_query}' if return_query else '')
 
     # Lista potencjalnych rodziców (magazyny + półki)
-    sprzet_all = [s for s in get_all_sprzet() if s.get('category') in [CATEGORIES['MAGAZYN'], CATEGORIES['POLKA']]]
+    sprzet_all = [s for s in get_all_sprzet(fields=PARENT_PICKER_FIELDS) if s.get('category') in [CATEGORIES['MAGAZYN'], CATEGORIES['POLKA']]]
 
     return render_template(
         'sprzet_bulk_edit.html',
@@ -2434,10 +2522,10 @@ def sprzet_bulk_edit_confirm():
         return_query = (request.form.get('return_query') or '').strip()
         return redirect(url_for('views.sprzet_list') + (f'?{return_query}' if return_query else ''))
 
-    changed = 0
     skipped_missing = 0
     errors = 0
     error_details: list[str] = []
+    ops = []
 
     for sid in sprzet_ids:
         try:
@@ -2456,20 +2544,28 @@ def sprzet_bulk_edit_confirm():
             if not effective_updates:
                 continue
 
-            update_sprzet(sid, **effective_updates)
-
             after_data = dict(before_data)
             after_data.update(effective_updates)
-            add_log(session.get('user_id'), 'bulk_edit', 'sprzet', sid,
-                    before=before_data, after=after_data,
-                    details={'fields': list(effective_updates.keys())})
-            changed += 1
+            ops.append(bulk_op('update', COLLECTION_SPRZET, sid, effective_updates, log={
+                'user_id': session.get('user_id'), 'action': 'bulk_edit', 'target_type': 'sprzet',
+                'before': before_data, 'after': after_data,
+                'details': {'fields': list(effective_updates.keys())},
+            }))
         except Exception as e:
             errors += 1
             error_msg = f"{sid}: {str(e)}"
             error_details.append(error_msg)
             current_app.logger.error(f"Bulk edit error: {error_msg}", exc_info=True)
 
+    # Zmiany i wpisy logu zapisujemy paczkami (WriteBatch) zamiast round-tripu per pozycja
+    done, failed = bulk_write(ops)
+    changed = len(done)
+    for sid, err in failed:
+        errors += 1
+        error_msg = f"{sid}: {err}"
+        error_details.append(error_msg)
+        current_app.logger.error(f"Bulk edit error: {error_msg}")
+
     if changed:
         flash(f'Zapisano zmiany dla {changed} pozycji.', 'success')
     if skipped_missing:
@@ -2501,20 +2597,19 @@ def usterki_bulk_delete():
         flash('Nie wybrano żadnych usterek.', 'warning')
         return redirect(url_for('views.usterki_list'))
 
-    count = 0
-    errors = 0
+    done, failed = bulk_write([
+        bulk_op('delete', COLLECTION_USTERKI, uid, log={
+            'user_id': session.get('user_id'), 'action': 'delete', 'target_type': 'usterka',
+        })
+        for uid in usterka_ids
+    ])
+    count = len(done)
+    errors = len(failed)
     error_details = []
-
-    for uid in usterka_ids:
-        try:
-            delete_item(COLLECTION_USTERKI, uid)
-            add_log(session.get('user_id'), 'delete', 'usterka', uid)
-            count += 1
-        except Exception as e:
-            errors += 1
-            error_msg = f"{uid}: {str(e)}"
-            error_details.append(error_msg)
-            current_app.logger.error(f"Bulk delete usterki error: {error_msg}", exc_info=True)
+    for uid, err in failed:
+        error_msg = f"{uid}: {err}"
+        error_details.append(error_msg)
+        current_app.logger.error(f"Bulk delete usterki error: {error_msg}")
 
     if count:
         flash(f'Pomyślnie usunięto {count} usterek.', 'success')
@@ -2623,52 +2718,74 @@ def _can_edit_list(lst: dict) -> bool:
 
 
 def _resolve_user_ids_from_query(q: str) -> list[str]:
-    from .db_users import get_all_users
-    q = (q or '').strip().casefold()
-    if not q:
-        return []
-    users = get_all_users()
-    out: list[str] = []
-    for u in users:
-        uid = u.get('id')
-        email = (u.get('email') or '').casefold()
-        full_name = f"{(u.get('first_name') or '').strip()} {(u.get('last_name') or '').strip()}".strip().casefold()
-        if q == email or (full_name and q == full_name):
-            out.append(uid)
-    return out
+    from .db_users import get_user_directory
+    return get_user_directory().resolve(q)
+
+
+@views_bp.route('/api/sprzet/search')
+@pin_restricted_required
+def sprzet_search_api():
+    """Podpowiedzi sprzętu (typeahead) z indeksu wyszukiwania.
+
+    Zwraca maks. `limit` (domyślnie 8, najwyżej 20) najlepiej dopasowanych pozycji:
+    id, nazwa, category, magazyn_display.
+    """
+    q = (request.args.get('q') or '').strip()[:TYPEAHEAD_MAX_QUERY]
+    limit = min(max(request.args.get('limit', TYPEAHEAD_DEFAULT_LIMIT, type=int) or TYPEAHEAD_DEFAULT_LIMIT, 1),
+                TYPEAHEAD_MAX_LIMIT)
+    if len(q) < 2:
+        return jsonify({'results': []})
+
+    version = get_sprzet_cache_version()
+    key = (version, q.casefold(), limit)
+    if version is not None:
+        with _typeahead_cache_lock:
+            cached = _typeahead_cache.get(key)
+            if cached is not None:
+                _typeahead_cache.move_to_end(key)
+                return jsonify({'results': cached})
+
+    ids = get_search_index().top(q, n=limit)
+    hierarchy = get_hierarchy_index() if ids else None
+    out = []
+    for item in get_items_many(COLLECTION_SPRZET, ids):
+        magazyn = item.get('magazyn_display')
+        if not magazyn:
+            magazyn = hierarchy.magazyn_display(item['id'])[1] or item.get('lokalizacja') or 'N/A'
+        out.append({
+            'id': item['id'],
+            'nazwa': item.get('nazwa') or '',
+            'category': item.get('category'),
+            'magazyn_display': magazyn,
+        })
+
+    if version is not None:
+        with _typeahead_cache_lock:
+            _typeahead_cache[key] = out
+            while len(_typeahead_cache) > TYPEAHEAD_CACHE_SIZE:
+                _typeahead_cache.popitem(last=False)
+    return jsonify({'results': out})
 
 
 @views_bp.route('/api/users/suggest')
 @login_required
 def users_suggest():
     """Podpowiedzi użytkowników dla udostępniania listy.
-    Zwraca maks. 10 rekordów dopasowanych po fragmencie e‑maila lub Imię Nazwisko (case‑insensitive).
+    Zwraca maks. 10 rekordów dopasowanych po fragmencie e‑maila lub Imię Nazwisko (case‑insensitive),
+    z indeksu katalogu użytkowników; dopasowania od początku są pierwsze.
     """
     q = (request.args.get('q') or '').strip()
     if len(q) < 2:
         return jsonify({
             'results': []
         })
-    ql = q.casefold()
-    from .db_users import get_all_users
-    users = get_all_users() or []
-    out = []
-    for u in users:
-        email = (u.get('email') or '')
-        first = (u.get('first_name') or '').strip()
-        last = (u.get('last_name') or '').strip()
-        full_name = f"{first} {last}".strip()
-        hay_email = email.casefold()
-        hay_full = full_name.casefold()
-        if (ql in hay_email) or (full_name and ql in hay_full):
-            out.append({
-                'id': u.get('id'),
-                'email': email,
-                'full_name': full_name,
-                'role': u.get('role') or 'reporter'
-            })
-        if len(out) >= 10:
-            break
+    from .db_users import get_user_directory, user_full_name
+    out = [{
+        'id': u.get('id'),
+        'email': u.get('email') or '',
+        'full_name': user_full_name(u),
+        'role': u.get('role') or 'reporter'
+    } for u in get_user_directory().suggest(q, 10)]
     return jsonify({'results': out})
 
 
@@ -2706,18 +2823,14 @@ def list_view(list_id):
     ids = set(lst.get('items') or [])
     items = []
     if ids:
-        all_items = get_all_sprzet()
-        items = [i for i in all_items if i.get('id') in ids]
-        # zachowaj kolejność jak w liście
-        order = {sid: idx for idx, sid in enumerate(lst.get('items'))}
-        items.sort(key=lambda it: order.get(it.get('id'), 0))
+        # get_items_many zachowuje kolejność jak w liście
+        items = get_items_many(COLLECTION_SPRZET, lst.get('items'))
 
     # Przygotuj mapę członków (id -> obiekt użytkownika) do wyświetlenia
     members_info = []
     try:
-        from .db_users import get_all_users
-        users = get_all_users() or []
-        users_map = {u.get('id'): u for u in users}
+        from .db_users import get_user_directory
+        users_map = get_user_directory().users
         for mid in (lst.get('members') or []):
             u = users_map.get(mid) or {'id': mid}
             members_info.append({
@@ -0,0 +1,66 @@
+// Podpowiedzi sprzętu (typeahead) dla pól wyszukiwania: /api/sprzet/search?q=
+// Użycie: attachSprzetTypeahead(inputElement, { onPick: item => ... })
+// Podpowiedzi trafiają do <datalist> powiązanego z polem; wybór pozycji (wartość = ID)
+// wywołuje onPick z obiektem {id, nazwa, category, magazyn_display}.
+(() => {
+    'use strict'
+
+    const DEBOUNCE_MS = 150
+    let counter = 0
+
+    window.attachSprzetTypeahead = (input, options = {}) => {
+        if (!input) return
+        const endpoint = options.endpoint || '/api/sprzet/search'
+        const limit = options.limit || 8
+        const list = document.createElement('datalist')
+        list.id = `sprzet-typeahead-${++counter}`
+        input.after(list)
+        input.setAttribute('list', list.id)
+        input.setAttribute('autocomplete', 'off')
+
+        const byId = new Map()
+        let timer = null
+        let controller = null
+        let lastQuery = ''
+
+        const render = results => {
+            byId.clear()
+            list.replaceChildren(...results.map(item => {
+                byId.set(item.id, item)
+                const opt = document.createElement('option')
+                opt.value = item.id
+                opt.label = [item.nazwa, item.magazyn_display].filter(Boolean).join(' — ')
+                return opt
+            }))
+        }
+
+        const fetchSuggestions = async q => {
+            if (controller) controller.abort()
+            controller = new AbortController()
+            try {
+                const resp = await fetch(`${endpoint}?q=${encodeURIComponent(q)}&limit=${limit}`, {
+                    credentials: 'same-origin',
+                    signal: controller.signal,
+                })
+                if (!resp.ok) return
+                const data = await resp.json()
+                if (q === lastQuery) render(data.results || [])
+            } catch (_) { /* przerwane lub offline – zostawiamy poprzednie podpowiedzi */ }
+        }
+
+        input.addEventListener('input', () => {
+            const q = input.value.trim()
+            if (byId.has(q) && options.onPick) {
+                options.onPick(byId.get(q))
+                return
+            }
+            lastQuery = q
+            clearTimeout(timer)
+            if (q.length < 2) {
+                render([])
+                return
+            }
+            timer = setTimeout(() => fetchSuggestions(q), DEBOUNCE_MS)
+        })
+    }
+})()
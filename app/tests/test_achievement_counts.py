@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+
+class _Doc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+def test_build_log_data_denormalizes_category():
+    from src.db_firestore import _build_log_data
+
+    assert _build_log_data('u', 'edit', 'sprzet', 'S1', before={'category': 'namiot'}, after={'category': 'kanadyjka'})['category'] == 'kanadyjka'
+    assert _build_log_data('u', 'edit', 'sprzet', 'S1', before={'category': 'namiot'}, after={'nazwa': 'x'})['category'] == 'namiot'
+    assert _build_log_data('u', 'edit', 'sprzet', 'S1', category='zelastwo')['category'] == 'zelastwo'
+    assert _build_log_data('u', 'delete', 'usterka', 'U1')['category'] is None
+
+
+def test_add_log_increments_all_wildcard_counters():
+    from src import db_firestore
+
+    client = MagicMock()
+    with patch.object(db_firestore, 'get_firestore_client', return_value=client):
+        db_firestore.add_log('u1', 'edit', 'sprzet', 'S1', before={'category': 'namiot'}, after={'category': 'namiot'})
+        db_firestore.flush_logs()
+
+    stats_ref = client.collection.return_value.document.return_value.collection.return_value.document.return_value
+    updates = stats_ref.update.call_args[0][0]
+    assert sorted(updates) == sorted([
+        'logs.`edit|sprzet|namiot`', 'logs.`edit|sprzet|*`', 'logs.`edit|*|namiot`', 'logs.`edit|*|*`',
+        'logs.`*|sprzet|namiot`', 'logs.`*|sprzet|*`', 'logs.`*|*|namiot`', 'logs.`*|*|*`',
+    ])
+
+
+def test_get_user_stats_seeds_missing_document_once():
+    from src import db_firestore
+
+    client = MagicMock()
+    stats_ref = client.collection.return_value.document.return_value.collection.return_value.document.return_value
+    stats_ref.get.return_value = _Doc('counters', None)
+    client.collection.return_value.document.return_value.get.return_value = _Doc('u1', {'email': 'a@b.pl'})
+    client.collection.return_value.where.return_value.select.return_value.stream.return_value = [
+        _Doc('L1', {'action': 'add', 'target_type': 'sprzet', 'after': {'category': 'namiot'}}),
+        _Doc('L2', {'action': 'edit', 'target_type': 'sprzet', 'category': 'namiot'}),
+    ]
+
+    with patch.object(db_firestore, 'get_firestore_client', return_value=client), \
+         patch.object(db_firestore, 'count_items_by_filters', side_effect=[3, 12]) as count:
+        stats = db_firestore.get_user_stats('u1')
+
+    assert stats['reports'] == 3
+    assert stats['loans'] == 12
+    assert count.call_args_list[1][0] == ('wypozyczenia', [('kontakt', '==', 'a@b.pl')])
+    assert db_firestore.get_user_log_count(stats, 'add', 'sprzet', 'namiot') == 1
+    assert db_firestore.get_user_log_count(stats, None, 'sprzet', 'namiot') == 2
+    assert db_firestore.get_user_log_count(stats) == 2
+    stats_ref.create.assert_called_once()
+
+
+def test_achievement_counters_read_stats_document():
+    from src import achievements_service as svc
+
+    stats = {
+        'reports': 5,
+        'loans': 11,
+        'logs': {'edit|sprzet|namiot': 4, 'add|sprzet|*': 2, 'loan|*|*': 9},
+    }
+    with patch.object(svc, 'get_user_stats', return_value=stats):
+        assert svc._count_user_item_edits('u', 'namiot') == 4
+        assert svc._count_user_item_adds('u') == 2
+        assert svc._count_user_logs('u', action='loan') == 9
+        assert svc._get_user_reports_count('u') == 5
+        assert svc._get_user_loans_count('u') == 11
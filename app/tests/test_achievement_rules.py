@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+
+DEFS = {
+    'first_report': {'id': 'first_report', 'enabled': True,
+                     'condition': {'type': 'event_count', 'event': 'report_created', 'threshold': 1}},
+    'five_reports': {'id': 'five_reports', 'enabled': True,
+                     'condition': {'type': 'event_count', 'event': 'report_created', 'threshold': 5}},
+    'ten_reports': {'id': 'ten_reports', 'enabled': False,
+                    'condition': {'type': 'event_count', 'event': 'report_created', 'threshold': 10}},
+    'namiot_edits': {'id': 'namiot_edits', 'enabled': True,
+                     'condition': {'type': 'log_count', 'action': 'edit', 'category': 'namiot', 'threshold': 2}},
+}
+
+USER = {'id': 'u1', 'features': {'achievements_enabled': True}, 'achievements': {'first_report': 'x'}}
+
+
+def test_rule_table_groups_enabled_rules_by_event():
+    from src import achievements_service as svc
+
+    table = svc._RuleTable(DEFS)
+    assert sorted({r.id for r in table.rules('report_created')}) == ['first_report', 'five_reports']
+    assert [r.id for r in table.rules('log')] == ['namiot_edits']
+    assert table.rules('item_added') == []
+    assert 'ten_reports' in table.defs and 'ten_reports' not in table.enabled
+
+
+def test_hooks_compile_once_and_read_user_once():
+    from src import achievements_service as svc
+    from src import db_firestore
+
+    db_firestore.invalidate_achievement_rules()
+    stats = {'reports': 6, 'logs': {'edit|*|namiot': 1}}
+    with patch.object(svc, 'get_achievements_map', return_value=DEFS) as defs, \
+         patch.object(svc, 'get_user_by_uid', return_value=USER) as get_user, \
+         patch.object(svc, 'get_user_stats', return_value=stats) as get_stats, \
+         patch.object(svc, 'add_user_achievement') as award:
+        svc.maybe_award_on_report_created('u1')
+        svc.maybe_award_on_log('u1', 'edit', 'sprzet', 'namiot')
+        # Log innej kategorii nie pasuje do żadnej reguły – bez odczytów
+        svc.maybe_award_on_log('u1', 'edit', 'sprzet', 'kajak')
+
+    assert defs.call_count == 1
+    assert get_user.call_count == 2
+    assert get_stats.call_count == 2
+    award.assert_called_once_with('u1', 'five_reports')
+
+
+def test_set_achievement_def_invalidates_rules():
+    from src import achievements_service as svc
+    from src import db_firestore
+
+    with patch.object(svc, 'get_achievements_map', return_value=DEFS) as defs, \
+         patch.object(db_firestore, 'set_item'):
+        svc.get_achievements_defs_map()
+        svc.get_achievements_defs_map()
+        db_firestore.set_achievement_def('new', {'name': 'Nowe'})
+        svc.get_achievements_defs_map()
+
+    assert defs.call_count == 2
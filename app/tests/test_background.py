@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import threading
+
+
+def test_job_queue_runs_jobs_and_drains_on_shutdown():
+    from src.background import JobQueue
+
+    q = JobQueue(workers=2, maxsize=50, name='test')
+    gate = threading.Event()
+    done = []
+
+    def job(i):
+        gate.wait(5)
+        done.append(i)
+
+    for i in range(10):
+        assert q.submit(job, i) is True
+    assert q.stats()['depth'] >= 8
+
+    gate.set()
+    assert q.drain(timeout=5) is True
+    assert sorted(done) == list(range(10))
+    stats = q.stats()
+    assert stats['depth'] == 0
+    assert stats['processed'] == 10
+
+    # Po zamknięciu kolejki zadania wykonują się synchronicznie
+    assert q.submit(done.append, 'late') is False
+    assert done[-1] == 'late'
+
+
+def test_job_queue_full_or_disabled_runs_inline():
+    from src.background import JobQueue
+
+    started, gate = threading.Event(), threading.Event()
+
+    def blocker():
+        started.set()
+        gate.wait(5)
+
+    q = JobQueue(workers=1, maxsize=1, name='test')
+    q.submit(blocker)
+    assert started.wait(5)
+    ran = []
+    assert q.submit(ran.append, 'queued') is True
+    # Kolejka pełna – zadanie wykonuje się od razu w wywołującym wątku
+    assert q.submit(ran.append, 'inline') is False
+    assert ran == ['inline']
+    gate.set()
+    assert q.drain(timeout=5) is True
+    assert ran == ['inline', 'queued']
+
+    sync = JobQueue(workers=0)
+    assert sync.submit(ran.append, 'sync') is False
+    assert ran[-1] == 'sync'
+    assert sync.submit(lambda: 1 / 0) is False
+    assert sync.stats()['failed'] == 1
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+
+class _Batch:
+    def __init__(self, commits, fail_ids):
+        self.refs = []
+        self.commits = commits
+        self.fail_ids = fail_ids
+
+    def set(self, ref, data):
+        self.refs.append(ref)
+
+    def update(self, ref, data):
+        self.refs.append(ref)
+
+    def delete(self, ref):
+        self.refs.append(ref)
+
+    def commit(self):
+        ids = [r.id for r in self.refs]
+        if any(i in self.fail_ids for i in ids):
+            raise RuntimeError('NOT_FOUND')
+        self.commits.append(ids)
+
+
+def _client(commits, fail_ids=()):
+    client = MagicMock()
+    client.batch.side_effect = lambda: _Batch(commits, set(fail_ids))
+
+    def _document(doc_id=None):
+        ref = MagicMock()
+        ref.id = doc_id or 'LOG'
+        return ref
+
+    client.collection.return_value.document.side_effect = _document
+    return client
+
+
+def test_bulk_write_chunks_ops_with_their_logs():
+    from src import db_firestore
+
+    commits = []
+    ops = [
+        db_firestore.bulk_op('update', db_firestore.COLLECTION_USTERKI, f'u{i}', {'status': 'naprawiona'},
+                             log={'user_id': 'x', 'action': 'bulk_edit', 'target_type': 'usterka'})
+        for i in range(300)
+    ]
+    with patch.object(db_firestore, 'get_firestore_client', return_value=_client(commits)):
+        done, failed = db_firestore.bulk_write(ops)
+
+    assert failed == []
+    assert len(done) == 300
+    # 300 zmian + 300 logów = 600 zapisów -> dwie paczki, każda <= 500 i bez rozdzielania pary zmiana/log
+    assert [len(c) for c in commits] == [500, 100]
+
+
+def test_bulk_write_reports_failing_items():
+    from src import db_firestore
+
+    commits = []
+    ops = [db_firestore.bulk_op('delete', db_firestore.COLLECTION_USTERKI, i) for i in ('a', 'b', 'c')]
+    with patch.object(db_firestore, 'get_firestore_client', return_value=_client(commits, fail_ids={'b'})):
+        done, failed = db_firestore.bulk_write(ops)
+
+    assert done == ['a', 'c']
+    assert failed == [('b', 'NOT_FOUND')]
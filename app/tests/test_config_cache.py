@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+
+def _client_with_config(data):
+    client = MagicMock()
+    doc = MagicMock()
+    doc.exists = True
+    doc.to_dict.side_effect = lambda: dict(data)
+    doc_ref = client.collection.return_value.document.return_value
+    doc_ref.get.return_value = doc
+    return client, doc_ref
+
+
+def test_get_config_is_cached_and_invalidated_on_write():
+    from src import db_firestore
+
+    db_firestore.invalidate_config_cache()
+    client, doc_ref = _client_with_config({'magazyny_names': ['A', 'B'], 'max_photo_size_mb': 5})
+
+    with patch('src.get_firestore_client', return_value=client):
+        assert db_firestore.get_config()['max_photo_size_mb'] == 5
+        assert db_firestore.get_list_setting('magazyny_names') == ['A', 'B']
+        assert db_firestore.get_config()['magazyny_names'] == ['A', 'B']
+        assert doc_ref.get.call_count == 1
+
+        # Kopia – modyfikacja wyniku nie psuje cache
+        db_firestore.get_config()['magazyny_names'].append('X')
+        assert db_firestore.get_config()['magazyny_names'] == ['A', 'B']
+
+        db_firestore.update_list_setting('magazyny_names', ['C'])
+        db_firestore.get_config()
+        assert doc_ref.get.call_count == 2
+
+        db_firestore.get_config(fresh=True)
+        assert doc_ref.get.call_count == 3
+
+    db_firestore.invalidate_config_cache()
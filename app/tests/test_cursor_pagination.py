@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+
+
+@pytest.fixture
+def client():
+    from app import create_app
+    app = create_app()
+    app.config.update({"TESTING": True, "WTF_CSRF_ENABLED": False})
+    return app.test_client()
+
+
+def test_page_token_roundtrip():
+    from src.db_firestore import make_page_token, _decode_page_token
+
+    token = make_page_token([{'id': 'a'}, {'id': 'LOG_ż/1'}])
+    assert token and 'LOG' not in token
+    assert _decode_page_token(token) == 'LOG_ż/1'
+    assert make_page_token([]) is None
+    assert _decode_page_token('%%%') is None
+
+
+def test_usterki_list_uses_cursor_instead_of_offset(client):
+    usterki_data = [{'id': f'u{i:02d}', 'sprzet_id': 's1', 'status': 'oczekuje'} for i in range(51)]
+
+    with patch('src.views.get_all_usterki', return_value=usterki_data) as mock_usterki, \
+         patch('src.views.get_all_sprzet', return_value=[]):
+        with client.session_transaction() as sess:
+            sess['user_id'] = 'user123'
+
+        response = client.get('/usterki')
+        assert response.status_code == 200
+        html = response.data.decode('utf-8')
+
+        mock_usterki.assert_any_call(limit=51, page_token=None)
+        assert 'u49' in html and 'u50' not in html
+
+        from src.db_firestore import make_page_token
+        token = make_page_token(usterki_data[:50])
+        assert f'page_token={token}' in html
+
+        client.get(f'/usterki?page=2&page_token={token}')
+        mock_usterki.assert_any_call(limit=51, page_token=token)
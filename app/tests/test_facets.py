@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from src.facets import FacetIndex
+
+
+def test_facet_values_and_counts_per_category():
+    idx = FacetIndex([
+        {'id': 'Z1', 'category': 'zelastwo', 'ilosc': 4, 'lokalizacja': 'Esperanto'},
+        {'id': 'Z2', 'category': 'zelastwo', 'ilosc': '4 ', 'lokalizacja': 'Obozowa'},
+        {'id': 'Z3', 'category': 'zelastwo', 'ilosc': 2},
+        {'id': 'K1', 'category': 'kanadyjki', 'ilosc': 1, 'material': 'aluminiowe'},
+        {'id': 'N1', 'category': 'namiot', 'typ': 'NS', 'oficjalna_ewidencja': 'Tak'},
+    ], version=1)
+
+    assert idx.values('lokalizacja') == ['Esperanto', 'Obozowa']
+    assert idx.top('ilosc', category='zelastwo') == ['4', '2']
+    assert idx.values('ilosc') == ['1', '2', '4']
+    assert idx.values('material', category='kanadyjki') == ['aluminiowe']
+
+
+def test_facet_incremental_updates():
+    idx = FacetIndex([{'id': 'A', 'category': 'namiot', 'typ': 'NS'}], version=1)
+
+    idx.apply('B', {'id': 'B', 'category': 'namiot', 'typ': '10-tka'}, 2)
+    idx.apply('A', {'id': 'A', 'category': 'namiot', 'typ': '10-tka'}, 3)
+    assert idx.counts('typ', category='namiot') == {'10-tka': 2}
+
+    idx.apply('B', None, 4)
+    assert idx.counts('typ') == {'10-tka': 1}
+    assert idx.version == 4
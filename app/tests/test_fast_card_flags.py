@@ -79,3 +79,31 @@ def test_sprzet_list_sets_fast_card_flags_in_global_search_view():
 
     assert items[0].get('fast_card') is True
     assert items[0].get('has_children') is False
+
+
+def test_sprzet_list_has_children_uses_fixed_number_of_queries():
+    # Folder z wieloma namiotami nie może generować zapytania o dzieci per element.
+    from src import views
+    from src.hierarchy import HierarchyIndex
+
+    C = views.CATEGORIES
+    items = [{'id': f'N{i}', 'category': C['NAMIOT'], 'parent_id': 'PARENT'} for i in range(50)]
+    index = HierarchyIndex(items + [{'id': 'X', 'category': C['PRZEDMIOT'], 'parent_id': 'N7'}])
+
+    with patch('src.views.get_items_by_parent', return_value=items) as mock_children, \
+         patch('src.views.get_items_by_filters', return_value=items), \
+         patch('src.views.get_all_sprzet', return_value=[]), \
+         patch('src.views.get_hierarchy_index', return_value=index), \
+         patch('src.views.get_sprzet_item', return_value=None):
+        from app import create_app
+
+        app = create_app()
+        with app.test_request_context('/sprzety?parent_id=PARENT'):
+            from flask import session
+
+            session['user_role'] = 'user'
+            session['user_id'] = 'u'
+            _ = views.sprzet_list()
+
+    assert mock_children.call_count <= 1
+    assert [i['id'] for i in items if i.get('has_children')] == ['N7']
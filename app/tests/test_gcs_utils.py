@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+
+def test_storage_client_is_reused_and_rebuilt_after_fork():
+    from src import gcs_utils
+
+    gcs_utils.reset_storage_client()
+    with patch.object(gcs_utils, '_build_storage_client', side_effect=lambda: MagicMock()) as build, \
+         patch.object(gcs_utils, 'GOOGLE_CLOUD_STORAGE_BUCKET_NAME', 'bucket'), \
+         patch('src.gcs_utils.os.getpid', return_value=100):
+        client = gcs_utils.get_storage_client()
+        bucket = gcs_utils.get_storage_bucket()
+        assert gcs_utils.get_storage_client() is client
+        assert gcs_utils.get_storage_bucket() is bucket
+        client.bucket.assert_called_once_with('bucket')
+        assert build.call_count == 1
+
+    # Inny PID = proces potomny po fork(): nowy klient i bucket
+    with patch.object(gcs_utils, '_build_storage_client', side_effect=lambda: MagicMock()) as build, \
+         patch.object(gcs_utils, 'GOOGLE_CLOUD_STORAGE_BUCKET_NAME', 'bucket'), \
+         patch('src.gcs_utils.os.getpid', return_value=101):
+        assert gcs_utils.get_storage_client() is not client
+        assert gcs_utils.get_storage_bucket() is not bucket
+        assert build.call_count == 1
+    gcs_utils.reset_storage_client()
+
+
+def test_build_storage_client_mounts_pool_adapter():
+    from src import gcs_utils
+
+    fake = MagicMock()
+    with patch.object(gcs_utils.storage, 'Client', return_value=fake):
+        assert gcs_utils._build_storage_client() is fake
+    prefix, adapter = fake._http.mount.call_args.args
+    assert prefix == 'https://'
+    assert adapter._pool_maxsize == gcs_utils.GCS_HTTP_POOL_SIZE
+
+
+def test_signed_urls_are_reused_until_close_to_expiry():
+    from src import gcs_utils
+
+    gcs_utils.invalidate_signed_url_cache()
+    bucket = MagicMock()
+    counter = iter(range(100))
+    bucket.blob.side_effect = lambda name: MagicMock(
+        generate_signed_url=MagicMock(side_effect=lambda **kw: f"https://storage.googleapis.com/b/{name}?sig={next(counter)}"))
+    with patch.object(gcs_utils, 'GOOGLE_CLOUD_STORAGE_BUCKET_NAME', 'b'), \
+         patch.object(gcs_utils, 'get_storage_bucket', return_value=bucket), \
+         patch.object(gcs_utils.time, 'time', return_value=1000.0) as now:
+        first = gcs_utils.generate_signed_url('sprzet/NS01/a.png')
+        assert gcs_utils.refresh_urls([first, '', 'https://example.com/x.png']) == [first, 'https://example.com/x.png']
+        assert bucket.blob.call_count == 1
+
+        # Poniżej zapasu ważności – podpis od nowa, w jednym przebiegu tylko brakujące
+        now.return_value = 1000.0 + (gcs_utils.SIGNED_URL_TTL_MINUTES - gcs_utils.SIGNED_URL_MIN_REMAINING_MINUTES) * 60
+        urls = gcs_utils.generate_signed_urls(['sprzet/NS01/a.png', 'sprzet/NS01/b.png', 'sprzet/NS01/b.png'])
+        assert urls[0] != first and urls[1] == urls[2]
+        assert bucket.blob.call_count == 3
+
+        gcs_utils.forget_signed_url('sprzet/NS01/b.png')
+        assert gcs_utils.generate_signed_url('sprzet/NS01/b.png') != urls[1]
+    gcs_utils.invalidate_signed_url_cache()
+
+
+def test_large_uploads_are_chunked():
+    from io import BytesIO
+    from src import gcs_utils
+
+    bucket = MagicMock()
+    with patch.object(gcs_utils, 'get_storage_bucket', return_value=bucket), \
+         patch.object(gcs_utils, 'generate_signed_url', return_value='url'), \
+         patch.object(gcs_utils, 'GCS_RESUMABLE_THRESHOLD', 10):
+        gcs_utils.upload_blob_to_gcs('small.png', BytesIO(b'12345'), 'image/png')
+        gcs_utils.upload_blob_to_gcs('big.png', BytesIO(b'x' * 11), 'image/png')
+
+    assert bucket.blob.call_args_list[0].kwargs['chunk_size'] is None
+    assert bucket.blob.call_args_list[1].kwargs['chunk_size'] == gcs_utils.GCS_UPLOAD_CHUNK_SIZE
+    assert gcs_utils.GCS_UPLOAD_CHUNK_SIZE % (256 * 1024) == 0
+    assert bucket.blob.return_value.upload_from_file.call_args.kwargs['size'] == 11
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+
+class _Doc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+def _client(store, calls):
+    client = MagicMock()
+
+    def _document(doc_id):
+        ref = MagicMock()
+        ref.id = doc_id
+        return ref
+
+    client.collection.return_value.document.side_effect = _document
+
+    def _get_all(refs):
+        calls.append([r.id for r in refs])
+        # Firestore nie gwarantuje kolejności odpowiedzi batch-get
+        return [_Doc(r.id, store.get(r.id)) for r in reversed(refs)]
+
+    client.get_all.side_effect = _get_all
+    return client
+
+
+def test_get_items_many_preserves_order_and_chunks():
+    from src import db_firestore
+
+    store = {f'u{i:03d}': {'status': 'oczekuje'} for i in range(150)}
+    ids = ['u120', 'u005', 'missing', 'u005'] + [f'u{i:03d}' for i in range(150)]
+    calls = []
+
+    with patch.object(db_firestore, 'get_firestore_client', return_value=_client(store, calls)):
+        result = db_firestore.get_items_many(db_firestore.COLLECTION_USTERKI, ids)
+
+    assert [r['id'] for r in result][:2] == ['u120', 'u005']
+    assert len(result) == 150
+    assert [len(c) for c in calls] == [100, 51]
+
+
+def test_loans_list_fetches_items_in_one_call():
+    from src import views
+
+    loans = [{'id': 'L1', 'item_id': 'S2'}, {'id': 'L2', 'item_id': 'S1'}]
+    with patch('src.views.get_active_loans', return_value=loans), \
+         patch('src.views.get_items_many', return_value=[{'id': 'S1', 'nazwa': 'Jeden'}, {'id': 'S2', 'nazwa': 'Dwa'}]) as many, \
+         patch('src.views.get_sprzet_item') as single:
+        from app import create_app
+
+        app = create_app()
+        with app.test_request_context('/loans'):
+            from flask import session
+
+            session['user_id'] = 'u'
+            session['user_role'] = 'quartermaster'
+            views.loans_list()
+
+    many.assert_called_once()
+    single.assert_not_called()
+    assert loans[0]['item']['nazwa'] == 'Dwa'
+    assert loans[1]['item']['nazwa'] == 'Jeden'
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from src.hierarchy import HierarchyIndex
+
+
+def _items():
+    return [
+        {'id': 'MAG_A', 'category': 'magazyn', 'nazwa': 'Magazyn A'},
+        {'id': 'P1', 'category': 'polka_skrzynia', 'parent_id': 'MAG_A'},
+        {'id': 'S1', 'category': 'polka_skrzynia', 'parent_id': 'P1'},
+        {'id': 'X', 'category': 'przedmiot', 'parent_id': 'S1'},
+        {'id': 'Y', 'category': 'przedmiot', 'parent_id': 'MAG_A'},
+        {'id': 'LOOSE', 'category': 'przedmiot'},
+        # cykl z błędnych danych nie może zawiesić wyszukiwania
+        {'id': 'C1', 'category': 'przedmiot', 'parent_id': 'C2'},
+        {'id': 'C2', 'category': 'przedmiot', 'parent_id': 'C1'},
+    ]
+
+
+def test_lookups_follow_full_depth():
+    idx = HierarchyIndex(_items())
+
+    assert idx.children_of('MAG_A') == ['P1', 'Y']
+    assert idx.ancestors('X') == ('S1', 'P1', 'MAG_A')
+    assert idx.magazyn_display('X') == ('MAG_A', 'Magazyn A')
+    assert idx.nearest_magazyn('LOOSE') is None
+    assert idx.subtree_ids('MAG_A') == {'MAG_A', 'P1', 'S1', 'X', 'Y'}
+    assert idx.in_subtree('X', 'MAG_A')
+    assert not idx.in_subtree('LOOSE', 'MAG_A')
+    assert idx.ids_with_children >= {'MAG_A', 'P1', 'S1'}
+    assert idx.nearest_magazyn('C1') is None
+
+
+def test_incremental_apply_moves_and_removes():
+    idx = HierarchyIndex(_items(), version=1)
+    assert idx.nearest_magazyn('X') == 'MAG_A'
+
+    idx.apply('MAG_B', {'id': 'MAG_B', 'category': 'magazyn', 'nazwa': 'B'}, 2)
+    idx.apply('S1', {'id': 'S1', 'category': 'polka_skrzynia', 'parent_id': 'MAG_B'}, 3)
+
+    assert idx.version == 3
+    assert idx.magazyn_display('X') == ('MAG_B', 'B')
+    assert idx.subtree_ids('MAG_A') == {'MAG_A', 'P1', 'Y'}
+    assert not idx.has_children('P1')
+
+    idx.apply('X', None, 4)
+    assert 'X' not in idx
+    assert not idx.has_children('S1')
@@ -226,8 +226,7 @@ def test_oficjalna_ewidencja_default_value(client):
 def test_sprzet_bulk_edit_oficjalna_ewidencja(client):
     from unittest.mock import patch
     with patch('src.views.get_sprzet_item') as mock_get, \
-         patch('src.views.update_sprzet') as mock_update, \
-         patch('src.views.add_log') as mock_log, \
+         patch('src.views.bulk_write', return_value=(['item1', 'item2'], [])) as mock_bulk, \
          patch('src.views.get_firestore_client') as mock_db:
         
         # Mock two items
@@ -250,17 +249,19 @@ def test_sprzet_bulk_edit_oficjalna_ewidencja(client):
         response = client.post('/sprzet/bulk-edit/confirm', data=data, follow_redirects=True)
         
         assert response.status_code == 200
-        assert mock_update.call_count == 2
+        assert mock_bulk.call_count == 1
+        ops = mock_bulk.call_args[0][0]
+        assert len(ops) == 2
         
-        # Check first call
-        args, kwargs = mock_update.call_args_list[0]
-        assert args[0] == 'item1'
-        assert kwargs['oficjalna_ewidencja'] == 'Tak'
+        # Check first op
+        assert ops[0]['action'] == 'update'
+        assert ops[0]['id'] == 'item1'
+        assert ops[0]['data']['oficjalna_ewidencja'] == 'Tak'
+        assert ops[0]['log']['action'] == 'bulk_edit'
         
-        # Check second call
-        args, kwargs = mock_update.call_args_list[1]
-        assert args[0] == 'item2'
-        assert kwargs['oficjalna_ewidencja'] == 'Tak'
+        # Check second op
+        assert ops[1]['id'] == 'item2'
+        assert ops[1]['data']['oficjalna_ewidencja'] == 'Tak'
 
 def test_usterki_oficjalna_ewidencja_filtering(client):
     from unittest.mock import patch
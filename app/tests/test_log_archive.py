@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+
+class _Doc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = True
+        self.reference = MagicMock(name=f'ref-{doc_id}')
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Blob:
+    def __init__(self, name, store):
+        self.name = name
+        self._store = store
+
+    def upload_from_file(self, buf, content_type=None, rewind=False):
+        self._store[self.name] = buf.read()
+
+    def open(self, mode='rb'):
+        return io.BytesIO(self._store[self.name])
+
+
+class _Bucket:
+    def __init__(self):
+        self.store = {}
+
+    def blob(self, name):
+        return _Blob(name, self.store)
+
+    def list_blobs(self, prefix=''):
+        return [_Blob(name, self.store) for name in self.store if name.startswith(prefix)]
+
+
+def _read_lines(data: bytes) -> list:
+    return [json.loads(line) for line in gzip.decompress(data).decode('utf-8').splitlines()]
+
+
+def test_archive_logs_partitions_by_day_and_rebases_hot_chain():
+    from src import log_archive
+
+    tz = log_archive._warsaw_now().tzinfo
+    day1 = datetime(2024, 3, 1, 10, 0, tzinfo=tz)
+    day2 = datetime(2024, 3, 2, 9, 0, tzinfo=tz)
+    old = [
+        _Doc('L1', {'action': 'add', 'target_type': 'sprzet', 'target_id': 'S1', 'after': {'a': 1, 'b': 1}, 'timestamp': day1}),
+        _Doc('L2', {'action': 'edit', 'target_type': 'sprzet', 'target_id': 'S1', 'diff': True,
+                    'before': {'a': 1}, 'after': {'a': 2}, 'timestamp': day1 + timedelta(hours=1)}),
+        _Doc('L3', {'action': 'loan', 'target_type': 'sprzet', 'target_id': 'S1', 'after': {'kontakt': 'ó'}, 'timestamp': day2}),
+    ]
+    hot = _Doc('L4', {'action': 'edit', 'target_type': 'sprzet', 'target_id': 'S1', 'diff': True,
+                      'before': {'b': 1}, 'after': {'b': 7}})
+    client = MagicMock()
+    client.collection.return_value.where.return_value.order_by.return_value.limit.return_value.stream.return_value = old
+    client.collection.return_value.where.return_value.where.return_value.order_by.return_value.stream.return_value = [hot]
+    bucket = _Bucket()
+
+    with patch.object(log_archive, 'get_firestore_client', return_value=client), \
+         patch.object(log_archive, '_bucket', return_value=bucket), \
+         patch.object(log_archive, 'flush_logs'):
+        result = log_archive.archive_logs(older_than_days=365)
+
+    assert result['archived'] == 3 and result['rebased'] == 1
+    names = sorted(bucket.store)
+    assert [n.rsplit('/', 1)[0] for n in names] == ['archive/logs/2024/03/01', 'archive/logs/2024/03/02']
+    first_day = _read_lines(bucket.store[names[0]])
+    # Wpis różnicowy trafia do archiwum jako pełny stan
+    assert first_day[1]['id'] == 'L2' and 'diff' not in first_day[1]
+    assert first_day[1]['after'] == {'a': 2, 'b': 1}
+    assert first_day[0]['timestamp']['__type__'] == 'datetime'
+    # Najstarszy gorący wpis staje się checkpointem
+    update = hot.reference.update.call_args[0][0]
+    assert update['before'] == {'a': 2, 'b': 1} and update['after'] == {'a': 2, 'b': 7}
+    deleted = [c[0][0] for c in client.batch.return_value.delete.call_args_list]
+    assert deleted == [d.reference for d in old]
+
+
+def test_archive_logs_dry_run_writes_nothing():
+    from src import log_archive
+
+    client = MagicMock()
+    client.collection.return_value.where.return_value.order_by.return_value.limit.return_value.stream.return_value = [
+        _Doc('L1', {'action': 'loan', 'target_type': 'sprzet', 'target_id': 'S1', 'timestamp': datetime(2024, 1, 1)}),
+    ]
+    with patch.object(log_archive, 'get_firestore_client', return_value=client), \
+         patch.object(log_archive, '_bucket') as bucket, \
+         patch.object(log_archive, 'flush_logs'):
+        result = log_archive.archive_logs(older_than_days=30, dry_run=True)
+
+    assert result['archived'] == 1 and result['files'] == []
+    bucket.assert_not_called()
+    client.batch.assert_not_called()
+
+
+def test_search_archive_filters_and_returns_newest_first():
+    from src import log_archive
+    from scripts.firestore_export import firestore_to_jsonable
+
+    tz = log_archive._warsaw_now().tzinfo
+    bucket = _Bucket()
+    rows = [
+        {'id': 'L1', 'action': 'edit', 'target_id': 'S1', 'user_id': 'u', 'timestamp': datetime(2024, 3, 1, 10, 0, tzinfo=tz)},
+        {'id': 'L2', 'action': 'edit', 'target_id': 'S2', 'user_id': 'u', 'timestamp': datetime(2024, 3, 1, 11, 0, tzinfo=tz)},
+        {'id': 'L3', 'action': 'delete', 'target_id': 'S1', 'user_id': 'u', 'timestamp': datetime(2024, 3, 1, 12, 0, tzinfo=tz)},
+    ]
+    payload = '\n'.join(json.dumps(firestore_to_jsonable(r)) for r in rows).encode('utf-8')
+    bucket.store['archive/logs/2024/03/01/logs-1.jsonl.gz'] = gzip.compress(payload)
+
+    with patch.object(log_archive, '_bucket', return_value=bucket):
+        found = log_archive.search_archive(date(2024, 2, 28), date(2024, 3, 2), target_id='S1')
+
+    assert [log['id'] for log in found] == ['L3', 'L1']
+    assert found[1]['timestamp'] == '2024-03-01 10:00'
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+
+def _log(log_id, data):
+    return {'id': log_id, **data}
+
+
+def test_build_log_data_writes_diffs_between_checkpoints():
+    from src import db_firestore
+
+    db_firestore._log_chain_counts.clear()
+    with patch.object(db_firestore, 'LOG_CHECKPOINT_EVERY', 3):
+        first = db_firestore._build_log_data('u', 'edit', 'sprzet', 'S1', before={'a': 1, 'b': 1}, after={'a': 2})
+        second = db_firestore._build_log_data('u', 'edit', 'sprzet', 'S1', before={'a': 2, 'b': 1}, after={'b': 5})
+        third = db_firestore._build_log_data('u', 'import', 'sprzet', 'S1', before={'a': 2, 'b': 5}, after={'a': 2, 'c': 1})
+        fourth = db_firestore._build_log_data('u', 'edit', 'sprzet', 'S1', before={'a': 2, 'c': 1}, after={'c': 2})
+
+    # Pierwszy wpis obiektu w workerze = checkpoint z pełnym (scalonym) stanem po zmianie
+    assert 'diff' not in first and first['after'] == {'a': 2, 'b': 1}
+    assert second['diff'] and second['before'] == {'b': 1} and second['after'] == {'b': 5}
+    assert third['diff'] and third['before'] == {'b': 5} and third['after'] == {'c': 1}
+    assert 'diff' not in fourth and fourth['after'] == {'a': 2, 'c': 2}
+
+
+def test_delete_breaks_chain_and_non_state_logs_are_untouched():
+    from src import db_firestore
+
+    db_firestore._log_chain_counts.clear()
+    db_firestore._build_log_data('u', 'edit', 'sprzet', 'S2', before={'a': 1}, after={'a': 2})
+    db_firestore._build_log_data('u', 'delete', 'sprzet', 'S2')
+    again = db_firestore._build_log_data('u', 'edit', 'sprzet', 'S2', before={'a': 1}, after={'a': 3})
+    loan = db_firestore._build_log_data('u', 'loan', 'sprzet', 'S2', after={'kontakt': 'x'})
+
+    assert 'diff' not in again
+    assert 'diff' not in loan and loan['after'] == {'kontakt': 'x'}
+
+
+def test_expand_logs_reconstructs_full_states():
+    from src import db_firestore
+
+    db_firestore.invalidate_log_state_cache()
+    chain = [
+        _log('L1', {'action': 'add', 'target_type': 'sprzet', 'target_id': 'S1', 'after': {'a': 1, 'b': 1}}),
+        _log('L2', {'action': 'edit', 'target_type': 'sprzet', 'target_id': 'S1', 'diff': True,
+                    'before': {'a': 1}, 'after': {'a': 2}}),
+        _log('L3', {'action': 'loan', 'target_type': 'sprzet', 'target_id': 'S1', 'after': {'kontakt': 'x'}}),
+        _log('L4', {'action': 'import', 'target_type': 'sprzet', 'target_id': 'S1', 'diff': True,
+                    'before': {'b': 1}, 'after': {'c': 3}}),
+    ]
+    listed = [dict(chain[3]), dict(chain[1])]
+    with patch.object(db_firestore, '_load_log_chain', return_value=chain) as load:
+        db_firestore.expand_logs(listed)
+
+    load.assert_called_once_with('S1', 'L4', {'L2', 'L4'})
+    assert listed[0]['before'] == {'a': 2, 'b': 1} and listed[0]['after'] == {'a': 2, 'c': 3}
+    assert listed[1]['before'] == {'a': 1, 'b': 1} and listed[1]['after'] == {'a': 2, 'b': 1}
+
+
+def test_restore_item_uses_reconstructed_before():
+    from src import db_firestore
+
+    db_firestore.invalidate_log_state_cache()
+    log = _log('L2', {'action': 'edit', 'target_type': 'sprzet', 'target_id': 'S1', 'diff': True,
+                      'before': {'a': 1}, 'after': {'a': 2}})
+    chain = [
+        _log('L1', {'action': 'add', 'target_type': 'sprzet', 'target_id': 'S1', 'after': {'a': 1, 'b': 1}}),
+        dict(log),
+    ]
+    with patch.object(db_firestore, 'get_log', return_value=log), \
+         patch.object(db_firestore, '_load_log_chain', return_value=chain), \
+         patch.object(db_firestore, 'get_item', return_value={'id': 'S1', 'a': 2, 'b': 1}), \
+         patch.object(db_firestore, 'set_item') as set_item, \
+         patch.object(db_firestore, 'add_log'):
+        ok, _ = db_firestore.restore_item('L2', 'u')
+
+    assert ok
+    set_item.assert_called_once_with('sprzet', 'S1', {'a': 1, 'b': 1})
+
+
+def test_expand_logs_caches_reconstructed_states():
+    from src import db_firestore
+
+    db_firestore.invalidate_log_state_cache()
+    chain = [
+        _log('L1', {'action': 'add', 'target_type': 'sprzet', 'target_id': 'S1', 'after': {'a': 1}}),
+        _log('L2', {'action': 'edit', 'target_type': 'sprzet', 'target_id': 'S1', 'diff': True,
+                    'before': {'a': 1}, 'after': {'a': 2}}),
+    ]
+    with patch.object(db_firestore, '_load_log_chain', return_value=chain) as load:
+        db_firestore.expand_logs([dict(chain[1])])
+        again = db_firestore.expand_logs([dict(chain[1])])
+
+    assert load.call_count == 1
+    assert again[0]['after'] == {'a': 2} and 'diff' not in again[0]
+
+
+def test_get_item_state_at_pages_until_state_log():
+    from src import db_firestore
+
+    db_firestore.invalidate_log_state_cache()
+    page1 = [_log(f'N{i}', {'action': 'loan', 'target_type': 'sprzet', 'target_id': 'S1'}) for i in range(3)]
+    page2 = [
+        _log('L3', {'action': 'edit', 'target_type': 'usterka', 'target_id': 'S1', 'after': {'x': 1}}),
+        _log('L2', {'action': 'edit', 'target_type': 'sprzet', 'target_id': 'S1', 'after': {'a': 2}}),
+    ]
+    with patch.object(db_firestore, 'LOG_HISTORY_PAGE', 3), \
+         patch.object(db_firestore, 'get_logs_by_target', side_effect=[page1, page2]) as get_logs:
+        state, log = db_firestore.get_item_state_at('sprzet', 'S1', 'AT')
+
+    assert state == {'a': 2} and log['id'] == 'L2'
+    assert get_logs.call_args_list[1][1]['until'] == 'AT'
+    assert get_logs.call_args_list[1][1]['page_token'] == db_firestore.make_page_token(page1)
+
+
+def test_diff_states_lists_changed_fields():
+    from src.db_firestore import diff_states
+
+    assert diff_states({'a': 1, 'b': 2}, {'a': 1, 'b': 3, 'c': 4}) == [('b', 2, 3), ('c', None, 4)]
+    assert diff_states(None, {'a': 1}) == [('a', None, 1)]
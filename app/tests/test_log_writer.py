@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+
+def _client(commits, adds):
+    client = MagicMock()
+
+    class _Batch:
+        def __init__(self):
+            self.n = 0
+
+        def set(self, ref, data):
+            self.n += 1
+
+        def commit(self):
+            commits.append(self.n)
+
+    client.batch.side_effect = _Batch
+    client.collection.return_value.add.side_effect = lambda data: adds.append(data)
+    return client
+
+
+def test_log_writer_batches_buffered_entries():
+    from src import db_firestore
+
+    writer = db_firestore._LogWriter()
+    writer.max_size = 3
+    writer.interval = 60  # tylko flush rozmiarem/ręczny
+    commits, adds = [], []
+    with patch.object(db_firestore, 'get_firestore_client', return_value=_client(commits, adds)), \
+         patch.object(db_firestore, '_record_log_stats'):
+        for i in range(7):
+            writer.write({'user_id': 'u', 'n': i})
+        writer.close(timeout=5)
+
+    assert sum(commits) + len(adds) == 7
+    assert all(n <= 3 for n in commits)
+    assert writer.pending() == 0
+
+
+def test_log_writer_sync_mode_writes_immediately():
+    from src import db_firestore
+
+    writer = db_firestore._LogWriter()
+    writer.sync = True
+    commits, adds = [], []
+    with patch.object(db_firestore, 'get_firestore_client', return_value=_client(commits, adds)), \
+         patch.object(db_firestore, '_record_log_stats') as stats:
+        writer.write({'user_id': 'u', 'action': 'edit'})
+        assert adds == [{'user_id': 'u', 'action': 'edit'}]
+        stats.assert_called_once()
+    assert writer._thread is None
+
+
+def test_log_writer_keeps_entries_when_flush_fails():
+    from src import db_firestore
+
+    writer = db_firestore._LogWriter()
+    writer.interval = 60
+    client = MagicMock()
+    client.collection.return_value.add.side_effect = RuntimeError('unavailable')
+    with patch.object(db_firestore, 'get_firestore_client', return_value=client):
+        writer.write({'user_id': 'u'})
+        assert writer.flush() == 0
+        assert writer.pending() == 1
+        writer._buffer.clear()
+        writer.close(timeout=5)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import threading
+import time
+from io import BytesIO
+from unittest.mock import patch
+
+from PIL import Image
+
+
+class _File:
+    def __init__(self, name, data=b'', mimetype='image/png'):
+        self.filename = name
+        self.stream = BytesIO(data)
+        self.mimetype = mimetype
+
+
+def _png(width, height=10):
+    buf = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def test_uploads_run_concurrently_and_keep_order():
+    from src import views
+
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_upload(blob_name, stream, mime):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05 if blob_name.endswith('00_1.webp') else 0.01)
+        with lock:
+            running[0] -= 1
+        return f'url:{blob_name}'
+
+    files = [_File(f'p{i}.png', _png(20)) for i in range(4)]
+    with patch.object(views, 'get_config', return_value={'max_photo_width': 10}), \
+         patch.object(views, 'upload_blob_to_gcs', side_effect=fake_upload), \
+         patch.object(views.time, 'time', return_value=1):
+        urls, err = views.process_uploads(files, 'usterki', 'U1')
+
+    assert err is None
+    assert urls == [f'url:usterki/U1/U1_foto{i:02d}_1.webp' for i in range(4)]
+    assert peak[0] > 1
+    # Szersze niż max_photo_width – przeskalowane
+    assert Image.open(files[0].stream).width == 10
+
+
+def test_validation_errors_stop_before_any_upload():
+    from src import views
+
+    files = [_File('a.png', _png(5)), _File('b.txt', b'x', mimetype='text/plain')]
+    with patch.object(views, 'get_config', return_value={}), \
+         patch.object(views, 'upload_blob_to_gcs') as upload:
+        assert views.process_uploads(files, 'sprzet', 'NS01') == ([], 'Nieobsługiwany typ pliku: b.txt')
+    upload.assert_not_called()
+
+
+def test_first_failing_file_in_order_wins():
+    from src import views
+
+    files = [_File('a.png', _png(5)), _File('broken.png', b'not an image'), _File('c.png', b'also broken')]
+    with patch.object(views, 'get_config', return_value={}), \
+         patch.object(views, 'upload_blob_to_gcs', return_value='url'):
+        urls, err = views.process_uploads(files, 'sprzet', 'NS01')
+    assert urls == []
+    assert err.startswith('Błąd przetwarzania zdjęcia broken.png')
+
+
+def _jpeg(width, height, orientation=None):
+    img = Image.new('RGB', (width, height), 'blue')
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    exif[0x8825] = {2: (52.0, 13.0, 0.0)}  # GPSInfo
+    buf = BytesIO()
+    img.save(buf, format='JPEG', exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def test_encode_photo_transposes_resizes_and_strips_metadata():
+    from src import views
+
+    # Zdjęcie z telefonu: 400x200 zapisane z orientacją 6 (obrót o 90°)
+    f = _File('phone.jpg', _jpeg(400, 200, orientation=6), mimetype='image/jpeg')
+    views._encode_photo(f, 100, 'jpeg', 70)
+    out = Image.open(f.stream)
+    assert f.mimetype == 'image/jpeg' and out.format == 'JPEG'
+    assert out.size == (100, 200)
+    assert not out.getexif()
+
+    # Niezbyt szerokie, ale z EXIF (GPS) – też kodowane od nowa, bez metadanych
+    f = _File('small.jpg', _jpeg(50, 40), mimetype='image/jpeg')
+    views._encode_photo(f, 100, 'webp', 80)
+    out = Image.open(f.stream)
+    assert f.mimetype == 'image/webp' and out.format == 'WEBP'
+    assert out.size == (50, 40) and not out.getexif()
+
+
+def test_encode_photo_keeps_plain_small_files_unchanged():
+    from src import views
+
+    data = _png(50)
+    f = _File('plain.png', data)
+    views._encode_photo(f, 100, 'webp', 80)
+    assert f.mimetype == 'image/png'
+    assert f.stream.read() == data
+
+
+def test_encode_photo_flattens_alpha_for_jpeg():
+    from src import views
+
+    buf = BytesIO()
+    Image.new('RGBA', (300, 100), (255, 0, 0, 0)).save(buf, format='PNG')
+    f = _File('alpha.png', buf.getvalue())
+    views._encode_photo(f, 150, 'jpeg', 80)
+    out = Image.open(f.stream)
+    assert out.mode == 'RGB' and out.size == (150, 50)
+    assert out.getpixel((10, 10)) == (255, 255, 255)
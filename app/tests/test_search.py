@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from src.search import SearchIndex, fold
+
+
+ITEMS = [
+    {'id': 'NS-01', 'nazwa': 'Namiot NS', 'zapalki': 'zapałki drewniane', 'lokalizacja': 'Esperanto'},
+    {'id': 'K-10', 'nazwa': 'Kanadyjka', 'material': 'aluminiowe', 'ilosc': 10},
+    {'id': 'Z-3', 'nazwa': 'Śledzie stalowe', 'typ_zelastwa': 'śledź'},
+]
+
+
+def test_fold_removes_polish_diacritics():
+    assert fold('Zapałki ŁÓDŹ żółć') == 'zapalki lodz zolc'
+
+
+def test_search_substrings_prefixes_and_diacritics():
+    idx = SearchIndex(ITEMS, version=1)
+
+    assert idx.search('zapalki') == {'NS-01'}
+    assert idx.search('ŚLEDŹ') == {'Z-3'}
+    assert idx.search('lumin') == {'K-10'}
+    assert idx.search('k') == {'K-10'}
+    assert idx.search('ns 01') == {'NS-01'}
+    assert idx.search('namiot kanadyjka') == set()
+    assert idx.search('---') is None
+
+
+def test_search_incremental_updates():
+    idx = SearchIndex(ITEMS, version=1)
+
+    idx.apply('K-10', {'id': 'K-10', 'nazwa': 'Kajak'}, 2)
+    idx.apply('NEW', {'id': 'NEW', 'nazwa': 'Kanadyjka nowa'}, 3)
+    idx.apply('Z-3', None, 4)
+
+    assert idx.search('kanadyjka') == {'NEW'}
+    assert idx.search('kajak') == {'K-10'}
+    assert idx.search('sledz') == set()
+    assert idx.version == 4
+
+
+def test_item_matches_agrees_with_index():
+    from src.search import item_matches
+
+    idx = SearchIndex(ITEMS, version=1)
+    for query in ('zapalki', 'k', 'lumin', 'ns 01', 'namiot kanadyjka', 'sledz'):
+        expected = idx.search(query)
+        assert {i['id'] for i in ITEMS if item_matches(query, i)} == expected
+
+
+def test_top_ranks_id_and_name_prefixes_first():
+    idx = SearchIndex([
+        {'id': 'X-1', 'nazwa': 'Stół z namiotem'},
+        {'id': 'NS-10', 'nazwa': 'Namiot NS'},
+        {'id': 'NS-1', 'nazwa': 'Namiot NS'},
+        {'id': 'A-5', 'nazwa': 'Namiot duży'},
+    ], version=1)
+
+    assert idx.top('ns 1') == ['NS-1', 'NS-10']
+    assert idx.top('namiot') == ['A-5', 'NS-1', 'NS-10', 'X-1']
+    assert idx.top('namiot', n=2) == ['A-5', 'NS-1']
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+
+class _Doc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class _DocRef:
+    def __init__(self, store, doc_id):
+        self.store = store
+        self.doc_id = doc_id
+
+    def get(self):
+        self.store.reads += 1
+        return _Doc(self.doc_id, self.store.data.get(self.doc_id))
+
+    def set(self, data):
+        self.store.data[self.doc_id] = dict(data)
+
+    def update(self, data):
+        self.store.data[self.doc_id].update(data)
+
+    def delete(self):
+        self.store.data.pop(self.doc_id, None)
+
+
+class _Collection:
+    def __init__(self):
+        self.data = {}
+        self.streams = 0
+        self.reads = 0
+
+    def document(self, doc_id):
+        return _DocRef(self, doc_id)
+
+    def stream(self):
+        self.streams += 1
+        return [_Doc(k, v) for k, v in self.data.items()]
+
+    def on_snapshot(self, callback):
+        raise RuntimeError('listener not supported in tests')
+
+
+class _Client:
+    def __init__(self):
+        self.sprzet = _Collection()
+
+    def collection(self, name):
+        assert name == 'sprzet'
+        return self.sprzet
+
+
+def _with_client(client):
+    from src import db_firestore
+    db_firestore.invalidate_sprzet_cache()
+    return patch.object(db_firestore, 'get_firestore_client', return_value=client)
+
+
+def test_sprzet_reads_served_from_single_stream():
+    from src import db_firestore
+
+    client = _Client()
+    client.sprzet.data = {
+        'B': {'category': 'namiot', 'parent_id': 'M'},
+        'A': {'category': 'przedmiot', 'parent_id': 'M'},
+        'M': {'category': 'magazyn'},
+    }
+    with _with_client(client):
+        assert [i['id'] for i in db_firestore.get_all_sprzet()] == ['A', 'B', 'M']
+        assert [i['id'] for i in db_firestore.get_all_sprzet('namiot')] == ['B']
+        assert [i['id'] for i in db_firestore.get_items_by_parent('M')] == ['A', 'B']
+        assert db_firestore.get_sprzet_item('A')['category'] == 'przedmiot'
+        assert client.sprzet.streams == 1
+        assert client.sprzet.reads == 0
+
+
+def test_sprzet_cache_write_through_and_copies():
+    from src import db_firestore
+
+    client = _Client()
+    client.sprzet.data = {'A': {'category': 'przedmiot', 'zdjecia': ['x.png']}}
+    with _with_client(client):
+        item = db_firestore.get_sprzet_item('A')
+        item['zdjecia'].append('y.png')
+        assert db_firestore.get_sprzet_item('A')['zdjecia'] == ['x.png']
+
+        db_firestore.set_item('sprzet', 'N', {'category': 'namiot', 'parent_id': 'A'})
+        db_firestore.update_item('sprzet', 'A', nazwa='Skrzynia')
+        assert db_firestore.get_sprzet_item('A')['nazwa'] == 'Skrzynia'
+        assert [i['id'] for i in db_firestore.get_items_by_parent('A')] == ['N']
+
+        db_firestore.delete_item('sprzet', 'N')
+        assert db_firestore.get_items_by_parent('A') == []
+        assert client.sprzet.streams == 1
+
+
+def test_get_all_sprzet_projection_returns_only_requested_fields():
+    from src import db_firestore
+
+    client = _Client()
+    client.sprzet.data = {'A': {'category': 'namiot', 'historia': 'x' * 1000, 'zdjecia': ['a.png'], 'typ': 'NS'}}
+    with _with_client(client):
+        assert db_firestore.get_all_sprzet(fields=['typ']) == [{'id': 'A', 'typ': 'NS'}]
+        assert db_firestore.get_all_sprzet(category='namiot', fields=['category']) == [{'id': 'A', 'category': 'namiot'}]
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+from src.search import SearchIndex
+
+
+ITEMS = [
+    {'id': 'NS-1', 'nazwa': 'Namiot NS', 'category': 'namiot', 'magazyn_display': 'Esperanto'},
+    {'id': 'K-1', 'nazwa': 'Kanadyjka', 'category': 'kanadyjki', 'lokalizacja': 'Obozowa'},
+]
+
+
+def _get(client, url):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 'u1'
+        sess['user_role'] = 'quartermaster'
+    return client.get(url)
+
+
+def test_sprzet_search_api_returns_compact_ranked_results_and_caches():
+    from app import create_app
+    from src import views
+
+    index = SearchIndex(ITEMS, version=7)
+    app = create_app()
+    with patch('src.views.get_search_index', return_value=index), \
+         patch('src.views.get_sprzet_cache_version', return_value=7), \
+         patch('src.views.get_items_many', side_effect=lambda c, ids: [i for i in ITEMS if i['id'] in ids]) as many:
+        client = app.test_client()
+        first = _get(client, '/api/sprzet/search?q=kanadyjka').get_json()
+        second = _get(client, '/api/sprzet/search?q=Kanadyjka').get_json()
+        short = _get(client, '/api/sprzet/search?q=k').get_json()
+
+    assert first['results'] == [{'id': 'K-1', 'nazwa': 'Kanadyjka', 'category': 'kanadyjki', 'magazyn_display': 'Obozowa'}]
+    assert second == first
+    assert many.call_count == 1
+    assert short == {'results': []}
+    views.invalidate_search_caches()
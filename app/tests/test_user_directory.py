@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+
+USERS = [
+    {'id': 'u1', 'email': 'anna@x.pl', 'first_name': 'Anna', 'last_name': 'Nowak', 'google_id': 'g1',
+     'achievements': {'first_report': 'x'}},
+    {'id': 'u2', 'email': 'bob@x.pl', 'first_name': '', 'last_name': '', 'authentik_id': 'a2'},
+]
+
+
+def test_directory_maps_and_display_names():
+    from src.db_users import UserDirectory
+
+    directory = UserDirectory(USERS)
+    assert directory.names == {'u1': 'Anna Nowak', 'u2': 'bob@x.pl'}
+    assert directory.by_email == {'anna@x.pl': 'u1', 'bob@x.pl': 'u2'}
+    assert directory.by_provider['google_id'] == {'g1': 'u1'}
+    assert directory.by_provider['authentik_id'] == {'a2': 'u2'}
+    # Katalog trzyma tylko lekkie rekordy
+    assert 'achievements' not in directory.get('u1')
+
+
+def test_directory_is_cached_and_invalidated_by_writes():
+    from src import db_users
+
+    db_users.invalidate_user_directory()
+    with patch.object(db_users, 'get_all_users', return_value=USERS) as get_all, \
+         patch.object(db_users, 'get_firestore_client', return_value=MagicMock()), \
+         patch.dict('os.environ', {'USER_DIRECTORY_LISTENER': 'False'}):
+        db_users.get_user_display_names()
+        db_users.get_user_display_names()
+        db_users.update_user('u1', first_name='Ania')
+        db_users.get_user_display_names()
+
+    assert get_all.call_count == 2
+    db_users.invalidate_user_directory()
+
+
+def test_provider_lookup_verifies_hit_and_falls_back_to_query():
+    from src import db_users
+
+    db_users.invalidate_user_directory()
+    with patch.object(db_users, 'get_all_users', return_value=USERS), \
+         patch.object(db_users, 'get_firestore_client', return_value=MagicMock()), \
+         patch.dict('os.environ', {'USER_DIRECTORY_LISTENER': 'False'}), \
+         patch.object(db_users, 'get_user_by_uid', side_effect=lambda uid: dict(USERS[0], google_id=None)), \
+         patch.object(db_users, '_query_user_by', return_value=None) as query:
+        # Mapa jest nieświeża (konto odłączone w innym workerze) – decyduje Firestore
+        assert db_users.get_user_by_google_id('g1') is None
+        query.assert_called_once_with('google_id', 'g1')
+
+    with patch.object(db_users, 'get_user_by_uid', return_value=dict(USERS[0])) as by_uid, \
+         patch.object(db_users, '_query_user_by') as query:
+        assert db_users.get_user_by_email('anna@x.pl')['id'] == 'u1'
+        by_uid.assert_called_once_with('u1')
+        query.assert_not_called()
+    db_users.invalidate_user_directory()
+
+
+def test_suggest_ranks_prefix_matches_first_and_resolves_exact():
+    from src.db_users import UserDirectory
+
+    directory = UserDirectory(USERS + [
+        {'id': 'u3', 'email': 'janna@x.pl', 'first_name': 'Joanna', 'last_name': 'Kowalska'},
+        {'id': 'u4', 'email': 'piotr@x.pl', 'first_name': 'Piotr', 'last_name': 'Annański'},
+    ])
+    assert [u['id'] for u in directory.suggest('ANN')] == ['u1', 'u4', 'u3']
+    assert [u['id'] for u in directory.suggest('nowak')] == ['u1']
+    assert [u['id'] for u in directory.suggest('x.pl', 2)] == ['u1', 'u2']
+    assert directory.suggest('zzz') == []
+    assert directory.resolve(' Anna Nowak ') == ['u1']
+    assert directory.resolve('BOB@x.pl') == ['u2']
+    assert directory.resolve('anna') == []